@@ -0,0 +1,188 @@
+"""
+Consultas de analítica sobre sesiones, respuestas y recomendaciones.
+
+Las agregaciones leen de los contadores de ``app.rollups`` (una fila por
+clave distinta, no por evento) y el resto de los índices de
+``db.INDEXES``. Todas paginan por clave
+(keyset): el cursor es la clave de ordenación de la última fila devuelta y
+la página siguiente empieza justo después, sin OFFSET. Así el coste de una
+página no depende de cuántas páginas haya antes. El cursor viaja como un
+token opaco (JSON en base64).
+
+Cada función devuelve ``{"items": [...], "next": cursor | None}``.
+"""
+import base64
+import json
+import sqlite3
+from typing import Any, Dict, List, Optional, Tuple
+
+from app import rollups
+
+MAX_LIMIT = 1000
+
+# prefijo del timestamp ISO que define cada intervalo
+BUCKETS = {
+    "minute": 16,   # 2024-01-01T10:30
+    "hour": 13,     # 2024-01-01T10
+    "day": 10,      # 2024-01-01
+    "month": 7,     # 2024-01
+}
+
+
+def encode_cursor(values: List[Any]) -> str:
+    raw = json.dumps(values, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str], types: Tuple[type, ...]) -> Optional[List[Any]]:
+    """Valores del cursor; deben coincidir en número y tipo con la clave (``types``)."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except ValueError:
+        raise ValueError("cursor inválido")
+    # type() y no isinstance(): true no vale como contador
+    if not isinstance(values, list) or len(values) != len(types) or any(
+            type(v) is not t for v, t in zip(values, types)):
+        raise ValueError("cursor inválido")
+    return values
+
+
+def _page(rows: List[Dict], limit: int, key) -> Dict:
+    """Recorta a ``limit`` filas; se pidió una más para saber si hay siguiente página."""
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return {"items": rows, "next": encode_cursor(key(rows[-1]))}
+    return {"items": rows, "next": None}
+
+
+def _limit(limit: int) -> int:
+    return max(1, min(int(limit), MAX_LIMIT))
+
+
+def top_recommendations(conn: sqlite3.Connection, category: str, limit: int = 20,
+                        cursor: Optional[str] = None) -> Dict:
+    """Recomendaciones más frecuentes de una categoría (orden: veces desc, texto)."""
+    limit = _limit(limit)
+    after = decode_cursor(cursor, (int, str))
+    sql = '''
+        SELECT recommendation, count
+        FROM rollup_recommendations INDEXED BY idx_rollup_recommendations_rank
+        WHERE category = ?
+    '''
+    params: List[Any] = [category]
+    if after is not None:
+        sql += ' AND (count < ? OR (count = ? AND recommendation > ?))'
+        params += [after[0], after[0], after[1]]
+    sql += ' ORDER BY count DESC, recommendation LIMIT ?'
+    params.append(limit + 1)
+    rows = [{"recommendation": r[0], "count": r[1]} for r in conn.execute(sql, params)]
+    return _page(rows, limit, lambda r: [r["count"], r["recommendation"]])
+
+
+def answer_distribution(conn: sqlite3.Connection, question_id: str, limit: int = 100,
+                        cursor: Optional[str] = None) -> Dict:
+    """Cuántas veces se eligió cada opción de una pregunta (orden: id de opción)."""
+    limit = _limit(limit)
+    after = decode_cursor(cursor, (str,))
+    sql = 'SELECT answer_id, count FROM rollup_answers WHERE question_id = ?'
+    params: List[Any] = [question_id]
+    if after is not None:
+        sql += ' AND answer_id > ?'
+        params.append(after[0])
+    sql += ' ORDER BY answer_id LIMIT ?'
+    params.append(limit + 1)
+    rows = [{"answer_id": r[0], "count": r[1]} for r in conn.execute(sql, params)]
+    return _page(rows, limit, lambda r: [r["answer_id"]])
+
+
+def sessions_per_bucket(conn: sqlite3.Connection, bucket: str = "hour", start: Optional[str] = None,
+                        end: Optional[str] = None, limit: int = 100, cursor: Optional[str] = None) -> Dict:
+    """
+    Sesiones por intervalo de tiempo (orden cronológico). ``start``/``end``
+    son prefijos ISO (``2024-01-01``, ``2024-01-01T10``...); ``end`` es
+    exclusivo.
+    """
+    if bucket not in BUCKETS:
+        raise ValueError(f"bucket debe ser uno de {', '.join(BUCKETS)}")
+    width = BUCKETS[bucket]
+    limit = _limit(limit)
+    after = decode_cursor(cursor, (str,))
+    where, params = [], []
+    if start:
+        where.append('timestamp >= ?')
+        params.append(start)
+    if end:
+        where.append('timestamp < ?')
+        params.append(end)
+    if after is not None:
+        # todo timestamp que empieza por el intervalo anterior es menor que
+        # "<intervalo>~" ('~' va detrás de dígitos, 'T', ':' y '.')
+        where.append('timestamp > ?')
+        params.append(after[0] + '~')
+    # con intervalos de una hora o más y límites que no bajan de la hora,
+    # basta con los contadores por hora; si no, se agrupan las sesiones
+    if width <= rollups.HOUR and len(start or '') <= rollups.HOUR and len(end or '') <= rollups.HOUR:
+        source, column, count = 'rollup_sessions_hourly', 'hour', 'SUM(count)'
+    else:
+        source, column, count = 'sessions INDEXED BY idx_sessions_timestamp', 'timestamp', 'COUNT(*)'
+    where = [w.replace('timestamp', column) for w in where]
+    sql = f'''
+        SELECT substr({column}, 1, {width}) AS bucket, {count}
+        FROM {source}
+        {'WHERE ' + ' AND '.join(where) if where else ''}
+        GROUP BY bucket ORDER BY bucket LIMIT ?
+    '''
+    params.append(limit + 1)
+    rows = [{"bucket": r[0], "sessions": r[1]} for r in conn.execute(sql, params)]
+    return _page(rows, limit, lambda r: [r["bucket"]])
+
+
+def list_sessions(conn: sqlite3.Connection, start: Optional[str] = None, end: Optional[str] = None,
+                  limit: int = 100, cursor: Optional[str] = None) -> Dict:
+    """Sesiones de la más reciente a la más antigua (orden: timestamp desc, id desc)."""
+    limit = _limit(limit)
+    after = decode_cursor(cursor, (str, str))
+    where, params = [], []
+    if start:
+        where.append('timestamp >= ?')
+        params.append(start)
+    if end:
+        where.append('timestamp < ?')
+        params.append(end)
+    if after is not None:
+        where.append('(timestamp < ? OR (timestamp = ? AND id < ?))')
+        params += [after[0], after[0], after[1]]
+    sql = f'''
+        SELECT id, timestamp FROM sessions INDEXED BY idx_sessions_timestamp
+        {'WHERE ' + ' AND '.join(where) if where else ''}
+        ORDER BY timestamp DESC, id DESC LIMIT ?
+    '''
+    params.append(limit + 1)
+    rows = [{"id": r[0], "timestamp": r[1]} for r in conn.execute(sql, params)]
+    return _page(rows, limit, lambda r: [r["timestamp"], r["id"]])
+
+
+def session_detail(conn: sqlite3.Connection, session_id: str) -> Optional[Dict]:
+    """Una sesión con sus respuestas y recomendaciones, o None si no existe."""
+    row = conn.execute('SELECT id, timestamp, questionnaire, tree_version FROM sessions WHERE id = ?',
+                       (session_id,)).fetchone()
+    if row is None:
+        return None
+    answers = [
+        {"questionId": r[0], "answerId": r[1], "phase": r[2]}
+        for r in conn.execute(
+            'SELECT question_id, answer_id, phase FROM answers INDEXED BY idx_answers_session '
+            'WHERE session_id = ? ORDER BY id', (session_id,))
+    ]
+    recommendations: Dict[str, List[str]] = {}
+    for category, text in conn.execute(
+            'SELECT r.category, t.text FROM session_recommendations r '
+            'INDEXED BY idx_session_recommendations_session '
+            'JOIN recommendation_texts t ON t.id = r.text_id '
+            'WHERE r.session_id = ? ORDER BY r.id', (session_id,)):
+        recommendations.setdefault(category, []).append(text)
+    return {"id": row[0], "timestamp": row[1], "questionnaire": row[2], "tree_version": row[3],
+            "answers": answers, "recommendations": recommendations}
@@ -0,0 +1,131 @@
+"""
+Clasificador de recomendaciones por categoría.
+
+El resultado es siempre el de la cascada original: la primera categoría de
+``KEYWORDS`` con alguna palabra clave contenida en el texto. Hay dos
+caminos, según la longitud del texto:
+
+- Textos cortos (hasta ``SHORT_TEXT`` caracteres, los del flujo): la tabla
+  se compila una vez en una expresión regular con forma de trie y un solo
+  ``finditer`` encuentra, en cada posición, la palabra más larga que empieza
+  ahí. Cada palabra lleva precalculada la categoría de mayor prioridad entre
+  las que contiene (p. ej. 'go' dentro de 'mongodb'). Como las coincidencias
+  no se solapan, al patrón se añaden las palabras que resultan de encadenar
+  una palabra con otra de más prioridad que empieza dentro de ella (p. ej.
+  'cloudb': 'db' empieza en la 'd' de 'cloud'): así ninguna palabra que
+  cruce el final de una coincidencia se pierde.
+- Textos largos: la cascada con ``in``, que busca cada palabra en C.
+
+Sin caché, en µs por texto (``min`` de 30 repeticiones, textos en
+castellano con o sin una palabra clave al final):
+
+    longitud                       20    60    80   100   160   240
+    cascada original              3.9   3.9   3.8   3.2   4.3   4.6
+    trie con lookahead (antes)    1.7   3.5   3.9   4.6   8.3   9.8
+    trie / cascada (ahora)        1.4   2.8   3.2   3.0   4.1   4.3
+
+El recorrido del trie crece con cada carácter; la cascada cuesta casi lo
+mismo sea cual sea la longitud. Por encima de ~90 caracteres gana la
+cascada, de ahí el corte. Además cada texto se memoriza (``lru_cache``):
+los del árbol se repiten en cada evaluación.
+"""
+import re
+from functools import lru_cache
+from typing import Dict, List, Pattern, Tuple
+
+KEYWORDS: Dict[str, List[str]] = {
+    'frontend': ['react', 'vue', 'angular', 'svelte', 'html', 'css', 'spa', 'webgl', 'canvas', 'frontend', 'ui', 'ux', 'tailwind', 'bootstrap'],
+    'backend': ['node', 'django', 'flask', 'spring', 'java', 'go', 'rust', 'php', 'express', 'laravel', 'backend', 'api', 'servidor'],
+    'database': ['sql', 'mysql', 'postgres', 'postgresql', 'mongodb', 'firebase', 'hadoop', 'spark', 'database', 'db', 'sqlite', 'oracle', 'nosql'],
+    'architecture': ['microserv', 'monolit', 'arquitectura', 'cloud', 'kubernetes', 'docker', 'serverless', 'cloud-native', 'infraestructura', 'scalable'],
+    'methodology': ['scrum', 'kanban', 'waterfall', 'mvp', 'metodolog', 'ágil', 'agile', 'iterativo', 'devops'],
+    'security': ['oauth', 'jwt', 'ssl', 'cifrado', 'security', 'compliance', 'iso', 'auth', 'seguridad', 'sso', 'protección'],
+}
+
+CATEGORIES: Tuple[str, ...] = tuple(KEYWORDS)
+
+# categoría para textos que no coinciden con ninguna palabra clave
+FALLBACK_CATEGORY = 'other'
+
+
+def _trie_pattern(words: List[str]) -> str:
+    trie: Dict = {}
+    for w in words:
+        node = trie
+        for ch in w:
+            node = node.setdefault(ch, {})
+        node[''] = True
+
+    def build(node: Dict) -> str:
+        # las ramas se distinguen por el siguiente carácter, así que a lo sumo
+        # una puede coincidir; seguir la rama antes que cortar da la más larga
+        branches = [re.escape(ch) + build(sub) for ch, sub in sorted(node.items()) if ch]
+        if not branches:
+            return ''
+        if len(branches) == 1 and '' not in node:
+            return branches[0]
+        return '(?:' + '|'.join(branches) + ')' + ('?' if '' in node else '')
+
+    return build(trie)
+
+
+def compile_keywords(keywords: Dict[str, List[str]]) -> Tuple[Pattern, Dict[str, int]]:
+    """
+    Devuelve el patrón de un solo recorrido y, por palabra (las claves y las
+    encadenadas), el índice de la categoría de mayor prioridad entre las
+    palabras clave que contiene.
+    """
+    priority: Dict[str, int] = {}
+    for i, keys in enumerate(keywords.values()):
+        for k in keys:
+            priority.setdefault(k, i)
+
+    def rank_of(word: str) -> int:
+        return min(p for other, p in priority.items() if other in word)
+
+    rank = {word: rank_of(word) for word in priority}
+    # encadenados: b empieza dentro de a y termina después. Sólo importan si b
+    # tiene más prioridad, y cada eslabón la sube, así que el cierre es finito
+    pending = list(rank)
+    while pending:
+        a = pending.pop()
+        for b, p in priority.items():
+            if p >= rank[a]:
+                continue
+            for cut in range(1, len(a)):
+                overlap = len(a) - cut
+                if len(b) > overlap and b.startswith(a[cut:]):
+                    word = a + b[overlap:]
+                    if word not in rank:
+                        rank[word] = rank_of(word)
+                        pending.append(word)
+    return re.compile(_trie_pattern(list(rank))), rank
+
+
+_PATTERN, _RANK = compile_keywords(KEYWORDS)
+_KEYWORD_TUPLES = tuple(tuple(keys) for keys in KEYWORDS.values())
+
+# a partir de aquí la cascada es más rápida que el trie (ver arriba)
+SHORT_TEXT = 90
+
+
+@lru_cache(maxsize=4096)
+def categorize(text: str) -> str:
+    """Devuelve la categoría de un texto de recomendación (o FALLBACK_CATEGORY)."""
+    t = text.lower()
+    if len(t) > SHORT_TEXT:
+        contains = t.__contains__
+        for i, keys in enumerate(_KEYWORD_TUPLES):
+            if any(map(contains, keys)):
+                return CATEGORIES[i]
+        return FALLBACK_CATEGORY
+    best = len(CATEGORIES)
+    for m in _PATTERN.finditer(t):
+        idx = _RANK[m.group()]
+        if idx < best:
+            best = idx
+            if best == 0:
+                break
+    if best == len(CATEGORIES):
+        return FALLBACK_CATEGORY
+    return CATEGORIES[best]
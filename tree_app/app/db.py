@@ -0,0 +1,237 @@
+"""
+Persistencia en SQLite.
+
+Cada hilo reutiliza su propia conexión (los handlers escriben desde el
+threadpool, fuera del event loop). La conexión vive sólo en el
+``threading.local`` del hilo: cuando anyio retira un hilo ocioso del pool,
+su conexión se cierra con él. La base de datos se abre en modo WAL con
+``synchronous=NORMAL``: los lectores no bloquean al escritor y cada commit
+no fuerza un fsync del fichero principal. Las filas se insertan con
+``executemany`` en una sola transacción.
+
+Los textos de las recomendaciones se guardan una sola vez, en
+``recommendation_texts``; cada fila de ``session_recommendations`` apunta a
+su texto por id. La vista ``recommendations`` conserva la forma de la tabla
+original (``id, session_id, category, recommendation``) para las consultas
+de lectura. Las bases de datos anteriores se migran en ``init_db``.
+"""
+import os
+import sqlite3
+import threading
+import weakref
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from app import metrics, rollups
+
+DB_PATH = os.environ.get('ARBOL_DB_PATH', os.path.join(os.path.dirname(__file__), '..', 'data.db'))
+
+_local = threading.local()
+# sólo para que close_all() llegue a las conexiones de los hilos vivos
+_all_conns: "weakref.WeakSet[sqlite3.Connection]" = weakref.WeakSet()
+_all_lock = threading.Lock()
+# DB_PATH -> {texto de recomendación: id}; sólo se añaden ids ya confirmados
+_text_ids: Dict[str, Dict[str, int]] = {}
+# se incrementa en close_all() para que cada hilo abra una conexión nueva
+_generation = 0
+
+
+class _Connection(sqlite3.Connection):
+    """sqlite3.Connection admite referencias débiles sólo a través de una subclase."""
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    # check_same_thread=False sólo para poder cerrarla en close_all();
+    # cada conexión la usa únicamente el hilo que la creó
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False, factory=_Connection)
+    conn.row_factory = sqlite3.Row
+    # sólo tiene efecto en un fichero nuevo (antes de que WAL escriba la
+    # cabecera); los existentes se convierten con "python -m app.maintenance vacuum --full"
+    conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
+
+
+def get_db_conn() -> sqlite3.Connection:
+    """Conexión del hilo actual; se abre la primera vez (o si cambió DB_PATH)."""
+    conn = getattr(_local, 'conn', None)
+    if conn is None or _local.path != DB_PATH or _local.generation != _generation:
+        if conn is not None:
+            # otra base de datos (o tras close_all): la anterior no se vuelve a usar
+            conn.close()
+        conn = _connect(DB_PATH)
+        _local.conn = conn
+        _local.path = DB_PATH
+        _local.generation = _generation
+        with _all_lock:
+            _all_conns.add(conn)
+    return conn
+
+
+def close_all() -> None:
+    """Cierra las conexiones de todos los hilos (al apagar la aplicación)."""
+    global _generation
+    with _all_lock:
+        conns = list(_all_conns)
+        _all_conns.clear()
+        _generation += 1
+        _text_ids.clear()
+    for conn in conns:
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+
+def init_db():
+    # create database and tables if not exist
+    conn = get_db_conn()
+    with conn:
+        conn.execute('''
+        CREATE TABLE IF NOT EXISTS sessions (
+            id TEXT PRIMARY KEY,
+            timestamp TEXT,
+            questionnaire TEXT,
+            tree_version TEXT
+        )
+        ''')
+        # cuestionario y versión del árbol con que se evaluó (ver app.registry)
+        add_missing_columns(conn, 'sessions', SESSION_TAGS)
+        conn.execute('''
+        CREATE TABLE IF NOT EXISTS answers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT,
+            question_id TEXT,
+            answer_id TEXT,
+            phase INTEGER,
+            FOREIGN KEY(session_id) REFERENCES sessions(id)
+        )
+        ''')
+        conn.execute('''
+        CREATE TABLE IF NOT EXISTS recommendation_texts (
+            id INTEGER PRIMARY KEY,
+            text TEXT NOT NULL UNIQUE
+        )
+        ''')
+        conn.execute('''
+        CREATE TABLE IF NOT EXISTS session_recommendations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT,
+            category TEXT,
+            text_id INTEGER,
+            FOREIGN KEY(session_id) REFERENCES sessions(id),
+            FOREIGN KEY(text_id) REFERENCES recommendation_texts(id)
+        )
+        ''')
+        _migrate_recommendations(conn)
+        conn.execute('''
+        CREATE VIEW IF NOT EXISTS recommendations AS
+        SELECT r.id, r.session_id, r.category, t.text AS recommendation
+        FROM session_recommendations r JOIN recommendation_texts t ON t.id = r.text_id
+        ''')
+        # índices para las consultas de app.analytics; cubren las columnas
+        # que leen, así que no hace falta ir a la tabla
+        for statement in INDEXES:
+            conn.execute(statement)
+        rollups.ensure(conn)
+
+
+# columnas añadidas a sessions después de la primera versión del esquema
+SESSION_TAGS = (('questionnaire', 'TEXT'), ('tree_version', 'TEXT'))
+
+
+def add_missing_columns(conn: sqlite3.Connection, table: str, columns, schema: str = 'main') -> None:
+    existing = {row[1] for row in conn.execute(f'PRAGMA {schema}.table_info({table})')}
+    for name, kind in columns:
+        if name not in existing:
+            conn.execute(f'ALTER TABLE {schema}.{table} ADD COLUMN {name} {kind}')
+
+
+def _migrate_recommendations(conn: sqlite3.Connection) -> None:
+    """Pasa la tabla ``recommendations`` con el texto completo al esquema con diccionario."""
+    old = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'recommendations'").fetchone()
+    if not old:
+        return
+    conn.execute('INSERT OR IGNORE INTO recommendation_texts(text) '
+                 'SELECT DISTINCT recommendation FROM recommendations WHERE recommendation IS NOT NULL')
+    conn.execute('''
+        INSERT INTO session_recommendations(id, session_id, category, text_id)
+        SELECT r.id, r.session_id, r.category, t.id
+        FROM recommendations r JOIN recommendation_texts t ON t.text = r.recommendation
+        ORDER BY r.id
+    ''')
+    conn.execute('DROP TABLE recommendations')
+
+
+INDEXES = (
+    'CREATE INDEX IF NOT EXISTS idx_sessions_timestamp ON sessions(timestamp, id)',
+    'CREATE INDEX IF NOT EXISTS idx_answers_session ON answers(session_id, question_id, answer_id, phase)',
+    'CREATE INDEX IF NOT EXISTS idx_answers_question ON answers(question_id, answer_id)',
+    'CREATE INDEX IF NOT EXISTS idx_session_recommendations_session '
+    'ON session_recommendations(session_id, category, text_id)',
+    'CREATE INDEX IF NOT EXISTS idx_session_recommendations_category '
+    'ON session_recommendations(category, text_id)',
+)
+
+
+# (id, timestamp) o (id, timestamp, cuestionario, versión del árbol)
+SessionRow = Tuple[str, ...]
+AnswerRow = Tuple[str, str, str, int]
+RecommendationRow = Tuple[str, str, str]
+
+
+@metrics.timed("sqlite_commit")
+def write_rows(sessions: Sequence[SessionRow] = (),
+               answers: Sequence[AnswerRow] = (),
+               recommendations: Sequence[RecommendationRow] = ()) -> None:
+    """
+    Inserta sesiones, respuestas y recomendaciones en una sola transacción,
+    junto con la actualización de los contadores de ``app.rollups``.
+    """
+    conn = get_db_conn()
+    known = _text_ids.setdefault(DB_PATH, {})
+    added: Dict[str, int] = {}
+    with conn:
+        # el bloqueo de escritura desde el principio: sin él, la consulta de
+        # new_sessions iría antes del BEGIN implícito del primer INSERT y dos
+        # escritores con la misma sesión la contarían los dos como nueva
+        conn.execute('BEGIN IMMEDIATE')
+        fresh: Sequence[SessionRow] = ()
+        if sessions:
+            fresh = rollups.new_sessions(conn, sessions)
+            conn.executemany('INSERT OR IGNORE INTO sessions(id, timestamp, questionnaire, tree_version) '
+                             'VALUES(?, ?, ?, ?)', [tuple(s) + (None,) * (4 - len(s)) for s in sessions])
+        if answers:
+            conn.executemany('INSERT INTO answers(session_id, question_id, answer_id, phase) VALUES(?, ?, ?, ?)',
+                             answers)
+        if recommendations:
+            added = _new_text_ids(conn, {r[2] for r in recommendations} - known.keys())
+            ids = {**known, **added} if added else known
+            conn.executemany('INSERT INTO session_recommendations(session_id, category, text_id) VALUES(?, ?, ?)',
+                             [(s, c, ids[t]) for s, c, t in recommendations])
+        rollups.apply(conn, fresh, answers, recommendations)
+    # tras el commit: si la transacción falla, los ids nuevos no llegan a la caché
+    known.update(added)
+
+
+def _new_text_ids(conn: sqlite3.Connection, texts: set) -> Dict[str, int]:
+    """Da de alta los textos que falten en el diccionario y devuelve sus ids."""
+    if not texts:
+        return {}
+    texts = list(texts)
+    conn.executemany('INSERT OR IGNORE INTO recommendation_texts(text) VALUES(?)', [(t,) for t in texts])
+    ids = {}
+    for i in range(0, len(texts), 500):
+        chunk = texts[i:i + 500]
+        marks = ','.join('?' * len(chunk))
+        ids.update(conn.execute(f'SELECT text, id FROM recommendation_texts WHERE text IN ({marks})', chunk))
+    return ids
+
+
+def answer_rows(session_id: str, answers: Iterable) -> List[AnswerRow]:
+    return [(session_id, a.questionId, a.answerId, a.phase) for a in answers]
+
+
+def recommendation_rows(session_id: str, recommendations: dict) -> List[RecommendationRow]:
+    return [(session_id, cat, it) for cat, items in recommendations.items() for it in items]
@@ -0,0 +1,95 @@
+"""
+Cálculo de recomendaciones a partir de las respuestas seleccionadas.
+
+El resultado depende sólo del conjunto de opciones elegidas y del árbol
+cargado, por eso ``canonical_answer_ids`` reduce las respuestas a una tupla
+canónica que sirve de clave de caché.
+"""
+from typing import Dict, Iterable, List, Mapping, Tuple, Union
+
+from app import metrics
+from app.frozen import FrozenTree
+from app.tree_parser import Node
+from app.categorizer import categorize, CATEGORIES, FALLBACK_CATEGORY
+
+# Node (con su índice) o FrozenTree de una instantánea: ambos tienen
+# recommendation_texts(id)
+Tree = Union[Node, FrozenTree]
+RuleTable = Mapping[str, Dict[str, List[str]]]
+
+# Recomendaciones globales: se usan cuando ninguna opción elegida aporta
+# recomendaciones propias (y se cuelgan del árbol en 'phase_final')
+GLOBAL_RECOMMENDATIONS = [
+    "React + Vite (Frontend rápido y moderno)",
+    "Node.js con Express (Backend ágil y escalable)",
+    "PostgreSQL (Base de datos relacional confiable)",
+    "Microservicios con escalado horizontal",
+    "Scrum o Kanban (metodologías ágiles)",
+    "Implementa JWT, HTTPS y backups regulares",
+]
+
+
+def answer_order(root: Node) -> Dict[str, int]:
+    """Posición de cada id en el recorrido del árbol (orden del cuestionario)."""
+    return {node_id: i for i, node_id in enumerate(root.index)}
+
+
+def canonical_answer_ids(order: Mapping[str, int], answer_ids: Iterable[str]) -> Tuple[str, ...]:
+    """
+    Ids de respuesta sin repetidos y ordenados según el árbol. Los ids que no
+    existen en el árbol no aportan nada a la evaluación y se descartan.
+    """
+    return tuple(sorted({a for a in answer_ids if a in order}, key=order.__getitem__))
+
+
+def compute_recommendations(root: Tree, rule_table: RuleTable,
+                            answer_ids: Iterable[str]) -> Dict[str, List[str]]:
+    answer_ids = list(answer_ids)
+    recommendations = _categorize(_collect_texts(root, answer_ids))
+    _enrich(recommendations, rule_table, answer_ids)
+    return _dedup(recommendations)
+
+
+# Each stage is a separate function so app.metrics can time it
+# (ARBOL_METRICS=1); with metrics off the decorator returns it untouched.
+
+@metrics.timed("tree_lookup")
+def _collect_texts(root: Tree, answer_ids: List[str]) -> List[str]:
+    # Collect recommendation texts from selected options
+    # (recommendation-type children under each option)
+    rec_texts = []
+    for answer_id in answer_ids:
+        rec_texts.extend(root.recommendation_texts(answer_id))
+
+    if not rec_texts:
+        # Si no hay recomendaciones derivadas, usar las globales que agregamos al árbol
+        rec_texts.extend(GLOBAL_RECOMMENDATIONS)
+    return rec_texts
+
+
+@metrics.timed("categorization")
+def _categorize(rec_texts: List[str]) -> Dict[str, List[str]]:
+    # categorize (dict.fromkeys deduplicates preserving order)
+    recommendations: Dict[str, List[str]] = {c: [] for c in CATEGORIES}
+    recommendations[FALLBACK_CATEGORY] = []
+    for r in dict.fromkeys(rec_texts):
+        recommendations[categorize(r)].append(r)
+    return recommendations
+
+
+@metrics.timed("rule_enrichment")
+def _enrich(recommendations: Dict[str, List[str]], rule_table: RuleTable,
+            answer_ids: List[str]) -> None:
+    # RULE-BASED ENRICHMENT: contributions are resolved per option id when the
+    # tree loads (see app/rules.py), so each answer is a single dict lookup
+    for answer_id in answer_ids:
+        for cat, items in rule_table.get(answer_id, {}).items():
+            recommendations[cat].extend(items)
+
+
+@metrics.timed("dedup")
+def _dedup(recommendations: Dict[str, List[str]]) -> Dict[str, List[str]]:
+    # Deduplicate recommendations per category
+    for k in recommendations:
+        recommendations[k] = list(dict.fromkeys(recommendations[k]))
+    return recommendations
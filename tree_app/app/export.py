@@ -0,0 +1,163 @@
+"""
+Exportación de sesiones, respuestas y recomendaciones en streaming.
+
+Las filas se leen por páginas con paginación por clave (``id > último``),
+así que la memoria no depende del tamaño de la exportación y ninguna
+transacción de lectura queda abierta entre páginas (el checkpoint del WAL
+puede avanzar mientras se exporta). Cada página se escribe en cuanto se
+lee.
+
+Formatos: CSV y NDJSON; Parquet si está instalado ``pyarrow`` (cada
+página es un row group).
+
+    python -m app.export answers --format csv --start 2024-01-01 --end 2024-02-01 > answers.csv
+    python -m app.export recommendations --format parquet --output recs.parquet
+
+Los filtros de tiempo son prefijos ISO sobre el timestamp de la sesión;
+``end`` es exclusivo.
+"""
+import argparse
+import csv
+import io
+import json
+import sys
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from app import db
+
+PAGE_SIZE = 5000
+FORMATS = ("csv", "ndjson", "parquet")
+
+# tabla -> (columnas exportadas, consulta de una página)
+_QUERIES: Dict[str, Tuple[List[str], str]] = {
+    "sessions": (
+        ["id", "timestamp", "questionnaire", "tree_version"],
+        "SELECT s.rowid, s.id, s.timestamp, s.questionnaire, s.tree_version FROM sessions s "
+        "WHERE s.rowid > ? {where} ORDER BY s.rowid LIMIT ?",
+    ),
+    "answers": (
+        ["id", "session_id", "question_id", "answer_id", "phase"],
+        "SELECT a.id, a.id, a.session_id, a.question_id, a.answer_id, a.phase FROM answers a "
+        "{join} WHERE a.id > ? {where} ORDER BY a.id LIMIT ?",
+    ),
+    "recommendations": (
+        ["id", "session_id", "category", "recommendation"],
+        "SELECT r.id, r.id, r.session_id, r.category, r.recommendation FROM recommendations r "
+        "{join} WHERE r.id > ? {where} ORDER BY r.id LIMIT ?",
+    ),
+}
+TABLES = tuple(_QUERIES)
+
+
+def columns(table: str) -> List[str]:
+    return list(_QUERIES[table][0])
+
+
+def _sql(table: str, start: Optional[str], end: Optional[str]) -> Tuple[str, List[str]]:
+    where, params = [], []
+    if start:
+        where.append("s.timestamp >= ?")
+        params.append(start)
+    if end:
+        where.append("s.timestamp < ?")
+        params.append(end)
+    alias = table[0]
+    join = f"JOIN sessions s ON s.id = {alias}.session_id" if where and table != "sessions" else ""
+    sql = _QUERIES[table][1].format(join=join, where="".join(" AND " + w for w in where))
+    return sql, params
+
+
+def iter_pages(table: str, start: Optional[str] = None, end: Optional[str] = None,
+               page_size: int = PAGE_SIZE) -> Iterator[List[tuple]]:
+    """
+    Páginas de filas (tuplas en el orden de ``columns(table)``). Cada página
+    es una consulta completa con la conexión del hilo actual, así que el
+    iterador puede avanzar desde hilos distintos (StreamingResponse).
+    """
+    if table not in _QUERIES:
+        raise ValueError(f"tabla desconocida: {table}")
+    sql, params = _sql(table, start, end)
+    last = 0
+    while True:
+        rows = db.get_db_conn().execute(sql, [last, *params, page_size]).fetchall()
+        if not rows:
+            return
+        last = rows[-1][0]
+        yield [tuple(r)[1:] for r in rows]
+        if len(rows) < page_size:
+            return
+
+
+def iter_csv(table: str, start: Optional[str] = None, end: Optional[str] = None,
+             page_size: int = PAGE_SIZE) -> Iterator[str]:
+    buf = io.StringIO()
+    out = csv.writer(buf)
+    out.writerow(columns(table))
+    for page in iter_pages(table, start, end, page_size):
+        out.writerows(page)
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue()
+
+
+def iter_ndjson(table: str, start: Optional[str] = None, end: Optional[str] = None,
+                page_size: int = PAGE_SIZE) -> Iterator[str]:
+    names = columns(table)
+    for page in iter_pages(table, start, end, page_size):
+        yield "".join(json.dumps(dict(zip(names, row)), ensure_ascii=False) + "\n" for row in page)
+
+
+def write_parquet(path: str, table: str, start: Optional[str] = None, end: Optional[str] = None,
+                  page_size: int = PAGE_SIZE) -> int:
+    """Escribe un fichero Parquet (un row group por página); necesita pyarrow."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("la salida parquet necesita pyarrow (pip install pyarrow)")
+    names = columns(table)
+    # el id de las sesiones es texto; el de respuestas y recomendaciones, entero
+    integers = {"phase"} if table == "sessions" else {"id", "phase"}
+    schema = pa.schema([(n, pa.int64() if n in integers else pa.string()) for n in names])
+    rows = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        for page in iter_pages(table, start, end, page_size):
+            cols = list(zip(*page))
+            writer.write_table(pa.table({n: list(c) for n, c in zip(names, cols)}, schema=schema))
+            rows += len(page)
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m app.export')
+    parser.add_argument('table', choices=TABLES)
+    parser.add_argument('--format', choices=FORMATS, default='csv')
+    parser.add_argument('--start', default=None)
+    parser.add_argument('--end', default=None)
+    parser.add_argument('--output', default='-', help="fichero de salida ('-' = salida estándar)")
+    parser.add_argument('--db', default=None)
+    args = parser.parse_args(argv)
+
+    if args.db:
+        db.DB_PATH = args.db
+    if args.format == 'parquet':
+        if args.output == '-':
+            parser.error("parquet necesita --output")
+        n = write_parquet(args.output, args.table, args.start, args.end)
+        print(f"{n} filas escritas en {args.output}", file=sys.stderr)
+        return
+
+    chunks = iter_csv if args.format == 'csv' else iter_ndjson
+    out = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8', newline='')
+    try:
+        for chunk in chunks(args.table, args.start, args.end):
+            out.write(chunk)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,246 @@
+"""
+Forma congelada del árbol, basada en arrays paralelos, para servir en modo
+sólo lectura.
+
+Los nodos se guardan en orden de anchura (BFS), de modo que los hijos de
+cada nodo quedan contiguos: ``child_start[i]`` es la posición del primer
+hijo y ``child_count[i]`` cuántos tiene. Ids, textos, tipos, fases y padres
+van en listas/arrays paralelos; no hay un objeto por nodo.
+
+Las búsquedas por id no usan un dict: ``lookup`` tiene las posiciones de
+los ids distintos ordenadas por id (búsqueda binaria) y ``ranks`` el orden
+de cada uno en el recorrido en profundidad, el mismo que ``Node.index``.
+Así, cargado desde una instantánea (``app.snapshot``), todo son vistas
+sobre el fichero mapeado y el árbol se puede consultar y evaluar sin
+construir objetos por nodo en cada worker.
+"""
+import json
+from array import array
+from bisect import bisect_left
+from collections.abc import Mapping
+from functools import lru_cache
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+from app.tree_parser import Node
+
+NODE_TYPES = ("root", "phase", "question", "option", "recommendation")
+_TYPE_CODE = {t: i for i, t in enumerate(NODE_TYPES)}
+RECOMMENDATION = _TYPE_CODE["recommendation"]
+# fase ausente
+NO_PHASE = -1
+# ids cuya posición en lookup se recuerda (cada búsqueda binaria decodifica
+# unos log2(n) ids del fichero; las respuestas se repiten mucho)
+SLOT_CACHE = 4096
+
+
+class FrozenTree:
+    __slots__ = ("ids", "texts", "types", "phases", "parents", "child_start", "child_count",
+                 "lookup", "ranks", "_metadata", "slot")
+
+    def __init__(self, ids: Sequence[str], texts: Sequence[str], types: Sequence[int],
+                 phases: Sequence[int], parents: Sequence[int], child_start: Sequence[int],
+                 child_count: Sequence[int], lookup: Optional[Sequence[int]] = None,
+                 ranks: Optional[Sequence[int]] = None,
+                 metadata: Union[Dict[int, Dict], Callable[[], Dict[int, Dict]], None] = None):
+        self.ids = ids
+        self.texts = texts
+        self.types = types
+        self.phases = phases
+        self.parents = parents
+        self.child_start = child_start
+        self.child_count = child_count
+        if lookup is None:
+            lookup, ranks = self.build_lookup()
+        self.lookup = lookup
+        self.ranks = ranks
+        self.slot = lru_cache(maxsize=SLOT_CACHE)(self._slot)
+        # sólo los nodos que tienen metadatos; puede ser una función que los
+        # carga la primera vez que se piden (desde la instantánea)
+        self._metadata = metadata or {}
+
+    @classmethod
+    def from_node(cls, root: Node) -> "FrozenTree":
+        ids: List[str] = []
+        texts: List[str] = []
+        types = array("B")
+        phases = array("i")
+        parents = array("i")
+        child_start = array("I")
+        child_count = array("I")
+        metadata: Dict[int, Dict] = {}
+
+        queue = [(root, -1)]
+        head = 0
+        while head < len(queue):
+            node, parent = queue[head]
+            pos = head
+            head += 1
+            ids.append(node.id)
+            texts.append(node.text)
+            types.append(_TYPE_CODE[node.node_type])
+            phases.append(NO_PHASE if node.phase is None else node.phase)
+            parents.append(parent)
+            child_start.append(len(queue))
+            child_count.append(len(node.children))
+            if node.has_metadata():
+                metadata[pos] = node.metadata
+            queue.extend((child, pos) for child in node.children)
+
+        return cls(ids, texts, types, phases, parents, child_start, child_count, metadata=metadata)
+
+    def build_lookup(self) -> Tuple[array, array]:
+        """
+        ``lookup`` y ``ranks``: para cada id distinto, la posición de su
+        primera aparición en profundidad (como ``Node.build_index``) y su
+        orden en ese recorrido; ordenados por id.
+        """
+        first: Dict[str, Tuple[int, int]] = {}
+        stack = [0] if len(self.ids) else []
+        while stack:
+            i = stack.pop()
+            node_id = self.ids[i]
+            if node_id not in first:
+                first[node_id] = (i, len(first))
+            stack.extend(reversed(self.children(i)))
+        ordered = sorted(first)
+        return array("I", (first[k][0] for k in ordered)), array("I", (first[k][1] for k in ordered))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def id_count(self) -> int:
+        """Ids distintos (``len(root.index)`` del árbol de ``Node``)."""
+        return len(self.lookup)
+
+    @property
+    def metadata(self) -> Dict[int, Dict]:
+        if callable(self._metadata):
+            self._metadata = self._metadata()
+        return self._metadata
+
+    def node_type(self, i: int) -> str:
+        return NODE_TYPES[self.types[i]]
+
+    def phase(self, i: int) -> Optional[int]:
+        p = self.phases[i]
+        return None if p == NO_PHASE else p
+
+    def children(self, i: int) -> range:
+        start = self.child_start[i]
+        return range(start, start + self.child_count[i])
+
+    def _slot(self, node_id: str) -> int:
+        """Posición del id en ``lookup`` (búsqueda binaria), o -1; se usa a través de ``slot``."""
+        ids, lookup = self.ids, self.lookup
+        j = bisect_left(lookup, node_id, key=lambda pos: ids[pos])
+        if j < len(lookup) and ids[lookup[j]] == node_id:
+            return j
+        return -1
+
+    def find(self, node_id: str) -> int:
+        """Posición del nodo con ese id (el primero en profundidad, como ``Node.find``), o -1."""
+        j = self.slot(node_id)
+        return self.lookup[j] if j >= 0 else -1
+
+    def recommendation_texts(self, node_id: str) -> List[str]:
+        """Textos de los hijos de tipo recomendación (misma forma que ``Node.recommendation_texts``)."""
+        i = self.find(node_id)
+        if i < 0:
+            return []
+        types, texts = self.types, self.texts
+        return [texts[c] for c in self.children(i) if types[c] == RECOMMENDATION]
+
+    def order(self) -> "FrozenOrder":
+        return FrozenOrder(self)
+
+    def to_dict(self, i: int = 0) -> Dict:
+        """Mismo formato que ``Node.to_dict``."""
+        res = {
+            "id": self.ids[i],
+            "text": self.texts[i],
+            "type": NODE_TYPES[self.types[i]],
+            "children": [self.to_dict(c) for c in self.children(i)],
+        }
+        phase = self.phases[i]
+        if phase != NO_PHASE:
+            res["phase"] = phase
+        metadata = self.metadata
+        if i in metadata:
+            res["metadata"] = metadata[i]
+        return res
+
+    def to_node(self) -> Node:
+        """Reconstruye el árbol de ``Node`` (con índice y enlaces al padre)."""
+        nodes: List[Node] = []
+        metadata = self.metadata
+        for i in range(len(self.ids)):
+            node = Node(self.ids[i], self.texts[i], NODE_TYPES[self.types[i]])
+            phase = self.phases[i]
+            if phase != NO_PHASE:
+                node.phase = phase
+            if i in metadata:
+                node.metadata = dict(metadata[i])
+            parent = self.parents[i]
+            if parent >= 0:
+                nodes[parent].add_child(node)
+            nodes.append(node)
+        root = nodes[0]
+        root.build_index()
+        return root
+
+
+class FrozenOrder(Mapping):
+    """Id -> orden en profundidad, como ``evaluation.answer_order`` pero sin dict."""
+    __slots__ = ("tree",)
+
+    def __init__(self, tree: FrozenTree):
+        self.tree = tree
+
+    def __getitem__(self, node_id: str) -> int:
+        j = self.tree.slot(node_id)
+        if j < 0:
+            raise KeyError(node_id)
+        return self.tree.ranks[j]
+
+    def __iter__(self) -> Iterator[str]:
+        tree = self.tree
+        by_rank = sorted(range(len(tree.lookup)), key=tree.ranks.__getitem__)
+        return (tree.ids[tree.lookup[j]] for j in by_rank)
+
+    def __len__(self) -> int:
+        return self.tree.id_count
+
+
+class FrozenRules(Mapping):
+    """
+    Tabla de reglas (id -> {categoría: [recomendaciones]}) guardada como un
+    JSON por id, en el orden de ``lookup`` (vacío si el id no aporta nada).
+    Cada consulta decodifica sólo la entrada de ese id.
+    """
+    __slots__ = ("tree", "entries")
+
+    def __init__(self, tree: FrozenTree, entries: Sequence[str]):
+        self.tree = tree
+        self.entries = entries
+
+    @staticmethod
+    def pack(tree: FrozenTree, rule_table: Dict[str, Dict[str, List[str]]]) -> List[str]:
+        """Las entradas de ``rule_table`` en el orden de ``tree.lookup``."""
+        ids = tree.ids
+        return [json.dumps(rule_table[ids[pos]], ensure_ascii=False) if ids[pos] in rule_table else ""
+                for pos in tree.lookup]
+
+    def __getitem__(self, node_id: str) -> Dict[str, List[str]]:
+        j = self.tree.slot(node_id)
+        entry = self.entries[j] if j >= 0 else ""
+        if not entry:
+            raise KeyError(node_id)
+        return json.loads(entry)
+
+    def __iter__(self) -> Iterator[str]:
+        tree = self.tree
+        return (tree.ids[tree.lookup[j]] for j in range(len(tree.lookup)) if self.entries[j])
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
@@ -1,18 +1,22 @@
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi import FastAPI, HTTPException, Request, Header, Depends
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
 import uvicorn
-import os
 import json
+import logging
+import os
 from datetime import datetime
-from app.tree_parser import parse_flujo, Node
-import sqlite3
-from pathlib import Path
+from app.categorizer import CATEGORIES
+from app import db, session_log, payloads, writer, analytics, export, maintenance, metrics, profiling, registry
+from app import state as tree_state
+from app.state import TreeState, FlujoWatcher
+from app.writebehind import WriteBehindQueue
+from fastapi.concurrency import run_in_threadpool
 
-DB_PATH = os.path.join(os.path.dirname(__file__), '..', 'data.db')
+logger = logging.getLogger(__name__)
 
 app = FastAPI(title="Asistente de Selección Tecnológica")
 
@@ -44,129 +48,132 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-endpoint latency histograms for /metrics (ARBOL_METRICS=1); added last
+# so it is the outermost middleware and times the whole request
+if metrics.ENABLED:
+    app.add_middleware(metrics.LatencyMiddleware)
+
 # Mount static files
 static_dir = os.path.join(os.path.dirname(__file__), 'static')
 app.mount("/static", StaticFiles(directory=static_dir), name="static")
 
-# Load tree at startup
-ROOT = None
+# Multi-worker mode (see app.serve): rows go to the single writer process
+# over ARBOL_WRITER_SOCKET instead of opening our own SQLite connection
+WRITER = writer.get_client()
+write_rows = WRITER.write_rows if WRITER is not None else db.write_rows
+
+# Optional write-behind persistence: handlers enqueue rows and return
+# without waiting for the SQLite commit (ARBOL_WRITE_BEHIND=1)
+WRITE_BEHIND: Optional[WriteBehindQueue] = None
+if os.environ.get('ARBOL_WRITE_BEHIND', '').lower() in ('1', 'true', 'yes'):
+    WRITE_BEHIND = WriteBehindQueue(
+        writer=write_rows,
+        max_batch=int(os.environ.get('ARBOL_WRITE_BEHIND_BATCH', '500')),
+        max_delay=float(os.environ.get('ARBOL_WRITE_BEHIND_DELAY', '0.05')),
+        retries=int(os.environ.get('ARBOL_WRITE_BEHIND_RETRIES', '3')),
+    )
+
+# Optional background watcher that reloads flujo.txt when it changes
+# (ARBOL_WATCH_INTERVAL seconds, 0 = disabled; POST /admin/reload always works)
+WATCHER: Optional[FlujoWatcher] = None
+_watch_interval = float(os.environ.get('ARBOL_WATCH_INTERVAL', '0'))
+if _watch_interval > 0:
+    WATCHER = FlujoWatcher(_watch_interval)
+
+# Periodic retention/vacuum/ANALYZE (ARBOL_MAINTENANCE_INTERVAL seconds, 0 = disabled);
+# in multi-worker mode the writer process runs it instead
+MAINTENANCE = maintenance.scheduler() if WRITER is None else None
+
+# token for /admin endpoints; if unset they are open (local deployments)
+ADMIN_TOKEN = os.environ.get('ARBOL_ADMIN_TOKEN')
+
 
 @app.on_event("startup")
-@app.on_event("startup")
-@app.on_event("startup")
-@app.on_event("startup")
-def load_tree():
-    global ROOT
-
-    posibles_rutas = [
-        os.path.join(os.path.dirname(__file__), 'flujo.txt'),
-        os.path.join(os.path.dirname(__file__), '..', 'flujo.txt'),
-        os.path.join(os.path.dirname(__file__), '..', '..', 'flujo.txt'),
-        os.path.join(Path.cwd(), 'flujo.txt'),
-    ]
-
-    flujo_path = None
-    for ruta in posibles_rutas:
-        if os.path.exists(ruta):
-            flujo_path = ruta
-            break
-
-    if flujo_path is None:
-        raise RuntimeError("No se encontró flujo.txt en ninguna de las rutas esperadas")
-
-    print(f"✅ Archivo flujo.txt encontrado en: {flujo_path}")
-
-    with open(flujo_path, 'r', encoding='utf-8') as f:
-        text = f.read()
-
-    # 🔹 Aquí se construye el árbol base
-   # 🔹 Aquí se construye el árbol base
-    ROOT = parse_flujo(text)
-
-    # 🔹 Añadir recomendaciones globales al árbol
-    frontend_rec = Node("rec_frontend", "React + Vite (Frontend rápido y moderno)", "recommendation")
-    backend_rec = Node("rec_backend", "Node.js con Express (Backend ágil y escalable)", "recommendation")
-    db_rec = Node("rec_db", "PostgreSQL (Base de datos relacional confiable)", "recommendation")
-    arch_rec = Node("rec_arch", "Microservicios con escalado horizontal", "recommendation")
-    meth_rec = Node("rec_meth", "Scrum o Kanban (metodologías ágiles)", "recommendation")
-    sec_rec = Node("rec_sec", "Implementa JWT, HTTPS y backups regulares", "recommendation")
-
-    # 🔹 Crear un nodo final de recomendaciones generales
-    final_recs = Node("phase_final", "📌 Recomendaciones generales", "phase")
-    final_recs.add_child(frontend_rec)
-    final_recs.add_child(backend_rec)
-    final_recs.add_child(db_rec)
-    final_recs.add_child(arch_rec)
-    final_recs.add_child(meth_rec)
-    final_recs.add_child(sec_rec)
-
-    ROOT.add_child(final_recs)
-
-    # 🔹 Conectar al árbol raíz
-    ROOT.add_child(final_recs)
-
-    # Inicializar base de datos
-    init_db()
-
-
-def get_db_conn():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
-
-
-def init_db():
-    # create database and tables if not exist
-    conn = get_db_conn()
-    cur = conn.cursor()
-    cur.execute('''
-    CREATE TABLE IF NOT EXISTS sessions (
-        id TEXT PRIMARY KEY,
-        timestamp TEXT
-    )
-    ''')
-    cur.execute('''
-    CREATE TABLE IF NOT EXISTS answers (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        session_id TEXT,
-        question_id TEXT,
-        answer_id TEXT,
-        phase INTEGER,
-        FOREIGN KEY(session_id) REFERENCES sessions(id)
-    )
-    ''')
-    cur.execute('''
-    CREATE TABLE IF NOT EXISTS recommendations (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        session_id TEXT,
-        category TEXT,
-        recommendation TEXT,
-        FOREIGN KEY(session_id) REFERENCES sessions(id)
-    )
-    ''')
-    conn.commit()
-    conn.close()
+async def startup():
+    # parse flujo.txt and build indexes/caches once, before serving requests
+    tree_state.reload()
+    if WRITER is None:
+        # in multi-worker mode the writer process owns the schema
+        db.init_db()
+    if WRITE_BEHIND is not None:
+        await WRITE_BEHIND.start()
+    if WATCHER is not None:
+        await WATCHER.start()
+    if MAINTENANCE is not None:
+        await MAINTENANCE.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    if MAINTENANCE is not None:
+        await MAINTENANCE.stop()
+    if WATCHER is not None:
+        await WATCHER.stop()
+    if WRITE_BEHIND is not None:
+        # flush everything still queued before closing the connections
+        await WRITE_BEHIND.stop()
+    db.close_all()
+
+
+def current_state(questionnaire: Optional[str] = None, version: Optional[str] = None) -> TreeState:
+    """
+    Tree snapshot for one request; a reload meanwhile doesn't affect it.
+    Used as a dependency: ?questionnaire=&version= pick a tree from the
+    registry (loaded on first use, in the threadpool), otherwise the default flow.
+    """
+    if questionnaire is not None:
+        reg = registry.get_registry()
+        if reg is None:
+            raise HTTPException(status_code=404, detail="No questionnaire registry configured")
+        try:
+            return reg.get(questionnaire, version)
+        except registry.UnknownQuestionnaire as exc:
+            raise HTTPException(status_code=404, detail=str(exc))
+    state = tree_state.get_state()
+    if state is None:
+        raise HTTPException(status_code=500, detail="Tree not loaded")
+    return state
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if ADMIN_TOKEN and x_admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+
+def profile_request(request: Request, endpoint: str) -> profiling.RequestProfile:
+    """Profile this request if asked via X-Profile (admins only) or armed with POST /admin/profiling."""
+    header = request.headers.get("x-profile")
+    authorized = not ADMIN_TOKEN or request.headers.get("x-admin-token") == ADMIN_TOKEN
+    return profiling.RequestProfile(endpoint, profiling.requested_mode(header, authorized))
+
+
+def with_profile_id(response: Response, profile: profiling.RequestProfile) -> Response:
+    if profile.id is not None:
+        response.headers["X-Profile-Id"] = profile.id
+    return response
+
+
+async def persist_rows(sessions, answers, recommendations=()):
+    """Write rows now (off the event loop) or hand them to the write-behind queue."""
+    if WRITE_BEHIND is not None:
+        await WRITE_BEHIND.put(sessions, answers, recommendations)
+    else:
+        await run_in_threadpool(write_rows, sessions, answers, recommendations)
+
 
 @app.get("/tree")
-def get_tree():
-    global ROOT
-    if ROOT is None:
-        load_tree()
-    if ROOT is None:
-        raise HTTPException(status_code=500, detail="Tree not loaded")
-    return JSONResponse(content=ROOT.to_dict())
+def get_tree(request: Request, state: TreeState = Depends(current_state)):
+    return state.rendered.response(request, "tree", lambda: payloads.tree_payload(state.root))
 
 @app.get("/decision")
-def get_decision(side: str = "left"):
-    if ROOT is None:
-        raise HTTPException(status_code=500, detail="Tree not loaded")
+def get_decision(request: Request, side: str = "left", state: TreeState = Depends(current_state)):
     side = side.lower()
     if side not in ("left", "right"):
         raise HTTPException(status_code=400, detail="side must be 'left' or 'right'")
-    node = ROOT.get_side(side)
-    if node is None:
+    # warm() renders every side that exists
+    if ("decision", side) not in state.rendered:
         raise HTTPException(status_code=404, detail="Side not found")
-    return JSONResponse(content=node.to_dict())
+    return state.rendered.response(request, ("decision", side), lambda: payloads.decision_payload(state.root, side))
 
 class Question(BaseModel):
     id: str
@@ -174,319 +181,228 @@ class Question(BaseModel):
     options: List[Dict[str, str]]
 
 @app.get("/questions/{phase}")
-async def get_questions(phase: int):
-    global ROOT
-    if ROOT is None:
-        load_tree()
-    if ROOT is None:
-        raise HTTPException(status_code=500, detail="Tree not loaded")
-    
-    questions = ROOT.get_phase_questions(phase)
-    
-    result = []
-    for q in questions:
-        options = []
-        for child in q.children:
-            if child.node_type == "option":
-                display_text = child.text
-                if getattr(child, 'children', None):
-                    recs = [c.text for c in child.children if getattr(c, 'node_type', '') == 'recommendation']
-                    if recs:
-                        display_text = ' / '.join(recs)
-                option_data = {"id": child.id, "text": display_text, "label": child.text}
-                if child.metadata:
-                    option_data["metadata"] = child.metadata
-                options.append(option_data)
-        
-        question_data = {
-            "id": q.id,
-            "text": q.text,
-            "options": options,
-            "phase": phase
-        }
-        if q.metadata:
-            question_data["metadata"] = q.metadata
-        result.append(question_data)
-    
-    return result
+async def get_questions(phase: int, request: Request, state: TreeState = Depends(current_state)):
+    # warm() renders every phase that exists; any other number has no questions
+    # and isn't stored, so arbitrary numbers can't grow the cache
+    return state.rendered.response(request, ("questions", phase), list, store=False)
 
 @app.post("/evaluate")
-async def evaluate_answers(answers: List[Answer]):
-    if ROOT is None:
-        raise HTTPException(status_code=500, detail="Tree not loaded")
-    
-    # Helper: find node by id
-    def find_node(node: Node, node_id: str) -> Optional[Node]:
-        if node.id == node_id:
-            return node
-        for c in node.children:
-            found = find_node(c, node_id)
-            if found:
-                return found
-        return None
-    def categorize(text: str) -> str:
-        t = text.lower()
-        keywords = {
-            'frontend': ['react', 'vue', 'angular', 'svelte', 'html', 'css', 'spa', 'webgl', 'canvas', 'frontend', 'ui', 'ux', 'tailwind', 'bootstrap'],
-            'backend': ['node', 'django', 'flask', 'spring', 'java', 'go', 'rust', 'php', 'express', 'laravel', 'backend', 'api', 'servidor'],
-            'database': ['sql', 'mysql', 'postgres', 'postgresql', 'mongodb', 'firebase', 'hadoop', 'spark', 'database', 'db', 'sqlite', 'oracle', 'nosql'],
-            'architecture': ['microserv', 'monolit', 'arquitectura', 'cloud', 'kubernetes', 'docker', 'serverless', 'cloud-native', 'infraestructura', 'scalable'],
-            'methodology': ['scrum', 'kanban', 'waterfall', 'mvp', 'metodolog', 'ágil', 'agile', 'iterativo', 'devops'],
-            'security': ['oauth', 'jwt', 'ssl', 'cifrado', 'security', 'compliance', 'iso', 'auth', 'seguridad', 'sso', 'protección'],
-        }
-
-        for category, keys in keywords.items():
-            if any(k in t for k in keys):
-                return category
-
-        # Si no se reconoce, devolver 'other' en lugar de 'backend'
-        return 'other'
-
-    # Collect recommendation texts from selected options
-    rec_texts = []
-    for ans in answers:
-        opt = find_node(ROOT, ans.answerId)
-        if opt:
-            # collect recommendation-type children under the option
-            for child in opt.children:
-                if getattr(child, 'node_type', '') == 'recommendation':
-                    rec_texts.append(child.text)
-
-    if not rec_texts:
-        # Si no hay recomendaciones derivadas, usar las globales que agregamos al árbol
-        global_recs = [
-            "React + Vite (Frontend rápido y moderno)",
-            "Node.js con Express (Backend ágil y escalable)",
-            "PostgreSQL (Base de datos relacional confiable)",
-            "Microservicios con escalado horizontal",
-            "Scrum o Kanban (metodologías ágiles)",
-            "Implementa JWT, HTTPS y backups regulares"
-        ]
-        rec_texts.extend(global_recs)
-
-    # Deduplicate preserving order
-    seen = set()
-    rec_texts_unique = []
-    for r in rec_texts:
-        if r not in seen:
-            seen.add(r)
-            rec_texts_unique.append(r)
-
-    # categorize
-    recommendations: Dict[str, List[str]] = {
-        'frontend': [],
-        'backend': [],
-        'database': [],
-        'architecture': [],
-        'methodology': [],
-        'security': [],
-        'other': []  # ← agregamos esta categoría extra
-    }
-
-    for r in rec_texts_unique:
-        cat = categorize(r)
-        if cat not in recommendations:
-            recommendations["other"].append(r)
-        else:
-            recommendations[cat].append(r)
-
-
-    # RULE-BASED ENRICHMENT: apply more precise recommendations based on answers
-    # Helper to get option text and question text
-    def get_option_and_question_text(answer: Answer):
-        opt_node = find_node(ROOT, answer.answerId)
-        if not opt_node:
-            return None, None
-        # find parent question by searching nodes whose children include opt_node
-        parent_q = None
-        def find_parent(node: Node):
-            nonlocal parent_q
-            for c in node.children:
-                if c is opt_node:
-                    parent_q = node
-                    return True
-                if find_parent(c):
-                    return True
-            return False
-        find_parent(ROOT)
-        return opt_node.text, (parent_q.text if parent_q else None)
-
-    for ans in answers:
-        opt_text, q_text = get_option_and_question_text(ans)
-        if not opt_text or not q_text:
-            continue
-        qt = q_text.lower()
-        ot = opt_text.lower()
-
-        # Tipo de Aplicación
-        if 'tipo' in qt and 'aplicaci' in qt:
-            if 'web' in ot:
-                recommendations['frontend'].extend(['React', 'Vue.js', 'HTML5/CSS3'])
-                recommendations['backend'].extend(['Node.js (Express)', 'Django (Python)'])
-                recommendations['database'].append('PostgreSQL')
-                recommendations['architecture'].append('Monolito modulable / Microservicios según escala')
-            elif 'móvil' in ot or 'movil' in ot:
-                recommendations['frontend'].extend(['React Native', 'Flutter'])
-                recommendations['backend'].append('Node.js / Django')
-                recommendations['database'].append('PostgreSQL / Firebase (según necesidades)')
-                recommendations['architecture'].append('Backend escalable (Microservicios si es enterprise)')
-            elif 'escritorio' in ot:
-                recommendations['frontend'].append('Electron / Tauri')
-                recommendations['backend'].append('Go / .NET / Java')
-            elif 'híbrida' in ot:
-                recommendations['frontend'].extend(['Ionic', 'Capacitor', 'React Native'])
-                recommendations['backend'].append('Node.js')
-            elif 'enterprise' in ot or 'enterpris' in ot:
-                recommendations['backend'].extend(['Java (Spring)', 'Go'])
-                recommendations['architecture'].append('Arquitectura enterprise, alta disponibilidad')
-
-        # Ámbito Principal
-        if 'ámbito' in qt or 'ambito' in qt:
-            # accept multiple user-friendly synonyms
-            if any(k in ot for k in ['b2c', 'consumidor', 'consumo', 'cliente', 'público', 'publico', 'público general', 'público general']):
-                recommendations['frontend'].append('SPA (React/Vue) con enfoque UX y rendimiento')
-                recommendations['backend'].append('Node.js con CDN y caching')
-                recommendations['methodology'].append('Ágil (Ciclos cortos, MVP)')
-            elif any(k in ot for k in ['b2b', 'empresa', 'empresas', 'negocio', 'negocios']):
-                recommendations['backend'].append('Java Spring / .NET para mantenibilidad y SLAs')
-                recommendations['security'].append('OAuth2, SSO, cumplimiento de normativas')
-                recommendations['database'].append('PostgreSQL / Oracle')
-            elif any(k in ot for k in ['interna', 'uso interno', 'herramienta interna', 'interno']):
-                recommendations['backend'].append('Python (Django/Flask) para rapidez de desarrollo')
-                recommendations['database'].append('SQLite / PostgreSQL según tamaño')
-            elif any(k in ot for k in ['educacional', 'educacion', 'formacion', 'formación']):
-                recommendations['frontend'].append('React/Vanilla + accesibilidad (a11y)')
-                recommendations['methodology'].append('MVP + feedback de usuarios')
-            elif any(k in ot for k in ['comercio', 'comercio electrónico', 'e-commerce', 'ventas', 'ventas en línea']):
-                # E-commerce specific suggestions
-                recommendations['frontend'].append('React + librerías de comercio (o Headless CMS)')
-                recommendations['backend'].append('Node.js / Django con integración de pasarelas de pago (Stripe/PayPal)')
-                recommendations['database'].append('PostgreSQL / Managed DB con respaldo y escalado')
-                recommendations['architecture'].append('CDN, caching, búsqueda (ElasticSearch), escalado horizontal')
-                recommendations['security'].append('PCI-DSS considerations, HTTPS, protección contra fraudes')
-
-        # Característica prioritaria
-        if 'característica' in qt or 'caracteristica' in qt:
-            if 'velocidad' in ot or 'rápido' in ot:
-                recommendations['backend'].append('Node.js / Serverless (deploy rápido)')
-                recommendations['methodology'].append('Ciclos cortos, prototipado rápido')
-            if 'alto rendimiento' in ot or 'rendimiento' in ot:
-                recommendations['backend'].append('Go / Rust')
-                recommendations['architecture'].append('Servicios optimizados, benchmarking')
-            if 'escalabilidad' in ot:
-                recommendations['architecture'].append('Microservicios + Kubernetes')
-
-        # Tipo de interfaz
-        if 'interfaz' in qt:
-            if 'simple' in ot:
-                recommendations['frontend'].append('HTML/CSS/JS simple')
-            if 'interactiva' in ot:
-                recommendations['frontend'].append('SPA (React/Vue)')
-            if 'rica' in ot:
-                recommendations['frontend'].append('WebGL / Canvas')
-            if 'tiempo real' in ot or 'real' in ot:
-                recommendations['architecture'].append('Sockets / WebRTC (ej: Socket.IO)')
-
-        # Gestión de datos
-        if 'estructura' in qt or 'estructura de datos' in qt:
-            if 'estructurada' in ot:
-                recommendations['database'].append('RDBMS (PostgreSQL, MySQL)')
-            if 'semi' in ot:
-                recommendations['database'].append('MongoDB / Firebase')
-            if 'no estructurada' in ot or 'no estructur' in ot:
-                recommendations['database'].append('Data lake / almacenamiento en blob (S3)')
-
-        # Volumen
-        if 'volumen' in qt:
-            if 'pequeño' in ot:
-                recommendations['database'].append('DB local o soluciones gratuitas (SQLite, managed small DB)')
-            if 'grande' in ot or 'masivo' in ot:
-                recommendations['architecture'].append('Escalado horizontal, shards, particionado')
-
-        # Seguridad e integraciones
-        if 'integraciones' in qt or 'pagos' in qt:
-            if 'pagos' in ot or 'stripe' in ot or 'paypal' in ot:
-                recommendations['backend'].append('Integración con Stripe/PayPal SDKs')
-        if 'seguridad' in qt:
-            if 'enterprise' in ot or 'compliance' in ot or 'iso' in ot:
-                recommendations['security'].append('Compliance ISO, SSO, auditoría y logging')
-            if 'cifrado' in ot or 'extremo' in ot:
-                recommendations['security'].append('Cifrado extremo a extremo, gestión de claves')
-
-    # Deduplicate recommendations per category
-    for k in recommendations:
-        seen_k = set()
-        out = []
-        for it in recommendations[k]:
-            if it not in seen_k:
-                seen_k.add(it)
-                out.append(it)
-        recommendations[k] = out
-
-    # persist session + answers + recommendations to sqlite
-    session_id = datetime.utcnow().strftime('%Y%m%d%H%M%S%f')
-    conn = get_db_conn()
-    cur = conn.cursor()
-    try:
-        cur.execute('INSERT OR IGNORE INTO sessions(id, timestamp) VALUES(?, ?)', (session_id, datetime.utcnow().isoformat()))
-        for a in answers:
-            cur.execute('INSERT INTO answers(session_id, question_id, answer_id, phase) VALUES(?, ?, ?, ?)',
-                        (session_id, a.questionId, a.answerId, a.phase))
-        for cat, items in recommendations.items():
-            for it in items:
-                cur.execute('INSERT INTO recommendations(session_id, category, recommendation) VALUES(?, ?, ?)',
-                            (session_id, cat, it))
-        conn.commit()
-    finally:
-        conn.close()
-
-    return Recommendation(**recommendations)
+async def evaluate_answers(answers: List[Answer], request: Request, state: TreeState = Depends(current_state)):
+    with profile_request(request, "/evaluate") as profile:
+        # canonical answer set: same selected options -> same cached result
+        recommendations = state.evaluate(a.answerId for a in answers)
+
+        # persist session + answers + recommendations to sqlite (off the event loop)
+        now = datetime.utcnow()
+        session_id = now.strftime('%Y%m%d%H%M%S%f')
+        await persist_rows(
+            [(session_id, now.isoformat(), state.questionnaire, state.version)],
+            db.answer_rows(session_id, answers),
+            db.recommendation_rows(session_id, recommendations),
+        )
+
+        response = recommendation_response(recommendations)
+    return with_profile_id(response, profile)
+
+@metrics.timed("json_serialization")
+def recommendation_response(recommendations: Dict[str, List[str]]) -> JSONResponse:
+    return JSONResponse(content=Recommendation(**recommendations).model_dump())
+
+# answer sets evaluated (and persisted) per threadpool round trip in /evaluate/batch
+BATCH_CHUNK = 500
+
+@app.post("/evaluate/batch")
+async def evaluate_batch(answer_sets: List[List[Answer]], persist: bool = False,
+                         state: TreeState = Depends(current_state)):
+    """
+    Evaluate many answer sets in one request. Results stream back as NDJSON,
+    one line per set in input order: {"index": i, "frontend": [...], ...}.
+    With ?persist=true every set is stored as a session, written in bulk;
+    each chunk is written before its lines are sent. The status line is
+    already out by then, so a failed write ends the stream with
+    {"error": ..., "persisted": n} (n = sets stored before the failure).
+    """
+    now = datetime.utcnow()
+    base_id = now.strftime('%Y%m%d%H%M%S%f')
+    memo: Dict = {}
+
+    def run_chunk(start: int, chunk: List[List[Answer]]):
+        results = list(state.evaluate_batch(([a.answerId for a in answers] for answers in chunk), memo))
+        rows = None
+        if persist:
+            sessions, answer_rows, rec_rows = [], [], []
+            for i, (answers, recs) in enumerate(zip(chunk, results), start):
+                session_id = f"{base_id}-{i}"
+                sessions.append((session_id, now.isoformat(), state.questionnaire, state.version))
+                answer_rows.extend(db.answer_rows(session_id, answers))
+                rec_rows.extend(db.recommendation_rows(session_id, recs))
+            rows = (sessions, answer_rows, rec_rows)
+        lines = "".join(
+            json.dumps({"index": i, **{c: recs[c] for c in CATEGORIES}}, ensure_ascii=False) + "\n"
+            for i, recs in enumerate(results, start)
+        )
+        return lines, rows
+
+    async def body():
+        for start in range(0, len(answer_sets), BATCH_CHUNK):
+            lines, rows = await run_in_threadpool(run_chunk, start, answer_sets[start:start + BATCH_CHUNK])
+            if rows is not None:
+                try:
+                    await persist_rows(*rows)
+                except Exception as exc:
+                    logger.exception("evaluate/batch: failed to persist sets from %d on", start)
+                    yield json.dumps({"error": str(exc), "persisted": start}, ensure_ascii=False) + "\n"
+                    return
+            yield lines
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
 
 @app.post("/save-session")
-async def save_session(session: ProjectSession):
-    # Save session into SQLite DB (and keep JSON file as optional backup)
-    conn = get_db_conn()
-    cur = conn.cursor()
-    try:
-        cur.execute('INSERT OR IGNORE INTO sessions(id, timestamp) VALUES(?, ?)', (session.id, session.timestamp.isoformat()))
-        for a in session.answers:
-            cur.execute('INSERT INTO answers(session_id, question_id, answer_id, phase) VALUES(?, ?, ?, ?)',
-                        (session.id, a.questionId, a.answerId, a.phase))
-        conn.commit()
-    finally:
-        conn.close()
-
-    # optional: also append to sessions.json for human-readable backup
+async def save_session(session: ProjectSession, state: TreeState = Depends(current_state)):
+    # Save session into SQLite DB (and keep JSON file as optional backup);
+    # tagged with the tree the answers belong to (same ?questionnaire=&version=)
+    await persist_rows(
+        [(session.id, session.timestamp.isoformat(), state.questionnaire, state.version)],
+        db.answer_rows(session.id, session.answers),
+    )
+
+    # optional: also append to the sessions.jsonl log for human-readable backup
     try:
-        sessions_file = "sessions.json"
-        sessions = []
-        if os.path.exists(sessions_file):
-            with open(sessions_file, 'r') as f:
-                sessions = json.load(f)
         session_dict = session.dict()
         session_dict["timestamp"] = session_dict["timestamp"].isoformat()
-        sessions.append(session_dict)
-        with open(sessions_file, 'w') as f:
-            json.dump(sessions, f, indent=2)
+        await run_in_threadpool(session_log.append, session_dict)
     except Exception:
         # non-fatal if file write fails
         pass
 
     return {"status": "success", "session_id": session.id}
 
+@app.post("/admin/reload", dependencies=[Depends(require_admin)])
+async def admin_reload(force: bool = False):
+    # parse and build the new tree in the threadpool; requests keep being
+    # served from the current state until the new one is swapped in
+    try:
+        state = await run_in_threadpool(tree_state.reload, None, force)
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=f"No se pudo recargar el flujo: {exc}")
+    return state.info()
+
+@app.get("/questionnaires")
+def list_questionnaires():
+    """Questionnaires in the registry and their versions (the last one is served by default)."""
+    reg = registry.get_registry()
+    listing = reg.questionnaires() if reg is not None else {}
+    default = tree_state.get_state()
+    return {
+        "default": default.version if default is not None else None,
+        "questionnaires": {q: {"versions": v, "latest": v[-1]} for q, v in listing.items()},
+    }
+
+@app.get("/admin/registry", dependencies=[Depends(require_admin)])
+def admin_registry():
+    reg = registry.get_registry()
+    if reg is None:
+        return {"enabled": False}
+    return {"enabled": True, **reg.stats()}
+
+@app.get("/admin/tree", dependencies=[Depends(require_admin)])
+def admin_tree_info(state: TreeState = Depends(current_state)):
+    return state.info()
+
+@app.get("/admin/write-behind", dependencies=[Depends(require_admin)])
+def write_behind_stats():
+    if WRITE_BEHIND is None:
+        return {"enabled": False}
+    return {"enabled": True, **WRITE_BEHIND.stats()}
+
+@app.post("/admin/profiling", dependencies=[Depends(require_admin)])
+def admin_arm_profiling(count: int = 1, mode: str = "cprofile"):
+    """Profile the next `count` /evaluate or /api/questions requests (count=0 disarms)."""
+    try:
+        return profiling.arm(count, mode)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+@app.get("/admin/profiles", dependencies=[Depends(require_admin)])
+def admin_list_profiles():
+    return {"armed": profiling.armed(), "keep": profiling.KEEP, "profiles": profiling.listing()}
+
+@app.get("/admin/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+def admin_download_profile(profile_id: str):
+    profile = profiling.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found (only the most recent ones are kept)")
+    headers = {"Content-Disposition": f'attachment; filename="{profile.filename}"'}
+    return Response(content=profile.data, media_type=profile.media_type, headers=headers)
+
+@app.delete("/admin/profiles", dependencies=[Depends(require_admin)])
+def admin_clear_profiles():
+    profiling.clear()
+    return {"status": "cleared"}
+
+async def run_analytics(query, *args, **kwargs):
+    """Run an analytics query on this thread's read connection; bad cursors/params -> 400."""
+    def run():
+        return query(db.get_db_conn(), *args, **kwargs)
+    try:
+        return await run_in_threadpool(run)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+@app.get("/analytics/recommendations/top", dependencies=[Depends(require_admin)])
+async def analytics_top_recommendations(category: str, limit: int = 20, cursor: Optional[str] = None):
+    return await run_analytics(analytics.top_recommendations, category, limit, cursor)
+
+@app.get("/analytics/questions/{question_id}/answers", dependencies=[Depends(require_admin)])
+async def analytics_answer_distribution(question_id: str, limit: int = 100, cursor: Optional[str] = None):
+    return await run_analytics(analytics.answer_distribution, question_id, limit, cursor)
+
+@app.get("/analytics/sessions/timeline", dependencies=[Depends(require_admin)])
+async def analytics_sessions_timeline(bucket: str = "hour", start: Optional[str] = None, end: Optional[str] = None,
+                                      limit: int = 100, cursor: Optional[str] = None):
+    return await run_analytics(analytics.sessions_per_bucket, bucket, start, end, limit, cursor)
+
+@app.get("/analytics/sessions", dependencies=[Depends(require_admin)])
+async def analytics_sessions(start: Optional[str] = None, end: Optional[str] = None,
+                             limit: int = 100, cursor: Optional[str] = None):
+    return await run_analytics(analytics.list_sessions, start, end, limit, cursor)
+
+@app.get("/analytics/sessions/{session_id}", dependencies=[Depends(require_admin)])
+async def analytics_session_detail(session_id: str):
+    detail = await run_analytics(analytics.session_detail, session_id)
+    if detail is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return detail
+
+@app.get("/export/{table}", dependencies=[Depends(require_admin)])
+def export_table(table: str, format: str = "ndjson", start: Optional[str] = None, end: Optional[str] = None):
+    # pages are read and encoded one at a time in the threadpool; memory stays flat
+    if table not in export.TABLES:
+        raise HTTPException(status_code=404, detail="Unknown table")
+    if format == "csv":
+        chunks, media_type = export.iter_csv(table, start, end), "text/csv; charset=utf-8"
+    elif format == "ndjson":
+        chunks, media_type = export.iter_ndjson(table, start, end), "application/x-ndjson"
+    else:
+        raise HTTPException(status_code=400, detail="format must be 'csv' or 'ndjson' (parquet: python -m app.export)")
+    headers = {"Content-Disposition": f'attachment; filename="{table}.{format}"'}
+    return StreamingResponse(chunks, media_type=media_type, headers=headers)
+
+@app.get("/metrics")
+def get_metrics():
+    # Prometheus text format; per process (each worker reports its own)
+    state = tree_state.get_state()
+    caches = []
+    if state is not None:
+        caches = [("evaluate", state.eval_cache.stats()), ("rendered", state.rendered.stats())]
+        if state.precomputed is not None:
+            caches.append(("precomputed", state.precomputed.stats()))
+    write_behind = WRITE_BEHIND.stats() if WRITE_BEHIND is not None else None
+    return Response(content=metrics.render(state, caches, write_behind), media_type=metrics.CONTENT_TYPE)
+
 @app.get("/phases")
-def get_phases():
-    global ROOT
-    if ROOT is None:
-        load_tree()
-    if ROOT is None:
-        raise HTTPException(status_code=500, detail="Tree not loaded")
-    phases = []
-    for node in ROOT.children:
-        # buscar nodos de tipo 'phase'
-        if getattr(node, 'node_type', '') == 'phase' or node.id.startswith('phase'):
-            phases.append({"id": node.id, "text": node.text})
-    return phases
+def get_phases(request: Request, state: TreeState = Depends(current_state)):
+    return state.rendered.response(request, "phases", lambda: payloads.phases_payload(state.root))
 
 @app.get("/")
 def index():
@@ -494,36 +410,11 @@ def index():
     return FileResponse(static_index, media_type='text/html')
 
 @app.get("/api/questions")
-def api_questions():
-    global ROOT
-    if ROOT is None:
-        load_tree()
-    if ROOT is None:
-        raise HTTPException(status_code=500, detail="Tree not loaded")
-
-    # mapeo coloquial para opciones específicas
-    colloquial_map = {
-        "B2C": "Consumidores — gente/usuarios finales",
-        "B2B": "Empresas — clientes/organizaciones",
-        "Interna": "Uso interno — solo para tu equipo/empresa"
-    }
-
-    out = []
-    for phase in ROOT.children:
-        node = phase.to_dict()
-        # recorrer preguntas y opciones y aplicar texto coloquial si corresponde
-        for child in node.get("children", []):
-            if child.get("type") == "question":
-                for opt in child.get("children", []):
-                    if opt.get("type") == "option":
-                        txt = opt.get("text", "")
-                        if txt in colloquial_map:
-                            # reemplaza el texto mostrado por una versión más coloquial
-                            opt["text"] = colloquial_map[txt]
-                            # opcional: dejar el valor original en otra clave
-                            opt["original_text"] = txt
-        out.append(node)
-    return out
+def api_questions(request: Request, state: TreeState = Depends(current_state)):
+    with profile_request(request, "/api/questions") as profile:
+        response = state.rendered.response(
+            request, "api_questions", lambda: payloads.api_questions_payload(state.root))
+    return with_profile_id(response, profile)
 
 if __name__ == '__main__':
     uvicorn.run('app.main:app', host='127.0.0.1', port=8000, reload=True)
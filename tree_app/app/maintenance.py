@@ -0,0 +1,318 @@
+"""
+Mantenimiento de data.db para despliegues de larga duración.
+
+- Retención: las sesiones con más de ``ARBOL_RETENTION_DAYS`` días se
+  mueven, con sus respuestas y recomendaciones, a un fichero de archivo por
+  mes (``archive/data-2024-01.db`` junto a la base de datos) y se borran de
+  la principal. Los contadores de ``app.rollups`` se descuentan en la misma
+  transacción. Con ``ARBOL_ARCHIVE=0`` se borran sin archivar y con
+  ``ARBOL_ARCHIVE_KEEP=N`` sólo se conservan los N ficheros más recientes.
+- Compactación: las bases de datos nuevas se crean con
+  ``auto_vacuum=INCREMENTAL`` y cada pasada devuelve al sistema las páginas
+  libres con ``PRAGMA incremental_vacuum``, sin el bloqueo largo de un
+  VACUUM completo. Una base de datos anterior se convierte una vez con
+  ``vacuum --full``.
+- Estadísticas: ``ANALYZE`` acotado (``analysis_limit``) para que el
+  planificador siga eligiendo bien los índices a medida que crecen las
+  tablas.
+
+Con ``ARBOL_MAINTENANCE_INTERVAL`` (segundos) la aplicación lo ejecuta en
+segundo plano; en modo multi-worker lo hace el proceso escritor. También a
+mano:
+
+    python -m app.maintenance run [--db data.db]
+    python -m app.maintenance archive --days 90 [--delete] [--dir archive/]
+    python -m app.maintenance vacuum [--full]
+    python -m app.maintenance analyze
+    python -m app.maintenance stats
+
+El diccionario de textos (``recommendation_texts``) no se poda: es pequeño
+(un texto por recomendación distinta del flujo) y los ids que ya conoce el
+proceso escritor tienen que seguir siendo válidos.
+"""
+import argparse
+import asyncio
+import datetime
+import glob
+import json
+import logging
+import os
+import sqlite3
+from typing import Dict, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from app import db, rollups
+
+logger = logging.getLogger(__name__)
+
+RETENTION_DAYS = float(os.environ.get('ARBOL_RETENTION_DAYS', '0'))
+ARCHIVE = os.environ.get('ARBOL_ARCHIVE', '1').lower() not in ('0', 'false', 'no')
+ARCHIVE_DIR = os.environ.get('ARBOL_ARCHIVE_DIR')
+ARCHIVE_KEEP = int(os.environ.get('ARBOL_ARCHIVE_KEEP', '0'))
+INTERVAL = float(os.environ.get('ARBOL_MAINTENANCE_INTERVAL', '0'))
+
+# sesiones por transacción al archivar: el escritor no espera más que eso
+BATCH = 5000
+# páginas liberadas por pasada de incremental_vacuum (0 = todas)
+VACUUM_PAGES = 0
+# filas que ANALYZE examina por índice
+ANALYSIS_LIMIT = 1000
+
+_ARCHIVE_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS archive.sessions ('
+    'id TEXT PRIMARY KEY, timestamp TEXT, questionnaire TEXT, tree_version TEXT)',
+    'CREATE TABLE IF NOT EXISTS archive.answers ('
+    'id INTEGER PRIMARY KEY, session_id TEXT, question_id TEXT, answer_id TEXT, phase INTEGER)',
+    # el archivo guarda el texto completo: cada fichero se puede leer por sí solo
+    'CREATE TABLE IF NOT EXISTS archive.recommendations ('
+    'id INTEGER PRIMARY KEY, session_id TEXT, category TEXT, recommendation TEXT)',
+)
+
+
+def archive_dir() -> str:
+    return ARCHIVE_DIR or os.path.join(os.path.dirname(os.path.abspath(db.DB_PATH)), 'archive')
+
+
+def archive_path(directory: str, month: str) -> str:
+    stem = os.path.splitext(os.path.basename(db.DB_PATH))[0]
+    return os.path.join(directory, f'{stem}-{month}.db')
+
+
+def cutoff(days: float, now: Optional[datetime.datetime] = None) -> str:
+    """Timestamp ISO a partir del cual se conservan las sesiones (mismo formato que /evaluate)."""
+    now = now or datetime.datetime.utcnow()
+    return (now - datetime.timedelta(days=days)).isoformat()
+
+
+def archive_sessions(before: str, directory: Optional[str] = None, batch: int = BATCH) -> Dict:
+    """
+    Mueve (o borra, con ``directory=None``) las sesiones con timestamp
+    anterior a ``before``. Va de la más antigua a la más reciente, un mes y
+    como mucho ``batch`` sesiones por transacción.
+    """
+    conn = db.get_db_conn()
+    conn.execute('CREATE TEMP TABLE IF NOT EXISTS archive_batch (id TEXT PRIMARY KEY)')
+    moved = {"sessions": 0, "answers": 0, "recommendations": 0, "files": []}
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    while True:
+        row = conn.execute('SELECT MIN(timestamp) FROM sessions WHERE timestamp < ?', (before,)).fetchone()
+        if row[0] is None:
+            break
+        month = row[0][:7]
+        path = archive_path(directory, month) if directory else None
+        if path:
+            conn.execute('ATTACH DATABASE ? AS archive', (path,))
+        try:
+            with conn:
+                n = _move_batch(conn, month, before, batch, path is not None, moved)
+        finally:
+            if path:
+                conn.execute('DETACH DATABASE archive')
+        if path and path not in moved["files"]:
+            moved["files"].append(path)
+        if not n:
+            break
+    return moved
+
+
+def _move_batch(conn: sqlite3.Connection, month: str, before: str, batch: int, archive: bool,
+                moved: Dict) -> int:
+    conn.execute('DELETE FROM temp.archive_batch')
+    # '~' va detrás de cualquier carácter de un timestamp ISO: [mes, mes~) es el mes entero
+    n = conn.execute('''
+        INSERT INTO temp.archive_batch
+        SELECT id FROM main.sessions INDEXED BY idx_sessions_timestamp
+        WHERE timestamp >= ? AND timestamp < ? AND timestamp < ?
+        ORDER BY timestamp LIMIT ?
+    ''', (month, month + '~', before, batch)).rowcount
+    if not n:
+        return 0
+    ids = 'SELECT id FROM temp.archive_batch'
+    if archive:
+        # INSERT OR IGNORE: en WAL el commit no es atómico entre los dos
+        # ficheros; si se corta aquí, la siguiente pasada repite sin duplicar
+        for statement in _ARCHIVE_SCHEMA:
+            conn.execute(statement)
+        # ficheros de archivo escritos antes de que existieran esas columnas
+        db.add_missing_columns(conn, 'sessions', db.SESSION_TAGS, schema='archive')
+        conn.execute(f'INSERT OR IGNORE INTO archive.sessions(id, timestamp, questionnaire, tree_version) '
+                     f'SELECT id, timestamp, questionnaire, tree_version FROM main.sessions WHERE id IN ({ids})')
+        conn.execute(f'INSERT OR IGNORE INTO archive.answers '
+                     f'SELECT id, session_id, question_id, answer_id, phase FROM main.answers '
+                     f'WHERE session_id IN ({ids})')
+        conn.execute(f'INSERT OR IGNORE INTO archive.recommendations '
+                     f'SELECT r.id, r.session_id, r.category, t.text FROM main.session_recommendations r '
+                     f'JOIN main.recommendation_texts t ON t.id = r.text_id WHERE r.session_id IN ({ids})')
+    rollups.subtract(
+        conn,
+        hours=conn.execute(f'SELECT substr(timestamp, 1, {rollups.HOUR}), COUNT(*) FROM main.sessions '
+                           f'WHERE id IN ({ids}) GROUP BY 1').fetchall(),
+        answers=conn.execute(f'SELECT question_id, answer_id, COUNT(*) FROM main.answers '
+                             f'WHERE session_id IN ({ids}) GROUP BY 1, 2').fetchall(),
+        recommendations=conn.execute(
+            f'SELECT r.category, t.text, COUNT(*) FROM main.session_recommendations r '
+            f'JOIN main.recommendation_texts t ON t.id = r.text_id '
+            f'WHERE r.session_id IN ({ids}) GROUP BY r.category, r.text_id').fetchall(),
+    )
+    moved["answers"] += conn.execute(f'DELETE FROM main.answers WHERE session_id IN ({ids})').rowcount
+    moved["recommendations"] += conn.execute(
+        f'DELETE FROM main.session_recommendations WHERE session_id IN ({ids})').rowcount
+    moved["sessions"] += conn.execute(f'DELETE FROM main.sessions WHERE id IN ({ids})').rowcount
+    return n
+
+
+def prune_archives(directory: str, keep: int) -> List[str]:
+    """Borra los ficheros de archivo más antiguos y deja los ``keep`` más recientes."""
+    if keep <= 0:
+        return []
+    stem = os.path.splitext(os.path.basename(db.DB_PATH))[0]
+    files = sorted(glob.glob(os.path.join(glob.escape(directory), f'{stem}-[0-9][0-9][0-9][0-9]-[0-9][0-9].db')))
+    doomed = files[:-keep]
+    for path in doomed:
+        os.remove(path)
+    return doomed
+
+
+def incremental_vacuum(pages: int = VACUUM_PAGES) -> int:
+    """Devuelve páginas libres al sistema; 0 si la base de datos no tiene auto_vacuum incremental."""
+    conn = db.get_db_conn()
+    if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+        return 0
+    before = conn.execute('PRAGMA freelist_count').fetchone()[0]
+    # el pragma libera páginas a medida que se recorre el resultado
+    conn.execute(f'PRAGMA incremental_vacuum({int(pages)})').fetchall()
+    return before - conn.execute('PRAGMA freelist_count').fetchone()[0]
+
+
+def full_vacuum() -> None:
+    """VACUUM completo; de paso activa auto_vacuum incremental. Bloquea la base de datos mientras dura."""
+    conn = db.get_db_conn()
+    conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+    conn.execute('VACUUM')
+
+
+def analyze(limit: int = ANALYSIS_LIMIT) -> None:
+    conn = db.get_db_conn()
+    conn.execute(f'PRAGMA analysis_limit={int(limit)}')
+    conn.execute('ANALYZE')
+
+
+def stats() -> Dict:
+    conn = db.get_db_conn()
+
+    def one(sql):
+        return conn.execute(sql).fetchone()[0]
+
+    page_size = one('PRAGMA page_size')
+    return {
+        "path": db.DB_PATH,
+        "bytes": one('PRAGMA page_count') * page_size,
+        "free_bytes": one('PRAGMA freelist_count') * page_size,
+        "auto_vacuum": {0: "none", 1: "full", 2: "incremental"}[one('PRAGMA auto_vacuum')],
+        "sessions": one('SELECT COUNT(*) FROM sessions'),
+        "answers": one('SELECT COUNT(*) FROM answers'),
+        "recommendations": one('SELECT COUNT(*) FROM session_recommendations'),
+        "recommendation_texts": one('SELECT COUNT(*) FROM recommendation_texts'),
+        "oldest_session": one('SELECT MIN(timestamp) FROM sessions'),
+    }
+
+
+def run(retention_days: Optional[float] = None, archive: Optional[bool] = None) -> Dict:
+    """Una pasada completa: retención, poda de archivos, incremental_vacuum y ANALYZE."""
+    retention_days = RETENTION_DAYS if retention_days is None else retention_days
+    archive = ARCHIVE if archive is None else archive
+    report: Dict = {}
+    if retention_days > 0:
+        directory = archive_dir() if archive else None
+        report["archived"] = archive_sessions(cutoff(retention_days), directory)
+        if directory:
+            report["pruned"] = prune_archives(directory, ARCHIVE_KEEP)
+    report["vacuumed_pages"] = incremental_vacuum()
+    analyze()
+    return report
+
+
+class MaintenanceScheduler:
+    """Ejecuta ``run`` cada ``interval`` segundos en el threadpool."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                report = await run_in_threadpool(run)
+                logger.info("mantenimiento de %s: %s", db.DB_PATH, report)
+            except Exception:
+                # se reintenta en la siguiente pasada
+                logger.exception("falló el mantenimiento de %s", db.DB_PATH)
+
+
+def scheduler() -> Optional[MaintenanceScheduler]:
+    """El planificador si ``ARBOL_MAINTENANCE_INTERVAL`` está activo."""
+    return MaintenanceScheduler(INTERVAL) if INTERVAL > 0 else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m app.maintenance')
+    parser.add_argument('--db', default=None)
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_run = sub.add_parser('run', help='retención (si ARBOL_RETENTION_DAYS), vacuum incremental y ANALYZE')
+    p_run.add_argument('--days', type=float, default=None)
+    p_archive = sub.add_parser('archive', help='mueve las sesiones antiguas a ficheros mensuales')
+    when = p_archive.add_mutually_exclusive_group(required=True)
+    when.add_argument('--days', type=float, help='conserva las sesiones de los últimos N días')
+    when.add_argument('--before', help='timestamp ISO; se archiva lo anterior')
+    p_archive.add_argument('--dir', default=None, help='directorio de los ficheros de archivo')
+    p_archive.add_argument('--delete', action='store_true', help='borra sin archivar')
+    p_archive.add_argument('--keep', type=int, default=ARCHIVE_KEEP, help='ficheros de archivo a conservar')
+    p_vacuum = sub.add_parser('vacuum', help='devuelve las páginas libres al sistema')
+    p_vacuum.add_argument('--full', action='store_true', help='VACUUM completo (activa auto_vacuum incremental)')
+    sub.add_parser('analyze', help='actualiza las estadísticas del planificador')
+    sub.add_parser('stats', help='tamaño y filas de la base de datos')
+    args = parser.parse_args(argv)
+
+    if args.db:
+        db.DB_PATH = args.db
+    db.init_db()
+    if args.command == 'run':
+        result = run(args.days)
+    elif args.command == 'archive':
+        directory = None if args.delete else (args.dir or archive_dir())
+        result = archive_sessions(args.before or cutoff(args.days), directory)
+        if directory:
+            result["pruned"] = prune_archives(directory, args.keep)
+    elif args.command == 'vacuum':
+        if args.full:
+            full_vacuum()
+            result = stats()
+        else:
+            result = {"vacuumed_pages": incremental_vacuum()}
+    elif args.command == 'analyze':
+        analyze()
+        result = {"analyzed": True}
+    else:
+        result = stats()
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    db.close_all()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,234 @@
+"""
+Métricas en formato de texto de Prometheus (``GET /metrics``).
+
+Con ``ARBOL_METRICS=1``:
+
+- ``arbol_stage_seconds`` (summary): tiempo de cada etapa de una
+  evaluación y de la escritura (búsqueda en el árbol, clasificación,
+  enriquecimiento por reglas, deduplicado, commit de SQLite y
+  serialización JSON). Las etapas se marcan con el decorador ``timed``.
+- ``arbol_http_request_duration_seconds`` (histograma): latencia por
+  endpoint (plantilla de la ruta), método y código, medida por
+  ``LatencyMiddleware``.
+
+Si la escritura diferida está activa (``ARBOL_WRITE_BEHIND=1``) se exportan
+siempre la profundidad de la cola, la latencia de cada vaciado y las filas
+escritas, reintentadas y perdidas (``arbol_write_behind_*``).
+
+Sin ``ARBOL_METRICS`` el decorador devuelve la función sin tocar y el
+middleware no se instala: no hay coste. La decisión se toma al importar.
+
+Los contadores son del proceso: en modo multi-worker cada worker tiene los
+suyos (y el commit de SQLite se mide en el proceso escritor). Las sumas no
+usan locks; con varios hilos se puede perder alguna muestra, pero los
+contadores nunca retroceden.
+"""
+import bisect
+import functools
+import os
+from time import perf_counter
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+ENABLED = os.environ.get('ARBOL_METRICS', '').lower() in ('1', 'true', 'yes')
+
+# límites de los histogramas de latencia (segundos)
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Timer:
+    """Suma y número de observaciones (un summary de Prometheus sin cuantiles)."""
+    __slots__ = ('count', 'total')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+
+
+class Histogram:
+    __slots__ = ('bounds', 'counts', 'count', 'total')
+
+    def __init__(self, bounds: Tuple[float, ...] = BUCKETS):
+        self.bounds = bounds
+        # una posición por límite más la de +Inf; se acumulan al exportar
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        out, running = [], 0
+        for bound, n in zip(self.bounds, self.counts):
+            running += n
+            out.append((repr(float(bound)), running))
+        out.append(('+Inf', running + self.counts[-1]))
+        return out
+
+
+# etapa -> Timer
+STAGES: Dict[str, Timer] = {}
+# (ruta, método, código) -> Histogram
+REQUESTS: Dict[Tuple[str, str, str], Histogram] = {}
+
+
+def timed(stage: str) -> Callable:
+    """Decorador: suma el tiempo de cada llamada a la etapa ``stage`` (sólo si ENABLED)."""
+    def decorate(fn: Callable) -> Callable:
+        if not ENABLED:
+            return fn
+        timer = STAGES.setdefault(stage, Timer())
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            t0 = perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                timer.observe(perf_counter() - t0)
+        return wrapper
+    return decorate
+
+
+def observe_request(route: str, method: str, status: int, seconds: float) -> None:
+    key = (route, method, str(status))
+    histogram = REQUESTS.get(key)
+    if histogram is None:
+        histogram = REQUESTS.setdefault(key, Histogram())
+    histogram.observe(seconds)
+
+
+class LatencyMiddleware:
+    """
+    Middleware ASGI (sin BaseHTTPMiddleware, que añade una tarea por
+    petición): mide desde que llega la petición hasta el último trozo del
+    cuerpo de la respuesta.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        t0 = perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+            if message['type'] == 'http.response.body' and not message.get('more_body', False):
+                observe_request(_route(scope), scope['method'], status, perf_counter() - t0)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+def _route(scope) -> str:
+    # el router deja la ruta elegida en el scope; sin ella (404) no se usa
+    # la URL para no crear una serie por cada dirección inventada
+    route = scope.get('route')
+    return getattr(route, 'path', None) or 'unmatched'
+
+
+def reset() -> None:
+    for timer in STAGES.values():
+        timer.count, timer.total = 0, 0.0
+    REQUESTS.clear()
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels) -> str:
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + '}'
+
+
+def render(state=None, caches: Iterable[Tuple[str, Dict]] = (), write_behind: Optional[Dict] = None) -> str:
+    """
+    El texto de ``/metrics``. ``state`` es el TreeState actual (número de
+    nodos y versión), ``caches`` pares ``(nombre, stats)`` con ``hits`` y
+    ``misses`` y ``write_behind`` el ``stats()`` de la cola de escritura
+    diferida, si la hay.
+    """
+    lines = [
+        '# HELP arbol_metrics_enabled Si la instrumentación está activa (ARBOL_METRICS).',
+        '# TYPE arbol_metrics_enabled gauge',
+        f'arbol_metrics_enabled {int(ENABLED)}',
+    ]
+    if state is not None:
+        lines += [
+            '# HELP arbol_tree_nodes Nodos del árbol cargado.',
+            '# TYPE arbol_tree_nodes gauge',
+            f'arbol_tree_nodes {state.node_count}',
+            '# HELP arbol_tree_info Versión (hash) y número de carga del árbol.',
+            '# TYPE arbol_tree_info gauge',
+            f'arbol_tree_info{_labels(version=state.version, number=state.number)} 1',
+        ]
+    caches = list(caches)
+    if caches:
+        lines += ['# HELP arbol_cache_hits_total Aciertos de caché.', '# TYPE arbol_cache_hits_total counter']
+        lines += [f'arbol_cache_hits_total{_labels(cache=name)} {s["hits"]}' for name, s in caches]
+        lines += ['# HELP arbol_cache_misses_total Fallos de caché.', '# TYPE arbol_cache_misses_total counter']
+        lines += [f'arbol_cache_misses_total{_labels(cache=name)} {s["misses"]}' for name, s in caches]
+        lines += ['# HELP arbol_cache_hit_ratio Aciertos / consultas desde la última carga del árbol.',
+                  '# TYPE arbol_cache_hit_ratio gauge']
+        for name, s in caches:
+            total = s["hits"] + s["misses"]
+            lines.append(f'arbol_cache_hit_ratio{_labels(cache=name)} {s["hits"] / total if total else 0.0}')
+    if write_behind is not None:
+        lines += _write_behind_lines(write_behind)
+    if STAGES:
+        lines += ['# HELP arbol_stage_seconds Tiempo por etapa de la evaluación y la escritura.',
+                  '# TYPE arbol_stage_seconds summary']
+        for stage, timer in sorted(STAGES.items()):
+            lines.append(f'arbol_stage_seconds_sum{_labels(stage=stage)} {timer.total}')
+            lines.append(f'arbol_stage_seconds_count{_labels(stage=stage)} {timer.count}')
+    if REQUESTS:
+        lines += ['# HELP arbol_http_request_duration_seconds Latencia por endpoint.',
+                  '# TYPE arbol_http_request_duration_seconds histogram']
+        for (route, method, status), histogram in sorted(REQUESTS.items()):
+            labels = dict(route=route, method=method, status=status)
+            for le, n in histogram.cumulative():
+                lines.append(f'arbol_http_request_duration_seconds_bucket{_labels(**labels, le=le)} {n}')
+            lines.append(f'arbol_http_request_duration_seconds_sum{_labels(**labels)} {histogram.total}')
+            lines.append(f'arbol_http_request_duration_seconds_count{_labels(**labels)} {histogram.count}')
+    return '\n'.join(lines) + '\n'
+
+
+def _write_behind_lines(stats: Dict) -> List[str]:
+    return [
+        '# HELP arbol_write_behind_queue_depth Lotes encolados sin escribir.',
+        '# TYPE arbol_write_behind_queue_depth gauge',
+        f'arbol_write_behind_queue_depth {stats["queue_depth"]}',
+        '# HELP arbol_write_behind_pending_rows Filas encoladas sin escribir.',
+        '# TYPE arbol_write_behind_pending_rows gauge',
+        f'arbol_write_behind_pending_rows {stats["pending_rows"]}',
+        '# HELP arbol_write_behind_rows_written_total Filas escritas.',
+        '# TYPE arbol_write_behind_rows_written_total counter',
+        f'arbol_write_behind_rows_written_total {stats["rows_written"]}',
+        '# HELP arbol_write_behind_retries_total Reintentos de escritura de un lote.',
+        '# TYPE arbol_write_behind_retries_total counter',
+        f'arbol_write_behind_retries_total {stats["retries"]}',
+        '# HELP arbol_write_behind_rows_lost_total Filas descartadas tras agotar los reintentos.',
+        '# TYPE arbol_write_behind_rows_lost_total counter',
+        f'arbol_write_behind_rows_lost_total {stats["rows_lost"]}',
+        '# HELP arbol_write_behind_flush_seconds Duración de cada vaciado (con reintentos).',
+        '# TYPE arbol_write_behind_flush_seconds summary',
+        f'arbol_write_behind_flush_seconds_sum {stats["total_flush_latency_seconds"]}',
+        f'arbol_write_behind_flush_seconds_count {stats["flushes"]}',
+        '# HELP arbol_write_behind_flush_max_seconds Vaciado más lento.',
+        '# TYPE arbol_write_behind_flush_max_seconds gauge',
+        f'arbol_write_behind_flush_max_seconds {stats["max_flush_latency_seconds"]}',
+    ]
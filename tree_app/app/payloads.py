@@ -0,0 +1,91 @@
+"""
+Contenido de los endpoints de sólo lectura, construido a partir de un árbol.
+
+Son funciones puras de la raíz: ``TreeState`` las pre-renderiza al cargar
+el árbol y los handlers sólo sirven los bytes ya serializados.
+"""
+from typing import Dict, List, Optional
+
+from app.tree_parser import Node
+
+# mapeo coloquial para opciones específicas
+COLLOQUIAL_MAP = {
+    "B2C": "Consumidores — gente/usuarios finales",
+    "B2B": "Empresas — clientes/organizaciones",
+    "Interna": "Uso interno — solo para tu equipo/empresa"
+}
+
+
+def tree_payload(root: Node) -> Dict:
+    return root.to_dict()
+
+
+def phases_payload(root: Node) -> List[Dict]:
+    phases = []
+    for node in root.children:
+        # buscar nodos de tipo 'phase'
+        if node.node_type == 'phase' or node.id.startswith('phase'):
+            phases.append({"id": node.id, "text": node.text})
+    return phases
+
+
+def decision_payload(root: Node, side: str) -> Optional[Dict]:
+    node = root.get_side(side)
+    return node.to_dict() if node is not None else None
+
+
+def phase_questions_payload(root: Node, phase: int) -> List[Dict]:
+    return _question_payloads(root.get_phase_questions(phase), phase)
+
+
+def phase_questions_payloads(root: Node) -> Dict[int, List[Dict]]:
+    """Las preguntas de todas las fases, con sus opciones ya construidas (para pre-renderizar)."""
+    return {phase: _question_payloads(questions, phase) for phase, questions in root.phase_index.items()}
+
+
+def _question_payloads(questions, phase: int) -> List[Dict]:
+    result = []
+    for q in questions:
+        options = []
+        for child in q.children:
+            if child.node_type == "option":
+                display_text = child.text
+                if child.children:
+                    recs = [c.text for c in child.children if c.node_type == 'recommendation']
+                    if recs:
+                        display_text = ' / '.join(recs)
+                option_data = {"id": child.id, "text": display_text, "label": child.text}
+                if child.has_metadata():
+                    option_data["metadata"] = child.metadata
+                options.append(option_data)
+
+        question_data = {
+            "id": q.id,
+            "text": q.text,
+            "options": options,
+            "phase": phase
+        }
+        if q.has_metadata():
+            question_data["metadata"] = q.metadata
+        result.append(question_data)
+
+    return result
+
+
+def api_questions_payload(root: Node) -> List[Dict]:
+    out = []
+    for phase in root.children:
+        node = phase.to_dict()
+        # recorrer preguntas y opciones y aplicar texto coloquial si corresponde
+        for child in node.get("children", []):
+            if child.get("type") == "question":
+                for opt in child.get("children", []):
+                    if opt.get("type") == "option":
+                        txt = opt.get("text", "")
+                        if txt in COLLOQUIAL_MAP:
+                            # reemplaza el texto mostrado por una versión más coloquial
+                            opt["text"] = COLLOQUIAL_MAP[txt]
+                            # opcional: dejar el valor original en otra clave
+                            opt["original_text"] = txt
+        out.append(node)
+    return out
@@ -0,0 +1,172 @@
+"""
+Tabla precalculada con el resultado de todas las combinaciones de respuestas.
+
+El cuestionario es finito: cada pregunta se responde con una de sus
+opciones o se deja sin responder. Además, una opción sin recomendaciones
+hijas ni reglas no cambia el resultado, así que la tabla se factoriza sobre
+las opciones *relevantes*: se enumeran ``prod(relevantes + 1)``
+combinaciones (sólo preguntas con alguna opción relevante) y al consultar
+se descartan de la clave las opciones que no aportan. Un id que no es una
+opción de pregunta (p. ej. una recomendación colgada directamente de la
+pregunta, o ``phase_final``) no se descarta: la tabla no lo cubre y la
+consulta cae al cálculo normal. Cada clave apunta a
+un resultado en una lista de resultados distintos, que se guardan una vez.
+
+Con la tabla cargada, ``TreeState.evaluate`` es una búsqueda en un dict;
+las combinaciones que no están (p. ej. dos opciones relevantes de la misma
+pregunta) siguen calculándose como siempre.
+
+Si el número de combinaciones supera ``limit`` no se construye nada
+(``PrecomputeLimitError``).
+
+    python -m app.precompute [--flujo flujo.txt] [--limit 200000]
+"""
+import argparse
+import itertools
+import json
+import math
+import os
+import sys
+import time
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+from app.evaluation import compute_recommendations
+from app.tree_parser import Node
+
+# combinaciones máximas por defecto
+LIMIT = int(os.environ.get('ARBOL_PRECOMPUTE_LIMIT', '200000'))
+
+
+class PrecomputeLimitError(ValueError):
+    pass
+
+
+def is_relevant(option: Node, rule_table: Dict[str, Dict[str, List[str]]]) -> bool:
+    """Si elegir la opción puede cambiar el resultado."""
+    return bool(rule_table.get(option.id)) or any(c.node_type == 'recommendation' for c in option.children)
+
+
+def question_choices(root: Node, rule_table: Optional[Dict[str, Dict[str, List[str]]]] = None
+                     ) -> List[Tuple[Optional[str], ...]]:
+    """
+    Por cada pregunta (en orden del árbol): sin responder + sus opciones.
+    Con ``rule_table`` sólo las opciones relevantes (y sólo las preguntas
+    que tienen alguna).
+    """
+    choices = []
+    for node in root.index.values():
+        if node.node_type == 'question':
+            options = [c.id for c in node.children if c.node_type == 'option'
+                       and (rule_table is None or is_relevant(c, rule_table))]
+            if options:
+                choices.append((None, *options))
+    return choices
+
+
+def count_combinations(root: Node, rule_table: Optional[Dict[str, Dict[str, List[str]]]] = None) -> int:
+    return math.prod(len(c) for c in question_choices(root, rule_table))
+
+
+def measure_bytes(index: Dict[Tuple[str, ...], int], results: List[Dict[str, List[str]]]) -> int:
+    """Tamaño aproximado: dict, tuplas clave y resultados serializados."""
+    size = sys.getsizeof(index) + sum(sys.getsizeof(k) for k in index)
+    size += sum(len(json.dumps(r, ensure_ascii=False).encode('utf-8')) for r in results)
+    return size
+
+
+class PrecomputedTable:
+    __slots__ = ("options", "relevant", "index", "results", "build_seconds", "approx_bytes", "hits", "misses")
+
+    def __init__(self, options: FrozenSet[str], relevant: FrozenSet[str], index: Dict[Tuple[str, ...], int],
+                 results: List[Dict[str, List[str]]], build_seconds: float = 0.0):
+        # todas las opciones de pregunta; las que no son relevantes no cambian el resultado
+        self.options = options
+        self.relevant = relevant
+        # clave canónica (sólo opciones relevantes) -> posición en results
+        self.index = index
+        self.results = results
+        self.build_seconds = build_seconds
+        # se mide una vez: la tabla no cambia y stats() se llama en cada /metrics
+        self.approx_bytes = measure_bytes(index, results)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Tuple[str, ...]) -> Optional[Dict[str, List[str]]]:
+        """Resultado para una clave canónica completa, o None si no está en la tabla."""
+        options = self.options
+        relevant = self.relevant
+        i = None
+        if all(a in options for a in key):
+            i = self.index.get(tuple(a for a in key if a in relevant))
+        if i is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return self.results[i]
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def stats(self) -> Dict:
+        return {
+            "combinations": len(self.index),
+            "distinct_results": len(self.results),
+            "approx_bytes": self.approx_bytes,
+            "build_seconds": self.build_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+def build_table(root: Node, rule_table: Dict[str, Dict[str, List[str]]],
+                limit: Optional[int] = None) -> PrecomputedTable:
+    limit = LIMIT if limit is None else limit
+    choices = question_choices(root, rule_table)
+    total = math.prod(len(c) for c in choices)
+    if total > limit:
+        raise PrecomputeLimitError(
+            f"{total} combinaciones superan el límite ({limit}); sube ARBOL_PRECOMPUTE_LIMIT o usa la caché")
+
+    t0 = time.perf_counter()
+    index: Dict[Tuple[str, ...], int] = {}
+    results: List[Dict[str, List[str]]] = []
+    # resultado serializado -> posición, para no repetir resultados iguales
+    distinct: Dict[str, int] = {}
+    for combo in itertools.product(*choices):
+        # las preguntas van en orden del árbol: la tupla ya es canónica
+        key = tuple(a for a in combo if a is not None)
+        recs = compute_recommendations(root, rule_table, key)
+        fingerprint = json.dumps(recs, ensure_ascii=False)
+        pos = distinct.get(fingerprint)
+        if pos is None:
+            pos = distinct[fingerprint] = len(results)
+            results.append(recs)
+        index[key] = pos
+    relevant = frozenset(a for c in choices for a in c if a is not None)
+    options = frozenset(a for c in question_choices(root) for a in c if a is not None)
+    return PrecomputedTable(options, relevant, index, results, time.perf_counter() - t0)
+
+
+def main(argv=None):
+    from app import state as tree_state
+
+    parser = argparse.ArgumentParser(prog='python -m app.precompute')
+    parser.add_argument('--flujo', default=None)
+    parser.add_argument('--limit', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    state = tree_state.build_state(args.flujo, use_snapshot=False)
+    print(f"{count_combinations(state.root)} combinaciones de respuestas, "
+          f"{count_combinations(state.root, state.rule_table)} distinguibles")
+    try:
+        table = build_table(state.root, state.rule_table, args.limit)
+    except PrecomputeLimitError as exc:
+        print(f"❌ {exc}")
+        sys.exit(1)
+    stats = table.stats()
+    print(f"{stats['combinations']} combinaciones, {stats['distinct_results']} resultados distintos, "
+          f"~{stats['approx_bytes'] / 2**20:.1f} MiB, {stats['build_seconds']:.2f} s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,254 @@
+"""
+Perfilado bajo demanda de peticiones concretas.
+
+Una petición a ``/evaluate`` o ``/api/questions`` se perfila si:
+
+- trae la cabecera ``X-Profile: cprofile`` (o ``sample``) junto con un
+  ``X-Admin-Token`` válido (sin ``ARBOL_ADMIN_TOKEN`` basta la cabecera), o
+- el administrador armó el perfilado con ``POST /admin/profiling?count=N``:
+  las N peticiones siguientes se perfilan.
+
+Dos modos:
+
+- ``cprofile``: cProfile sobre el hilo que atiende la petición; se descarga
+  en formato pstats (``python -m pstats perfil.pstats``, snakeviz...).
+- ``sample``: un hilo muestrea la pila del hilo de la petición cada
+  ``ARBOL_PROFILE_INTERVAL`` segundos; se descarga en formato speedscope
+  (https://www.speedscope.app). La resolución real está limitada por el
+  intervalo de cambio de hilo del GIL (5 ms por defecto), así que sirve para
+  peticiones lentas.
+
+Los perfiles se guardan en memoria en un buffer circular de
+``ARBOL_PROFILE_KEEP`` entradas (los más antiguos se descartan) y se listan
+y descargan con ``GET /admin/profiles`` y ``GET /admin/profiles/{id}``.
+
+En ``/evaluate`` (un handler asíncrono) se perfila el hilo del event loop:
+la evaluación queda dentro, la escritura en SQLite (en el threadpool) no,
+y si mientras tanto el loop atiende otras peticiones también aparecen.
+Sólo se perfila una petición a la vez; si llega otra, se atiende sin perfil.
+"""
+import cProfile
+import datetime
+import io
+import itertools
+import json
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+MODES = ("cprofile", "sample")
+KEEP = int(os.environ.get('ARBOL_PROFILE_KEEP', '20'))
+INTERVAL = float(os.environ.get('ARBOL_PROFILE_INTERVAL', '0.001'))
+# funciones del resumen de cada perfil cProfile
+SUMMARY = 10
+
+_lock = threading.Lock()
+# sólo un perfil activo a la vez (cProfile no admite dos en el mismo hilo)
+_active = threading.Lock()
+_armed = {"count": 0, "mode": "cprofile"}
+_ids = itertools.count(1)
+PROFILES: Deque["Profile"] = deque(maxlen=KEEP)
+
+
+class Profile:
+    __slots__ = ("id", "endpoint", "mode", "started", "seconds", "data", "summary")
+
+    def __init__(self, id: str, endpoint: str, mode: str, started: str, seconds: float, data: bytes,
+                 summary: List[Dict]):
+        self.id = id
+        self.endpoint = endpoint
+        self.mode = mode
+        self.started = started
+        self.seconds = seconds
+        self.data = data
+        self.summary = summary
+
+    @property
+    def filename(self) -> str:
+        return f"profile-{self.id}.pstats" if self.mode == "cprofile" else f"profile-{self.id}.speedscope.json"
+
+    @property
+    def media_type(self) -> str:
+        return "application/octet-stream" if self.mode == "cprofile" else "application/json"
+
+    def info(self) -> Dict:
+        return {
+            "id": self.id,
+            "endpoint": self.endpoint,
+            "mode": self.mode,
+            "started": self.started,
+            "seconds": self.seconds,
+            "bytes": len(self.data),
+            "filename": self.filename,
+            "top": self.summary,
+        }
+
+
+def arm(count: int = 1, mode: str = "cprofile") -> Dict:
+    """Perfila las ``count`` peticiones siguientes (0 desarma)."""
+    if mode not in MODES:
+        raise ValueError(f"mode debe ser uno de {', '.join(MODES)}")
+    with _lock:
+        _armed["count"] = max(0, int(count))
+        _armed["mode"] = mode
+        return dict(_armed)
+
+
+def armed() -> Dict:
+    return dict(_armed)
+
+
+def _take_armed() -> Optional[str]:
+    if not _armed["count"]:
+        return None
+    with _lock:
+        if not _armed["count"]:
+            return None
+        _armed["count"] -= 1
+        return _armed["mode"]
+
+
+def requested_mode(header: Optional[str], authorized: bool) -> Optional[str]:
+    """Modo pedido para esta petición (cabecera o armado), o None."""
+    if header and authorized:
+        mode = header.strip().lower()
+        return mode if mode in MODES else "cprofile"
+    return _take_armed()
+
+
+def get(profile_id: str) -> Optional[Profile]:
+    for profile in PROFILES:
+        if profile.id == profile_id:
+            return profile
+    return None
+
+
+def listing() -> List[Dict]:
+    """Perfiles guardados, del más reciente al más antiguo."""
+    return [p.info() for p in reversed(PROFILES)]
+
+
+def clear() -> None:
+    PROFILES.clear()
+
+
+class _Sampler(threading.Thread):
+    """Muestrea la pila de un hilo cada ``interval`` segundos."""
+
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(daemon=True, name="arbol-profile-sampler")
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples: List[tuple] = []
+        self.stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self.stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                frame = frame.f_back
+            if stack:
+                stack.reverse()
+                self.samples.append((time.perf_counter(), tuple(stack)))
+
+
+def speedscope(samples: List[tuple], name: str, start: float, end: float) -> Dict:
+    """Perfil muestreado en el formato de fichero de speedscope."""
+    frames: List[Dict] = []
+    frame_ids: Dict[tuple, int] = {}
+    stacks, weights = [], []
+    previous = start
+    for at, stack in samples:
+        ids = []
+        for frame in stack:
+            i = frame_ids.get(frame)
+            if i is None:
+                i = frame_ids[frame] = len(frames)
+                frames.append({"name": frame[0], "file": frame[1], "line": frame[2]})
+            ids.append(i)
+        stacks.append(ids)
+        weights.append(at - previous)
+        previous = at
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": name,
+        "exporter": "arbol",
+        "shared": {"frames": frames},
+        "profiles": [{
+            "type": "sampled",
+            "name": name,
+            "unit": "seconds",
+            "startValue": 0,
+            "endValue": end - start,
+            "samples": stacks,
+            "weights": weights,
+        }],
+    }
+
+
+def _summary(stats: pstats.Stats) -> List[Dict]:
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:SUMMARY]
+    return [
+        {"function": pstats.func_std_string(func), "calls": nc, "tottime": tt, "cumtime": ct}
+        for func, (cc, nc, tt, ct, callers) in rows
+    ]
+
+
+class RequestProfile:
+    """
+    Context manager para el cuerpo de un handler. Si la petición no se
+    perfila (``mode`` None u otro perfil en curso) no hace nada; al salir
+    ``id`` tiene el identificador del perfil guardado.
+    """
+
+    def __init__(self, endpoint: str, mode: Optional[str]):
+        self.endpoint = endpoint
+        self.mode = mode
+        self.id: Optional[str] = None
+        self._profiler: Optional[cProfile.Profile] = None
+        self._sampler: Optional[_Sampler] = None
+
+    def __enter__(self) -> "RequestProfile":
+        if self.mode is None or not _active.acquire(blocking=False):
+            self.mode = None
+            return self
+        self._started = datetime.datetime.utcnow().isoformat()
+        self._t0 = time.perf_counter()
+        if self.mode == "cprofile":
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        else:
+            self._sampler = _Sampler(threading.get_ident(), INTERVAL)
+            self._sampler.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if self.mode is None:
+            return
+        try:
+            end = time.perf_counter()
+            profile_id = str(next(_ids))
+            if self._profiler is not None:
+                self._profiler.disable()
+                stats = pstats.Stats(self._profiler, stream=io.StringIO())
+                data = marshal.dumps(stats.stats)
+                summary = _summary(stats)
+            else:
+                self._sampler.stop_event.set()
+                self._sampler.join()
+                name = f"{self.endpoint} #{profile_id}"
+                data = json.dumps(speedscope(self._sampler.samples, name, self._t0, end)).encode("utf-8")
+                summary = []
+            PROFILES.append(Profile(profile_id, self.endpoint, self.mode, self._started, end - self._t0,
+                                    data, summary))
+            self.id = profile_id
+        finally:
+            _active.release()
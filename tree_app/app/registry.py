@@ -0,0 +1,159 @@
+"""
+Registro de cuestionarios: varios flujos (idiomas, líneas de producto) y
+varias versiones de cada uno servidos desde el mismo proceso.
+
+Con ``ARBOL_QUESTIONNAIRES_DIR`` los flujos se organizan así:
+
+    cuestionarios/
+        es/
+            2024-01.txt
+            2024-06.txt
+        en/
+            v1.txt
+
+Cada fichero es una versión de un cuestionario; la versión más reciente
+(orden natural de los nombres: ``v2`` < ``v10``) es la que se sirve si no
+se pide otra. Las versiones no se editan: un cambio es un fichero nuevo.
+
+Cada versión se carga la primera vez que se pide (``build_state``, con su
+instantánea si está compilada) en un ``TreeState`` propio, con sus índices
+y cachés. Como mucho ``ARBOL_REGISTRY_SIZE`` versiones quedan cargadas a la
+vez; al pasarse se descarta la menos usada recientemente (las peticiones
+que ya la tenían siguen con ella).
+
+El flujo de siempre (``flujo.txt``, ``app.state``) sigue siendo el
+cuestionario por defecto; los endpoints eligen otro con los parámetros
+``?questionnaire=es&version=2024-01``.
+"""
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from app import state as tree_state
+from app.state import TreeState
+
+QUESTIONNAIRES_DIR = os.environ.get('ARBOL_QUESTIONNAIRES_DIR')
+SIZE = int(os.environ.get('ARBOL_REGISTRY_SIZE', '8'))
+# segundos que se reutiliza el listado del directorio antes de volver a leerlo
+RESCAN = 5.0
+EXTENSION = '.txt'
+
+_DIGITS = re.compile(r'(\d+)')
+
+
+class UnknownQuestionnaire(LookupError):
+    pass
+
+
+def version_key(name: str) -> Tuple:
+    """Orden natural: los tramos numéricos se comparan como números."""
+    return tuple((0, int(part), '') if part.isdigit() else (1, 0, part) for part in _DIGITS.split(name) if part)
+
+
+class Registry:
+    def __init__(self, directory: str, size: int = SIZE):
+        self.directory = directory
+        self.size = max(1, size)
+        # (cuestionario, versión) -> TreeState, de menos a más reciente
+        self._states: "OrderedDict[Tuple[str, str], TreeState]" = OrderedDict()
+        self._lock = threading.Lock()
+        # una carga por versión aunque lleguen varias peticiones a la vez
+        self._loading: Dict[Tuple[str, str], threading.Lock] = {}
+        self._listing: Dict[str, List[str]] = {}
+        self._scanned = 0.0
+        self.loads = 0
+        self.evictions = 0
+
+    def scan(self) -> Dict[str, List[str]]:
+        """Cuestionario -> versiones (ordenadas, la última es la vigente)."""
+        listing: Dict[str, List[str]] = {}
+        for entry in sorted(os.scandir(self.directory), key=lambda e: e.name):
+            if not entry.is_dir():
+                continue
+            versions = [f[:-len(EXTENSION)] for f in os.listdir(entry.path) if f.endswith(EXTENSION)]
+            if versions:
+                listing[entry.name] = sorted(versions, key=version_key)
+        self._listing = listing
+        self._scanned = time.monotonic()
+        return listing
+
+    def questionnaires(self, rescan: bool = False) -> Dict[str, List[str]]:
+        if rescan or time.monotonic() - self._scanned > RESCAN:
+            return self.scan()
+        return self._listing
+
+    def resolve(self, questionnaire: str, version: Optional[str] = None) -> Tuple[str, str]:
+        """Cuestionario y versión concretos (``None`` o ``latest`` = la última)."""
+        for rescan in (False, True):
+            versions = self.questionnaires(rescan).get(questionnaire)
+            if versions and (version in (None, 'latest') or version in versions):
+                return questionnaire, versions[-1] if version in (None, 'latest') else version
+        if not versions:
+            raise UnknownQuestionnaire(f"cuestionario desconocido: {questionnaire}")
+        raise UnknownQuestionnaire(f"versión desconocida de {questionnaire}: {version}")
+
+    def path(self, questionnaire: str, version: str) -> str:
+        return os.path.join(self.directory, questionnaire, version + EXTENSION)
+
+    def get(self, questionnaire: str, version: Optional[str] = None) -> TreeState:
+        """El estado de esa versión; la carga si no lo está (puede tardar: llamar fuera del event loop)."""
+        key = self.resolve(questionnaire, version)
+        state = self._touch(key)
+        if state is not None:
+            return state
+        with self._lock:
+            loading = self._loading.setdefault(key, threading.Lock())
+        with loading:
+            state = self._touch(key)
+            if state is None:
+                state = tree_state.build_state(self.path(*key))
+                state.questionnaire, state.label = key
+                self._store(key, state)
+        with self._lock:
+            self._loading.pop(key, None)
+        return state
+
+    def _touch(self, key) -> Optional[TreeState]:
+        with self._lock:
+            state = self._states.get(key)
+            if state is not None:
+                self._states.move_to_end(key)
+            return state
+
+    def _store(self, key, state: TreeState) -> None:
+        with self._lock:
+            self._states[key] = state
+            self.loads += 1
+            while len(self._states) > self.size:
+                self._states.popitem(last=False)
+                self.evictions += 1
+
+    def loaded(self) -> List[Tuple[str, str]]:
+        with self._lock:
+            return list(self._states)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            loaded = [{"questionnaire": q, "version": v, "tree_version": s.version, "nodes": s.node_count,
+                       "eval_cache": s.eval_cache.stats()} for (q, v), s in self._states.items()]
+        return {"directory": self.directory, "size": self.size, "loads": self.loads,
+                "evictions": self.evictions, "loaded": loaded}
+
+
+_registry: Optional[Registry] = None
+
+
+def get_registry() -> Optional[Registry]:
+    """El registro si ``ARBOL_QUESTIONNAIRES_DIR`` está definido."""
+    global _registry
+    if _registry is None and QUESTIONNAIRES_DIR:
+        _registry = Registry(QUESTIONNAIRES_DIR)
+    return _registry
+
+
+def set_registry(registry: Optional[Registry]) -> None:
+    global _registry
+    _registry = registry
@@ -0,0 +1,103 @@
+"""
+Respuestas JSON pre-serializadas para los endpoints de sólo lectura.
+
+El contenido de /tree, /phases, /api/questions y /questions/{phase} sólo
+cambia cuando cambia el árbol, así que cada respuesta se serializa una vez
+a bytes junto con un ETag fuerte (hash del cuerpo) y se sirve tal cual.
+Si el cliente envía ``If-None-Match`` con ese ETag se responde 304 sin
+cuerpo. Los cuerpos cargados de una instantánea son vistas (``memoryview``)
+sobre el fichero mapeado y se envían sin copiarlos.
+"""
+import hashlib
+import json
+import threading
+from typing import Any, Callable, Dict, Hashable, Tuple, Union
+
+from fastapi import Request
+from fastapi.responses import Response
+
+# el navegador guarda la respuesta pero revalida siempre con el ETag
+CACHE_CONTROL = "no-cache"
+
+
+def render_json(content: Any) -> bytes:
+    """Mismo formato que JSONResponse."""
+    return json.dumps(
+        content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":"),
+    ).encode("utf-8")
+
+
+Body = Union[bytes, memoryview]
+
+
+def make_etag(body: Body) -> str:
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+class RenderedResponses:
+    """Cuerpos JSON y ETags por clave, válidos mientras no cambie el árbol."""
+
+    def __init__(self):
+        self._data: Dict[Hashable, Tuple[Body, str]] = {}
+        self._lock = threading.Lock()
+        # contadores aproximados (sin lock) para app.metrics
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, build: Callable[[], Any], store: bool = True) -> Tuple[Body, str]:
+        entry = self._data.get(key)
+        if entry is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            body = render_json(build())
+            entry = (body, make_etag(body))
+            if store:
+                with self._lock:
+                    entry = self._data.setdefault(key, entry)
+        return entry
+
+    def put(self, key: Hashable, body: Body) -> None:
+        """Guarda un cuerpo ya serializado (p. ej. una vista de la instantánea)."""
+        with self._lock:
+            self._data[key] = (body, make_etag(body))
+
+    def response(self, request: Request, key: Hashable, build: Callable[[], Any],
+                 store: bool = True) -> Response:
+        """``store=False`` sirve sin guardar (claves que vienen del cliente y no existen)."""
+        body, etag = self.get(key, build, store)
+        headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+        if etag_matches(request.headers.get("if-none-match", ""), etag):
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    def bodies(self) -> Dict[Hashable, Body]:
+        with self._lock:
+            return {key: entry[0] for key, entry in self._data.items()}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,175 @@
+"""
+Contadores pre-agregados (rollups) para la analítica.
+
+Tres tablas pequeñas, con una fila por clave distinta:
+
+- ``rollup_recommendations``: veces que se recomendó cada texto, por categoría
+- ``rollup_answers``: veces que se eligió cada opción, por pregunta
+- ``rollup_sessions_hourly``: sesiones por hora (``YYYY-MM-DDTHH``)
+
+``db.write_rows`` llama a ``apply`` dentro de la misma transacción que
+inserta las filas, así que los contadores nunca se desvían de los datos:
+o se escribe todo o nada. Las consultas de ``app.analytics`` leen de aquí
+en O(claves distintas) en lugar de agrupar todos los eventos. Al archivar
+sesiones (``app.maintenance``) se descuentan con ``subtract``.
+
+Si las tablas se crean sobre una base de datos que ya tenía filas (o si se
+sospecha que no cuadran) se regeneran desde los datos crudos:
+
+    python -m app.rollups rebuild [--db data.db]
+"""
+import argparse
+import sqlite3
+from collections import Counter
+from typing import Sequence
+
+SCHEMA = (
+    '''
+    CREATE TABLE IF NOT EXISTS rollup_recommendations (
+        category TEXT NOT NULL,
+        recommendation TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (category, recommendation)
+    ) WITHOUT ROWID
+    ''',
+    # orden de "top por categoría": cada página es un recorrido del índice
+    'CREATE INDEX IF NOT EXISTS idx_rollup_recommendations_rank '
+    'ON rollup_recommendations(category, count DESC, recommendation)',
+    '''
+    CREATE TABLE IF NOT EXISTS rollup_answers (
+        question_id TEXT NOT NULL,
+        answer_id TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (question_id, answer_id)
+    ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS rollup_sessions_hourly (
+        hour TEXT PRIMARY KEY,
+        count INTEGER NOT NULL
+    ) WITHOUT ROWID
+    ''',
+)
+
+# longitud del prefijo ISO de una hora: 2024-01-01T10
+HOUR = 13
+
+_UPSERT_RECOMMENDATIONS = '''
+    INSERT INTO rollup_recommendations(category, recommendation, count) VALUES(?, ?, ?)
+    ON CONFLICT(category, recommendation) DO UPDATE SET count = count + excluded.count
+'''
+_UPSERT_ANSWERS = '''
+    INSERT INTO rollup_answers(question_id, answer_id, count) VALUES(?, ?, ?)
+    ON CONFLICT(question_id, answer_id) DO UPDATE SET count = count + excluded.count
+'''
+_UPSERT_SESSIONS = '''
+    INSERT INTO rollup_sessions_hourly(hour, count) VALUES(?, ?)
+    ON CONFLICT(hour) DO UPDATE SET count = count + excluded.count
+'''
+
+
+def ensure(conn: sqlite3.Connection) -> None:
+    """Crea las tablas; si no existían y ya hay datos, las llena desde cero."""
+    existed = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'rollup_answers'").fetchone()
+    for statement in SCHEMA:
+        conn.execute(statement)
+    if not existed:
+        rebuild(conn)
+
+
+def new_sessions(conn: sqlite3.Connection, sessions: Sequence) -> list:
+    """Las sesiones del lote que todavía no están en la tabla (INSERT OR IGNORE no las cuenta)."""
+    ids = [s[0] for s in sessions]
+    existing = set()
+    for i in range(0, len(ids), 500):
+        chunk = ids[i:i + 500]
+        marks = ','.join('?' * len(chunk))
+        existing.update(r[0] for r in conn.execute(f'SELECT id FROM sessions WHERE id IN ({marks})', chunk))
+    seen = set()
+    out = []
+    for s in sessions:
+        if s[0] not in existing and s[0] not in seen:
+            seen.add(s[0])
+            out.append(s)
+    return out
+
+
+def apply(conn: sqlite3.Connection, sessions: Sequence = (), answers: Sequence = (),
+          recommendations: Sequence = ()) -> None:
+    """
+    Suma el lote a los contadores. Se llama dentro de la transacción de
+    ``write_rows``; ``sessions`` deben ser sólo las que se van a insertar.
+    """
+    if sessions:
+        hours = Counter(s[1][:HOUR] for s in sessions)
+        conn.executemany(_UPSERT_SESSIONS, list(hours.items()))
+    if answers:
+        picks = Counter((a[1], a[2]) for a in answers)
+        conn.executemany(_UPSERT_ANSWERS, [(q, a, n) for (q, a), n in picks.items()])
+    if recommendations:
+        recs = Counter((r[1], r[2]) for r in recommendations)
+        conn.executemany(_UPSERT_RECOMMENDATIONS, [(c, r, n) for (c, r), n in recs.items()])
+
+
+def subtract(conn: sqlite3.Connection, hours: Sequence = (), answers: Sequence = (),
+             recommendations: Sequence = ()) -> None:
+    """
+    Resta conteos ya agregados (``(clave..., n)``) cuando se archivan o se
+    borran filas crudas; las claves que llegan a cero desaparecen.
+    """
+    conn.executemany('UPDATE rollup_sessions_hourly SET count = count - ? WHERE hour = ?',
+                     [(n, h) for h, n in hours])
+    conn.executemany('UPDATE rollup_answers SET count = count - ? WHERE question_id = ? AND answer_id = ?',
+                     [(n, q, a) for q, a, n in answers])
+    conn.executemany('UPDATE rollup_recommendations SET count = count - ? WHERE category = ? AND recommendation = ?',
+                     [(n, c, r) for c, r, n in recommendations])
+    for table in ('rollup_sessions_hourly', 'rollup_answers', 'rollup_recommendations'):
+        conn.execute(f'DELETE FROM {table} WHERE count <= 0')
+
+
+def rebuild(conn: sqlite3.Connection) -> None:
+    """Regenera los contadores a partir de las filas crudas (en la transacción en curso)."""
+    conn.execute('DELETE FROM rollup_recommendations')
+    conn.execute('DELETE FROM rollup_answers')
+    conn.execute('DELETE FROM rollup_sessions_hourly')
+    conn.execute('''
+        INSERT INTO rollup_recommendations(category, recommendation, count)
+        SELECT r.category, t.text, r.n
+        FROM (SELECT category, text_id, COUNT(*) AS n FROM session_recommendations
+              GROUP BY category, text_id) r
+        JOIN recommendation_texts t ON t.id = r.text_id
+    ''')
+    conn.execute('''
+        INSERT INTO rollup_answers(question_id, answer_id, count)
+        SELECT question_id, answer_id, COUNT(*) FROM answers GROUP BY question_id, answer_id
+    ''')
+    conn.execute(f'''
+        INSERT INTO rollup_sessions_hourly(hour, count)
+        SELECT substr(timestamp, 1, {HOUR}), COUNT(*) FROM sessions GROUP BY 1
+    ''')
+
+
+def main(argv=None):
+    from app import db
+
+    parser = argparse.ArgumentParser(prog='python -m app.rollups')
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_rebuild = sub.add_parser('rebuild', help='regenera los contadores desde las tablas crudas')
+    p_rebuild.add_argument('--db', default=None)
+    args = parser.parse_args(argv)
+
+    if args.db:
+        db.DB_PATH = args.db
+    db.init_db()
+    conn = db.get_db_conn()
+    with conn:
+        rebuild(conn)
+    counts = {t: conn.execute(f'SELECT COUNT(*) FROM {t}').fetchone()[0]
+              for t in ('rollup_recommendations', 'rollup_answers', 'rollup_sessions_hourly')}
+    print(", ".join(f"{t}: {n} filas" for t, n in counts.items()))
+    db.close_all()
+
+
+if __name__ == '__main__':
+    main()
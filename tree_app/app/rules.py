@@ -0,0 +1,191 @@
+"""
+Reglas de enriquecimiento de recomendaciones.
+
+Cada regla se aplica a las respuestas cuya pregunta (el padre de la opción
+elegida) contiene alguna de las palabras de ``question``. Una alternativa
+puede ser una tupla: en ese caso todas sus palabras deben aparecer.
+Las ramas de ``options`` se evalúan en orden sobre el texto de la opción;
+si la regla es ``exclusive`` sólo aplica la primera rama que coincide
+(equivalente a un if/elif), si no, aplican todas las que coincidan.
+
+Para añadir una regla basta con agregar una entrada a ``RULES``; el
+compilador resuelve el resultado por id de opción al cargar el árbol.
+"""
+from typing import Dict, List, Optional
+
+from app.tree_parser import Node
+
+
+RULES: List[Dict] = [
+    # Tipo de Aplicación
+    {
+        "question": [("tipo", "aplicaci")],
+        "exclusive": True,
+        "options": [
+            (["web"], {
+                "frontend": ["React", "Vue.js", "HTML5/CSS3"],
+                "backend": ["Node.js (Express)", "Django (Python)"],
+                "database": ["PostgreSQL"],
+                "architecture": ["Monolito modulable / Microservicios según escala"],
+            }),
+            (["móvil", "movil"], {
+                "frontend": ["React Native", "Flutter"],
+                "backend": ["Node.js / Django"],
+                "database": ["PostgreSQL / Firebase (según necesidades)"],
+                "architecture": ["Backend escalable (Microservicios si es enterprise)"],
+            }),
+            (["escritorio"], {
+                "frontend": ["Electron / Tauri"],
+                "backend": ["Go / .NET / Java"],
+            }),
+            (["híbrida"], {
+                "frontend": ["Ionic", "Capacitor", "React Native"],
+                "backend": ["Node.js"],
+            }),
+            (["enterprise", "enterpris"], {
+                "backend": ["Java (Spring)", "Go"],
+                "architecture": ["Arquitectura enterprise, alta disponibilidad"],
+            }),
+        ],
+    },
+    # Ámbito Principal (acepta varios sinónimos)
+    {
+        "question": ["ámbito", "ambito"],
+        "exclusive": True,
+        "options": [
+            (["b2c", "consumidor", "consumo", "cliente", "público", "publico"], {
+                "frontend": ["SPA (React/Vue) con enfoque UX y rendimiento"],
+                "backend": ["Node.js con CDN y caching"],
+                "methodology": ["Ágil (Ciclos cortos, MVP)"],
+            }),
+            (["b2b", "empresa", "empresas", "negocio", "negocios"], {
+                "backend": ["Java Spring / .NET para mantenibilidad y SLAs"],
+                "security": ["OAuth2, SSO, cumplimiento de normativas"],
+                "database": ["PostgreSQL / Oracle"],
+            }),
+            (["interna", "uso interno", "herramienta interna", "interno"], {
+                "backend": ["Python (Django/Flask) para rapidez de desarrollo"],
+                "database": ["SQLite / PostgreSQL según tamaño"],
+            }),
+            (["educacional", "educacion", "formacion", "formación"], {
+                "frontend": ["React/Vanilla + accesibilidad (a11y)"],
+                "methodology": ["MVP + feedback de usuarios"],
+            }),
+            (["comercio", "comercio electrónico", "e-commerce", "ventas", "ventas en línea"], {
+                "frontend": ["React + librerías de comercio (o Headless CMS)"],
+                "backend": ["Node.js / Django con integración de pasarelas de pago (Stripe/PayPal)"],
+                "database": ["PostgreSQL / Managed DB con respaldo y escalado"],
+                "architecture": ["CDN, caching, búsqueda (ElasticSearch), escalado horizontal"],
+                "security": ["PCI-DSS considerations, HTTPS, protección contra fraudes"],
+            }),
+        ],
+    },
+    # Característica prioritaria
+    {
+        "question": ["característica", "caracteristica"],
+        "options": [
+            (["velocidad", "rápido"], {
+                "backend": ["Node.js / Serverless (deploy rápido)"],
+                "methodology": ["Ciclos cortos, prototipado rápido"],
+            }),
+            (["alto rendimiento", "rendimiento"], {
+                "backend": ["Go / Rust"],
+                "architecture": ["Servicios optimizados, benchmarking"],
+            }),
+            (["escalabilidad"], {
+                "architecture": ["Microservicios + Kubernetes"],
+            }),
+        ],
+    },
+    # Tipo de interfaz
+    {
+        "question": ["interfaz"],
+        "options": [
+            (["simple"], {"frontend": ["HTML/CSS/JS simple"]}),
+            (["interactiva"], {"frontend": ["SPA (React/Vue)"]}),
+            (["rica"], {"frontend": ["WebGL / Canvas"]}),
+            (["tiempo real", "real"], {"architecture": ["Sockets / WebRTC (ej: Socket.IO)"]}),
+        ],
+    },
+    # Gestión de datos
+    {
+        "question": ["estructura", "estructura de datos"],
+        "options": [
+            (["estructurada"], {"database": ["RDBMS (PostgreSQL, MySQL)"]}),
+            (["semi"], {"database": ["MongoDB / Firebase"]}),
+            (["no estructurada", "no estructur"], {"database": ["Data lake / almacenamiento en blob (S3)"]}),
+        ],
+    },
+    # Volumen
+    {
+        "question": ["volumen"],
+        "options": [
+            (["pequeño"], {"database": ["DB local o soluciones gratuitas (SQLite, managed small DB)"]}),
+            (["grande", "masivo"], {"architecture": ["Escalado horizontal, shards, particionado"]}),
+        ],
+    },
+    # Seguridad e integraciones
+    {
+        "question": ["integraciones", "pagos"],
+        "options": [
+            (["pagos", "stripe", "paypal"], {"backend": ["Integración con Stripe/PayPal SDKs"]}),
+        ],
+    },
+    {
+        "question": ["seguridad"],
+        "options": [
+            (["enterprise", "compliance", "iso"], {"security": ["Compliance ISO, SSO, auditoría y logging"]}),
+            (["cifrado", "extremo"], {"security": ["Cifrado extremo a extremo, gestión de claves"]}),
+        ],
+    },
+]
+
+
+def _matches(text: str, alternatives) -> bool:
+    for alt in alternatives:
+        if isinstance(alt, tuple):
+            if all(k in text for k in alt):
+                return True
+        elif alt in text:
+            return True
+    return False
+
+
+def apply_rules(question_text: str, option_text: str, rules: List[Dict] = RULES) -> Dict[str, List[str]]:
+    """Devuelve las recomendaciones que aportan las reglas para un par pregunta/opción."""
+    qt = question_text.lower()
+    ot = option_text.lower()
+    out: Dict[str, List[str]] = {}
+    for rule in rules:
+        if not _matches(qt, rule["question"]):
+            continue
+        for keys, contributions in rule["options"]:
+            if not _matches(ot, keys):
+                continue
+            for category, items in contributions.items():
+                out.setdefault(category, []).extend(items)
+            if rule.get("exclusive"):
+                break
+    return out
+
+
+def compile_rules(root: Node, rules: Optional[List[Dict]] = None) -> Dict[str, Dict[str, List[str]]]:
+    """
+    Resuelve una sola vez, para cada nodo del árbol, las recomendaciones que
+    aportan las reglas cuando ese nodo se elige como respuesta. Devuelve un
+    diccionario id -> {categoría: [recomendaciones]} con sólo los ids que
+    aportan algo; en cada petición basta con buscar el id de la respuesta.
+    """
+    if rules is None:
+        rules = RULES
+    if not root.index:
+        root.build_index()
+    table: Dict[str, Dict[str, List[str]]] = {}
+    for node_id, node in root.index.items():
+        parent = node.parent
+        if not node.text or parent is None or not parent.text:
+            continue
+        contributions = apply_rules(parent.text, node.text, rules)
+        if contributions:
+            table[node_id] = contributions
+    return table
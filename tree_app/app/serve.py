@@ -0,0 +1,72 @@
+"""
+Arranque en modo multi-worker.
+
+    python -m app.serve --workers 4 [--host 0.0.0.0] [--port 8000]
+
+El proceso maestro:
+
+1. parsea ``flujo.txt`` una sola vez y escribe la instantánea compilada
+   (``app.snapshot``); los workers la abren con mmap en lugar de parsear
+   y sirven desde ella sin copiar el árbol: las páginas del fichero las
+   comparte el sistema operativo;
+2. arranca el escritor único de SQLite (``app.writer``) en su propio
+   proceso;
+3. lanza los workers de uvicorn con ``ARBOL_SNAPSHOT_PATH`` y
+   ``ARBOL_WRITER_SOCKET`` apuntando a lo anterior.
+
+Al terminar uvicorn se para el escritor, que escribe lo pendiente antes de
+salir.
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+import uvicorn
+
+from app import snapshot, writer
+from app import state as tree_state
+
+
+def start_writer(path: str, timeout: float = 10.0) -> multiprocessing.Process:
+    proc = multiprocessing.Process(target=writer.run_server, args=(path,), name="arbol-writer")
+    proc.start()
+    deadline = time.monotonic() + timeout
+    while not os.path.exists(path):
+        if not proc.is_alive() or time.monotonic() > deadline:
+            proc.terminate()
+            raise RuntimeError("no arrancó el escritor de SQLite")
+        time.sleep(0.02)
+    return proc
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m app.serve')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--flujo', default=None)
+    parser.add_argument('--socket', default=None, help='socket Unix del escritor de SQLite')
+    args = parser.parse_args(argv)
+
+    flujo = args.flujo or tree_state.find_flujo_path()
+    snap_path = snapshot.default_path(flujo)
+    state = tree_state.build_state(flujo, use_snapshot=False)
+    tree_state.compile_snapshot(state, snap_path)
+    print(f"✅ Instantánea {snap_path} ({state.node_count} nodos, versión {state.version})")
+
+    socket_path = args.socket or os.path.join(tempfile.mkdtemp(prefix='arbol-'), 'writer.sock')
+    proc = start_writer(socket_path)
+    os.environ['ARBOL_FLUJO_PATH'] = os.path.abspath(flujo)
+    os.environ['ARBOL_SNAPSHOT_PATH'] = snap_path
+    os.environ['ARBOL_WRITER_SOCKET'] = socket_path
+    try:
+        uvicorn.run('app.main:app', host=args.host, port=args.port, workers=args.workers)
+    finally:
+        proc.terminate()
+        proc.join(30)
+
+
+if __name__ == '__main__':
+    main()
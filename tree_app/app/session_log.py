@@ -0,0 +1,150 @@
+"""
+Respaldo de sesiones en un log JSON Lines de sólo anexado.
+
+Cada sesión guardada es una línea; escribir cuesta O(1) sin importar
+cuántas sesiones haya. Si se define un tamaño máximo, el fichero activo se
+rota a ``<ruta>.<n>`` (n creciente) y se empieza uno nuevo; el lector
+recorre los segmentos rotados en orden y al final el activo.
+
+Con varios workers (``app.serve``) cada proceso anexa al mismo fichero: la
+comprobación de tamaño, la rotación y la escritura van bajo un ``flock``
+sobre ``<ruta>.lock``, así que dos procesos no rotan a la vez al mismo
+número de segmento.
+
+Uso desde la línea de comandos:
+
+    python -m app.session_log migrate [sessions.json]   # migración única
+    python -m app.session_log export [--format json]    # volcado en streaming
+"""
+import argparse
+import contextlib
+import glob
+import json
+import os
+import sys
+import threading
+from typing import Dict, Iterator, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: sólo el lock entre hilos
+    fcntl = None
+
+SESSIONS_LOG_PATH = os.environ.get(
+    'ARBOL_SESSIONS_LOG', os.path.join(os.path.dirname(__file__), '..', 'sessions.jsonl'))
+LEGACY_SESSIONS_PATH = os.path.join(os.path.dirname(__file__), '..', 'sessions.json')
+# 0 = sin rotación
+MAX_BYTES = int(os.environ.get('ARBOL_SESSIONS_LOG_MAX_BYTES', '0'))
+
+_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def _locked(path: str) -> Iterator[None]:
+    """Exclusión entre hilos (``_lock``) y entre procesos (``flock`` en ``<ruta>.lock``)."""
+    with _lock:
+        if fcntl is None:
+            yield
+            return
+        with open(path + '.lock', 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def segments(path: Optional[str] = None) -> List[str]:
+    """Segmentos rotados en orden, seguidos del fichero activo si existe."""
+    path = path or SESSIONS_LOG_PATH
+    rotated = []
+    for p in glob.glob(glob.escape(path) + '.*'):
+        suffix = p[len(path) + 1:]
+        if suffix.isdigit():
+            rotated.append((int(suffix), p))
+    out = [p for _, p in sorted(rotated)]
+    if os.path.exists(path):
+        out.append(path)
+    return out
+
+
+def _rotate(path: str) -> None:
+    numbers = [int(p.rsplit('.', 1)[1]) for p in segments(path)[:-1]]
+    os.replace(path, f"{path}.{max(numbers, default=0) + 1}")
+
+
+def append(entry: Dict, path: Optional[str] = None, max_bytes: Optional[int] = None) -> None:
+    """Añade una sesión al final del log (una línea JSON)."""
+    path = path or SESSIONS_LOG_PATH
+    max_bytes = MAX_BYTES if max_bytes is None else max_bytes
+    line = json.dumps(entry, ensure_ascii=False) + '\n'
+    with _locked(path):
+        if max_bytes and os.path.exists(path) and os.path.getsize(path) >= max_bytes:
+            _rotate(path)
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(line)
+
+
+def iter_sessions(path: Optional[str] = None) -> Iterator[Dict]:
+    """Lee el log línea a línea; ignora líneas incompletas (p. ej. tras un corte)."""
+    for segment in segments(path):
+        with open(segment, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+def migrate_json(src: Optional[str] = None, dst: Optional[str] = None) -> int:
+    """
+    Pasa las sesiones del antiguo ``sessions.json`` al log y renombra el
+    original a ``.migrated`` para que la migración no se repita.
+    Devuelve cuántas sesiones se migraron.
+    """
+    src = src or LEGACY_SESSIONS_PATH
+    dst = dst or SESSIONS_LOG_PATH
+    if not os.path.exists(src):
+        return 0
+    with open(src, 'r', encoding='utf-8') as f:
+        sessions = json.load(f)
+    with _locked(dst), open(dst, 'a', encoding='utf-8') as out:
+        for entry in sessions:
+            out.write(json.dumps(entry, ensure_ascii=False) + '\n')
+    os.replace(src, src + '.migrated')
+    return len(sessions)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m app.session_log')
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_migrate = sub.add_parser('migrate', help='migra sessions.json al log JSONL')
+    p_migrate.add_argument('src', nargs='?', default=None)
+    p_migrate.add_argument('--log', default=None)
+    p_export = sub.add_parser('export', help='vuelca el log por la salida estándar')
+    p_export.add_argument('--log', default=None)
+    p_export.add_argument('--format', choices=('jsonl', 'json'), default='jsonl')
+    args = parser.parse_args(argv)
+
+    if args.command == 'migrate':
+        n = migrate_json(args.src, args.log)
+        print(f"{n} sesiones migradas")
+        return
+
+    out = sys.stdout
+    if args.format == 'jsonl':
+        for entry in iter_sessions(args.log):
+            out.write(json.dumps(entry, ensure_ascii=False) + '\n')
+    else:
+        # array JSON escrito elemento a elemento, sin cargar el log en memoria
+        out.write('[')
+        for i, entry in enumerate(iter_sessions(args.log)):
+            out.write((',\n' if i else '\n') + json.dumps(entry, ensure_ascii=False))
+        out.write('\n]\n')
+
+
+if __name__ == '__main__':
+    main()
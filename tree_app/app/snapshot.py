@@ -0,0 +1,311 @@
+"""
+Instantánea binaria del árbol compilado, para arrancar sin parsear.
+
+``python -m app.snapshot compile`` parsea ``flujo.txt``, añade las
+recomendaciones globales, compila las reglas, pre-renderiza las respuestas
+de sólo lectura y lo guarda todo en un fichero. Al arrancar, cada worker
+abre el fichero con ``mmap`` y, si coinciden el hash del flujo, la huella
+de las reglas y la del código que genera su contenido, sirve
+directamente desde él: las búsquedas por id, la evaluación y las reglas
+leen los arrays de ``FrozenTree`` y los cuerpos pre-renderizados se
+envían tal cual, sin copiarlos. Las páginas del fichero las comparte el
+sistema operativo entre todos los workers. Si no coincide (o falta, o es de
+otro formato) se parsea como siempre.
+
+Formato::
+
+    MAGIC (8 bytes) | versión de formato (u16) | longitud de cabecera (u32)
+    cabecera JSON: hash del flujo, huellas de las reglas y del código, orden
+                   de bytes, nº de nodos y secciones
+                   {nombre: [desplazamiento, longitud]}
+    secciones alineadas a 8 bytes
+
+El preámbulo es little-endian. Las secciones numéricas son los arrays de
+``FrozenTree`` tal cual (``array.tobytes``, incluidos ``lookup`` y
+``ranks``), en el orden de bytes nativo de la máquina que compiló, y se
+leen sin copiar con ``memoryview.cast``; la cabecera guarda ese orden y en
+una máquina con el otro la instantánea se ignora. Ids, textos y reglas (un
+JSON por id, en el orden de ``lookup``) van como un bloque UTF-8 más un
+array de desplazamientos y se decodifica cada cadena al pedirla
+(``StringTable``). Las respuestas
+pre-renderizadas van en una sección por clave (la clave en JSON).
+
+Uso desde la línea de comandos:
+
+    python -m app.snapshot compile [--flujo flujo.txt] [--output flujo.snap]
+    python -m app.snapshot info [flujo.snap]
+"""
+import argparse
+import functools
+import hashlib
+import importlib.util
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+from array import array
+from collections.abc import Sequence as SequenceABC
+from typing import Dict, Hashable, List, Mapping, NamedTuple, Optional, Sequence
+
+from app.frozen import FrozenRules, FrozenTree
+from app.rules import RULES
+from app.tree_parser import CHUNK_SIZE
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"ARBOLSNP"
+FORMAT_VERSION = 3
+_PREAMBLE = struct.Struct("<8sHI")
+_ALIGN = 8
+
+SNAPSHOT_PATH = os.environ.get('ARBOL_SNAPSHOT_PATH')
+
+# módulos cuyo código decide lo que se guarda: el árbol (parseo y
+# recomendaciones globales), las reglas compiladas, los arrays y los
+# cuerpos pre-renderizados
+_CODE_MODULES = ("app.tree_parser", "app.state", "app.rules", "app.frozen",
+                 "app.payloads", "app.rendered", "app.snapshot")
+
+# arrays numéricos de FrozenTree y su tipo
+_ARRAYS = {
+    "types": "B",
+    "phases": "i",
+    "parents": "i",
+    "child_start": "I",
+    "child_count": "I",
+    "lookup": "I",
+    "ranks": "I",
+}
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+class Snapshot(NamedTuple):
+    version: str
+    rules: str
+    code: str
+    tree: FrozenTree
+    rule_table: Mapping[str, Dict[str, List[str]]]
+    # clave de RenderedResponses -> vista del cuerpo sobre el fichero
+    rendered: Dict[Hashable, memoryview]
+
+
+def default_path(flujo_path: str) -> str:
+    """``ARBOL_SNAPSHOT_PATH`` o, si no está, ``flujo.snap`` junto al flujo."""
+    return SNAPSHOT_PATH or os.path.splitext(flujo_path)[0] + '.snap'
+
+
+def file_version(path: str) -> str:
+    """Hash del fichero, el mismo que calcula ``FlujoParser.version``."""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for data in iter(lambda: f.read(CHUNK_SIZE), b''):
+            h.update(data)
+    return h.hexdigest()[:16]
+
+
+def rules_fingerprint(rules: Optional[Sequence[Dict]] = None) -> str:
+    """Huella de la tabla de reglas: si cambia el código, la instantánea caduca."""
+    return hashlib.sha256(repr(RULES if rules is None else rules).encode('utf-8')).hexdigest()[:16]
+
+
+@functools.lru_cache(maxsize=None)
+def code_fingerprint() -> str:
+    """
+    Huella del código fuente de ``_CODE_MODULES``: si cambia cómo se
+    parsea, se compilan las reglas o se renderizan las respuestas, la
+    instantánea caduca aunque el flujo sea el mismo.
+    """
+    h = hashlib.sha256()
+    for name in _CODE_MODULES:
+        with open(importlib.util.find_spec(name).origin, 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()[:16]
+
+
+def _pack_strings(values: Sequence[str]):
+    offsets = array("I", [0])
+    parts = []
+    pos = 0
+    for v in values:
+        b = v.encode('utf-8')
+        parts.append(b)
+        pos += len(b)
+        offsets.append(pos)
+    return offsets.tobytes(), b"".join(parts)
+
+
+class StringTable(SequenceABC):
+    """Cadenas de un bloque UTF-8 mapeado; cada una se decodifica al pedirla."""
+    __slots__ = ("offsets", "blob")
+
+    def __init__(self, offsets: memoryview, blob: memoryview):
+        self.offsets = offsets
+        self.blob = blob
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        if i < 0:
+            i += len(self)
+        return str(self.blob[self.offsets[i]:self.offsets[i + 1]], 'utf-8')
+
+
+def _rendered_key(key: Hashable) -> str:
+    return "rendered:" + json.dumps(key, ensure_ascii=False)
+
+
+def _parse_rendered_key(name: str) -> Hashable:
+    key = json.loads(name.split(":", 1)[1])
+    return tuple(key) if isinstance(key, list) else key
+
+
+def write_snapshot(path: str, tree: FrozenTree, version: str,
+                   rule_table: Mapping[str, Dict[str, List[str]]],
+                   rendered: Optional[Dict[Hashable, bytes]] = None) -> int:
+    """Escribe la instantánea de forma atómica y devuelve su tamaño en bytes."""
+    sections: Dict[str, bytes] = {}
+    for name in _ARRAYS:
+        sections[name] = getattr(tree, name).tobytes()
+    sections["id_offsets"], sections["ids"] = _pack_strings(tree.ids)
+    sections["text_offsets"], sections["texts"] = _pack_strings(tree.texts)
+    meta = {str(pos): value for pos, value in tree.metadata.items()}
+    sections["metadata"] = json.dumps(meta, ensure_ascii=False).encode('utf-8')
+    sections["rule_offsets"], sections["rules"] = _pack_strings(FrozenRules.pack(tree, rule_table))
+    for key, body in (rendered or {}).items():
+        sections[_rendered_key(key)] = body
+
+    # la cabecera lleva los desplazamientos, que dependen de su propia
+    # longitud: se calculan relativos al final de la cabecera
+    layout = {}
+    pos = 0
+    for name, data in sections.items():
+        pos += -pos % _ALIGN
+        layout[name] = [pos, len(data)]
+        pos += len(data)
+    header = json.dumps({
+        "source": version,
+        "rules": rules_fingerprint(),
+        "code": code_fingerprint(),
+        "byteorder": sys.byteorder,
+        "nodes": len(tree),
+        "sections": layout,
+    }).encode('utf-8')
+    start = _PREAMBLE.size + len(header)
+    start += -start % _ALIGN
+
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, 'wb') as f:
+        f.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header)))
+        f.write(header)
+        for name, data in sections.items():
+            f.seek(start + layout[name][0])
+            f.write(data)
+        size = f.tell()
+    os.replace(tmp, path)
+    return size
+
+
+def read_header(buf) -> Dict:
+    if len(buf) < _PREAMBLE.size:
+        raise SnapshotError("fichero demasiado corto")
+    magic, fmt, header_len = _PREAMBLE.unpack_from(buf, 0)
+    if magic != MAGIC:
+        raise SnapshotError("no es una instantánea del árbol")
+    if fmt != FORMAT_VERSION:
+        raise SnapshotError(f"formato {fmt}, se esperaba {FORMAT_VERSION}")
+    header = json.loads(bytes(buf[_PREAMBLE.size:_PREAMBLE.size + header_len]))
+    start = _PREAMBLE.size + header_len
+    header["start"] = start + (-start % _ALIGN)
+    return header
+
+
+def read_snapshot(path: str) -> Snapshot:
+    """
+    Abre la instantánea con mmap. Todo lo devuelto son vistas sobre el
+    mapeo (sin copia); el fichero sigue mapeado mientras se usen.
+    """
+    with open(path, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(mm)
+    header = read_header(view)
+    if header["byteorder"] != sys.byteorder:
+        raise SnapshotError(f"compilada en una máquina {header['byteorder']}-endian")
+    start = header["start"]
+
+    def section(name: str) -> memoryview:
+        off, length = header["sections"][name]
+        return view[start + off:start + off + length]
+
+    arrays = {name: section(name).cast(code) for name, code in _ARRAYS.items()}
+    ids = StringTable(section("id_offsets").cast("I"), section("ids"))
+    texts = StringTable(section("text_offsets").cast("I"), section("texts"))
+    if len(ids) != header["nodes"]:
+        raise SnapshotError("número de nodos inconsistente")
+
+    def metadata() -> Dict[int, Dict]:
+        # sólo hace falta al reconstruir los Node o al renderizar (ya está hecho)
+        return {int(pos): value for pos, value in json.loads(bytes(section("metadata"))).items()}
+
+    tree = FrozenTree(ids, texts, metadata=metadata, **arrays)
+    rule_table = FrozenRules(tree, StringTable(section("rule_offsets").cast("I"), section("rules")))
+    rendered = {_parse_rendered_key(name): section(name)
+                for name in header["sections"] if name.startswith("rendered:")}
+    return Snapshot(header["source"], header["rules"], header["code"], tree, rule_table, rendered)
+
+
+def load_fresh(path: str, version: str) -> Optional[Snapshot]:
+    """
+    La instantánea de ``path`` si es de este flujo (``version``), de estas
+    reglas y de este código; ``None`` si falta, está obsoleta o no se puede
+    leer.
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        snap = read_snapshot(path)
+    except (OSError, ValueError, KeyError, TypeError) as exc:
+        logger.warning("instantánea %s ignorada: %s", path, exc)
+        return None
+    if snap.version != version or snap.rules != rules_fingerprint() or snap.code != code_fingerprint():
+        logger.warning("instantánea %s obsoleta, se parsea flujo.txt", path)
+        return None
+    return snap
+
+
+def main(argv=None):
+    from app import state as tree_state
+
+    parser = argparse.ArgumentParser(prog='python -m app.snapshot')
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_compile = sub.add_parser('compile', help='parsea flujo.txt y escribe la instantánea')
+    p_compile.add_argument('--flujo', default=None)
+    p_compile.add_argument('--output', default=None)
+    p_info = sub.add_parser('info', help='muestra la cabecera de una instantánea')
+    p_info.add_argument('path', nargs='?', default=None)
+    args = parser.parse_args(argv)
+
+    if args.command == 'compile':
+        flujo = args.flujo or tree_state.find_flujo_path()
+        output = args.output or default_path(flujo)
+        state = tree_state.build_state(flujo, use_snapshot=False)
+        size = tree_state.compile_snapshot(state, output)
+        print(f"{output}: {state.node_count} nodos, {size / 1024:.1f} KiB (versión {state.version})")
+        return
+
+    path = args.path or default_path(tree_state.find_flujo_path())
+    with open(path, 'rb') as f:
+        preamble = f.read(_PREAMBLE.size)
+        header_len = _PREAMBLE.unpack(preamble)[2] if len(preamble) == _PREAMBLE.size else 0
+        header = read_header(preamble + f.read(header_len))
+    json.dump(header, sys.stdout, indent=2)
+    sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,336 @@
+"""
+Árbol cargado y todo lo que se deriva de él.
+
+Un ``TreeState`` se construye completo (parseo, índices, reglas compiladas,
+cachés y respuestas pre-renderizadas) antes de publicarse, y después no se
+modifica. Publicar un árbol nuevo es reasignar una sola referencia, así que
+el cambio es atómico: cada petición toma el estado una vez al empezar y
+sigue con él aunque entretanto se recargue ``flujo.txt``.
+"""
+import asyncio
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Hashable, Iterable, Iterator, List, Mapping, Optional, Tuple, Union
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.tree_parser import FlujoParser, Node
+from app.frozen import FrozenTree
+from app.rules import compile_rules
+from app.evaluation import answer_order, canonical_answer_ids, compute_recommendations
+from app.cache import LRUCache
+from app.rendered import RenderedResponses
+from app import payloads, snapshot
+from app.precompute import PrecomputedTable, PrecomputeLimitError, build_table
+
+logger = logging.getLogger(__name__)
+
+EVAL_CACHE_SIZE = int(os.environ.get('ARBOL_EVAL_CACHE_SIZE', '1024'))
+# conjuntos distintos que recuerda ``evaluate_batch``; al llenarse se vacía
+BATCH_MEMO_SIZE = int(os.environ.get('ARBOL_BATCH_MEMO_SIZE', '10000'))
+# precalcular todas las combinaciones de respuestas al cargar (ver app.precompute)
+PRECOMPUTE = os.environ.get('ARBOL_PRECOMPUTE', '').lower() in ('1', 'true', 'yes')
+
+
+def find_flujo_path() -> str:
+    if os.environ.get('ARBOL_FLUJO_PATH'):
+        return os.environ['ARBOL_FLUJO_PATH']
+    posibles_rutas = [
+        os.path.join(os.path.dirname(__file__), 'flujo.txt'),
+        os.path.join(os.path.dirname(__file__), '..', 'flujo.txt'),
+        os.path.join(os.path.dirname(__file__), '..', '..', 'flujo.txt'),
+        os.path.join(Path.cwd(), 'flujo.txt'),
+    ]
+    for ruta in posibles_rutas:
+        if os.path.exists(ruta):
+            return ruta
+    raise RuntimeError("No se encontró flujo.txt en ninguna de las rutas esperadas")
+
+
+def add_global_recommendations(root: Node) -> None:
+    # 🔹 Añadir recomendaciones globales al árbol
+    frontend_rec = Node("rec_frontend", "React + Vite (Frontend rápido y moderno)", "recommendation")
+    backend_rec = Node("rec_backend", "Node.js con Express (Backend ágil y escalable)", "recommendation")
+    db_rec = Node("rec_db", "PostgreSQL (Base de datos relacional confiable)", "recommendation")
+    arch_rec = Node("rec_arch", "Microservicios con escalado horizontal", "recommendation")
+    meth_rec = Node("rec_meth", "Scrum o Kanban (metodologías ágiles)", "recommendation")
+    sec_rec = Node("rec_sec", "Implementa JWT, HTTPS y backups regulares", "recommendation")
+
+    # 🔹 Crear un nodo final de recomendaciones generales
+    final_recs = Node("phase_final", "📌 Recomendaciones generales", "phase")
+    final_recs.add_child(frontend_rec)
+    final_recs.add_child(backend_rec)
+    final_recs.add_child(db_rec)
+    final_recs.add_child(arch_rec)
+    final_recs.add_child(meth_rec)
+    final_recs.add_child(sec_rec)
+
+    root.add_child(final_recs)
+
+    # 🔹 Conectar al árbol raíz
+    root.add_child(final_recs)
+
+
+class TreeState:
+    """
+    Se construye desde un árbol de ``Node`` (``root``) o desde el
+    ``FrozenTree`` de una instantánea (``frozen``). En el segundo caso la
+    evaluación, las reglas y las respuestas pre-renderizadas se sirven desde
+    el fichero mapeado y los ``Node`` sólo se construyen si algo pide
+    ``root`` (la tabla precalculada, los benchmarks).
+    """
+
+    def __init__(self, root: Optional[Node], version: str, number: int = 0,
+                 source_path: Optional[str] = None, source_mtime: Optional[int] = None,
+                 rule_table: Optional[Mapping[str, Dict[str, List[str]]]] = None,
+                 frozen: Optional[FrozenTree] = None):
+        self._root = root
+        self.frozen = frozen
+        self._root_lock = threading.Lock()
+        # hash del contenido de flujo.txt; forma parte de las claves de caché
+        self.version = version
+        # número de carga, creciente dentro del proceso
+        self.number = number
+        self.source_path = source_path
+        self.source_mtime = source_mtime
+        # id y nombre de versión en app.registry; None para el flujo por defecto
+        self.questionnaire: Optional[str] = None
+        self.label: Optional[str] = None
+
+        if root is not None:
+            # 🔹 Índice id -> nodo y enlaces al padre (incluye las recomendaciones globales)
+            root.build_index()
+            # lo que consulta la evaluación: find / recommendation_texts
+            self.tree: Union[Node, FrozenTree] = root
+            self.answer_order: Mapping[str, int] = answer_order(root)
+        else:
+            self.tree = frozen
+            self.answer_order = frozen.order()
+        # id de opción -> recomendaciones por reglas
+        self.rule_table: Mapping[str, Dict[str, List[str]]] = (
+            compile_rules(root) if rule_table is None else rule_table)
+        # (versión, ids canónicos) -> recomendaciones por categoría
+        self.eval_cache = LRUCache(EVAL_CACHE_SIZE)
+        # cuerpos JSON + ETags de los endpoints de sólo lectura
+        self.rendered = RenderedResponses()
+        # todas las combinaciones ya resueltas, si se pidió (ARBOL_PRECOMPUTE)
+        self.precomputed: Optional[PrecomputedTable] = None
+
+    @property
+    def root(self) -> Node:
+        """El árbol de ``Node``; desde una instantánea se construye la primera vez que se pide."""
+        if self._root is None:
+            with self._root_lock:
+                if self._root is None:
+                    self._root = self.frozen.to_node()
+        return self._root
+
+    def warm(self) -> None:
+        """Pre-renderiza las respuestas fijas para que la primera petición no pague el coste."""
+        if self.frozen is not None and self._root is None:
+            # la instantánea ya trae todas las respuestas renderizadas
+            return
+        self.rendered.get("tree", lambda: payloads.tree_payload(self.root))
+        self.rendered.get("phases", lambda: payloads.phases_payload(self.root))
+        self.rendered.get("api_questions", lambda: payloads.api_questions_payload(self.root))
+        # /questions/{fase}: todas las fases ya renderizadas, cada petición es una búsqueda
+        for phase, questions in payloads.phase_questions_payloads(self.root).items():
+            self.rendered.get(("questions", phase), lambda: questions)
+        # /decision: los dos lados, igual
+        for side in ("left", "right"):
+            if self.root.get_side(side) is not None:
+                self.rendered.get(("decision", side), lambda: payloads.decision_payload(self.root, side))
+
+    def precompute(self, limit: Optional[int] = None) -> PrecomputedTable:
+        self.precomputed = build_table(self.root, self.rule_table, limit)
+        return self.precomputed
+
+    def evaluate(self, answer_ids: Iterable[str]) -> Dict[str, List[str]]:
+        """Recomendaciones para un conjunto de respuestas, pasando por la caché."""
+        key = canonical_answer_ids(self.answer_order, answer_ids)
+        if self.precomputed is not None:
+            recommendations = self.precomputed.get(key)
+            if recommendations is not None:
+                return recommendations
+        recommendations = self.eval_cache.get((self.version, key))
+        if recommendations is None:
+            recommendations = compute_recommendations(self.tree, self.rule_table, key)
+            self.eval_cache.put((self.version, key), recommendations)
+        return recommendations
+
+    def evaluate_batch(self, answer_sets: Iterable[Iterable[str]],
+                       memo: Optional[Dict[Tuple[str, ...], Dict]] = None) -> Iterator[Dict[str, List[str]]]:
+        """
+        Evalúa muchos conjuntos de respuestas en una pasada. Los conjuntos
+        repetidos dentro del lote se calculan una sola vez (``memo``) aunque
+        no quepan en la caché LRU; ``memo`` guarda como mucho
+        ``BATCH_MEMO_SIZE`` conjuntos y se vacía al llenarse, así que un
+        lote de conjuntos todos distintos no crece sin límite. Los
+        resultados son compartidos: no modificarlos.
+        """
+        memo = {} if memo is None else memo
+        table = self.precomputed
+        for answer_ids in answer_sets:
+            key = canonical_answer_ids(self.answer_order, answer_ids)
+            if table is not None:
+                recommendations = table.get(key)
+                if recommendations is not None:
+                    yield recommendations
+                    continue
+            recommendations = memo.get(key)
+            if recommendations is None:
+                recommendations = self.eval_cache.get((self.version, key))
+                if recommendations is None:
+                    recommendations = compute_recommendations(self.tree, self.rule_table, key)
+                    self.eval_cache.put((self.version, key), recommendations)
+                if len(memo) >= BATCH_MEMO_SIZE:
+                    memo.clear()
+                memo[key] = recommendations
+            yield recommendations
+
+    def rendered_bodies(self) -> Dict[Hashable, bytes]:
+        """Las respuestas pre-renderizadas (``warm``), para guardarlas en la instantánea."""
+        return self.rendered.bodies()
+
+    @property
+    def node_count(self) -> int:
+        if self._root is None:
+            return self.frozen.id_count
+        return len(self._root.index)
+
+    def info(self) -> Dict:
+        return {
+            "questionnaire": self.questionnaire,
+            "label": self.label,
+            "version": self.version,
+            "number": self.number,
+            "source": self.source_path,
+            "nodes": self.node_count,
+            "precomputed": self.precomputed.stats() if self.precomputed is not None else None,
+        }
+
+
+def build_state(path: Optional[str] = None, number: int = 0, use_snapshot: bool = True) -> TreeState:
+    """
+    Construye un TreeState listo para servir. Si hay una instantánea
+    compilada del mismo flujo (ver ``app.snapshot``) se carga de ahí; si no,
+    se lee y parsea flujo.txt.
+    """
+    path = path or find_flujo_path()
+    print(f"✅ Archivo flujo.txt encontrado en: {path}")
+    mtime = os.stat(path).st_mtime_ns
+
+    if use_snapshot:
+        snap = snapshot.load_fresh(snapshot.default_path(path), snapshot.file_version(path))
+        if snap is not None:
+            state = TreeState(None, snap.version, number=number, source_path=path,
+                              source_mtime=mtime, rule_table=snap.rule_table, frozen=snap.tree)
+            for key, body in snap.rendered.items():
+                state.rendered.put(key, body)
+            _finish(state)
+            return state
+
+    # 🔹 Aquí se construye el árbol base, leyendo el fichero por trozos
+    parser = FlujoParser()
+    with open(path, 'rb') as f:
+        parser.feed_source(f)
+    root = parser.close()
+    add_global_recommendations(root)
+    version = parser.version
+
+    state = TreeState(root, version, number=number, source_path=path, source_mtime=mtime)
+    _finish(state)
+    return state
+
+
+def _finish(state: TreeState) -> None:
+    state.warm()
+    if PRECOMPUTE:
+        try:
+            stats = state.precompute().stats()
+            logger.info("tabla precalculada: %d combinaciones, %d resultados, %.2f s",
+                        stats["combinations"], stats["distinct_results"], stats["build_seconds"])
+        except PrecomputeLimitError as exc:
+            # se sigue sirviendo con la caché normal
+            logger.warning("%s", exc)
+
+
+def compile_snapshot(state: TreeState, path: str) -> int:
+    """Guarda ``state`` como instantánea binaria; devuelve el tamaño en bytes."""
+    return snapshot.write_snapshot(path, FrozenTree.from_node(state.root), state.version,
+                                   state.rule_table, state.rendered_bodies())
+
+
+_current: Optional[TreeState] = None
+_reload_lock = threading.Lock()
+
+
+def get_state() -> Optional[TreeState]:
+    return _current
+
+
+def set_state(state: TreeState) -> None:
+    global _current
+    _current = state
+
+
+def reload(path: Optional[str] = None, force: bool = False) -> TreeState:
+    """
+    Construye un estado nuevo y lo publica. Las recargas se serializan; si el
+    contenido no cambió (mismo hash) se conserva el estado actual con sus
+    cachés, salvo que ``force`` sea verdadero.
+    """
+    with _reload_lock:
+        current = _current
+        if path is None and current is not None:
+            path = current.source_path
+        number = current.number + 1 if current is not None else 1
+        state = build_state(path, number=number)
+        if current is not None and not force and state.version == current.version:
+            current.source_mtime = state.source_mtime
+            return current
+        set_state(state)
+        logger.info("flujo cargado: %s (versión %s, carga #%d)", state.source_path, state.version, state.number)
+        return state
+
+
+class FlujoWatcher:
+    """Vigila la fecha de modificación de flujo.txt y recarga en segundo plano."""
+
+    def __init__(self, interval: float = 2.0):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        # mtime de la última versión que no se pudo cargar (para no reintentar en bucle)
+        self._failed_mtime: Optional[int] = None
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            state = get_state()
+            if state is None or state.source_path is None:
+                continue
+            mtime = None
+            try:
+                mtime = os.stat(state.source_path).st_mtime_ns
+                if mtime != state.source_mtime and mtime != self._failed_mtime:
+                    # el parseo va al threadpool: las peticiones siguen con el estado anterior
+                    await run_in_threadpool(reload)
+            except Exception:
+                # un flujo con errores no tumba el servidor: se sigue sirviendo el anterior
+                self._failed_mtime = mtime
+                logger.exception("no se pudo recargar %s", state.source_path)
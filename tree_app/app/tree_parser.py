@@ -1,15 +1,48 @@
+import codecs
+import hashlib
 import re
-from typing import Optional, List, Dict
+import sys
+from typing import Optional, List, Dict, Iterator, Match, NamedTuple, Union
+
+from app.categorizer import categorize, FALLBACK_CATEGORY
 
 
 class Node:
+    # sin __dict__ por instancia: los cuestionarios grandes tienen muchos nodos
+    __slots__ = ("id", "text", "node_type", "children", "phase", "parent", "_metadata", "_index", "_phases")
+
     def __init__(self, id: str, text: str, node_type: str = "question"):
-        self.id = id
+        # ids y tipos se repiten mucho entre árboles y respuestas: se internan
+        self.id = sys.intern(id)
         self.text = text
-        self.node_type = node_type  # root, phase, question, option, recommendation
+        self.node_type = sys.intern(node_type)  # root, phase, question, option, recommendation
         self.children: List["Node"] = []
         self.phase: Optional[int] = None
-        self.metadata: Dict = {}
+        self.parent: Optional["Node"] = None
+        # el diccionario de metadatos se crea sólo si alguien lo usa
+        self._metadata: Optional[Dict] = None
+        # índice id -> nodo; sólo se llena en la raíz (ver build_index)
+        self._index: Optional[Dict[str, "Node"]] = None
+        # índice fase -> preguntas; sólo en la raíz y bajo demanda (ver phase_index)
+        self._phases: Optional[Dict[int, tuple]] = None
+
+    @property
+    def metadata(self) -> Dict:
+        if self._metadata is None:
+            self._metadata = {}
+        return self._metadata
+
+    @metadata.setter
+    def metadata(self, value: Dict):
+        self._metadata = value
+
+    def has_metadata(self) -> bool:
+        return bool(self._metadata)
+
+    @property
+    def index(self) -> Dict[str, "Node"]:
+        return self._index if self._index is not None else {}
+
     def get_recommendations(self) -> dict:
         """
         Recorre el árbol y devuelve todas las recomendaciones encontradas,
@@ -22,7 +55,8 @@ class Node:
             'database': [],
             'architecture': [],
             'methodology': [],
-            'security': []
+            'security': [],
+            FALLBACK_CATEGORY: [],
         }
 
         # Diccionario de descripciones para las tecnologías más comunes
@@ -50,23 +84,6 @@ class Node:
             'SSL': 'Protocolo de cifrado para proteger las comunicaciones (Seguridad).',
         }
 
-        # Clasificador de categorías
-        def categorize(text: str) -> str:
-            t = text.lower()
-            if any(k in t for k in ['react', 'vue', 'html', 'css', 'angular', 'frontend']):
-                return 'frontend'
-            if any(k in t for k in ['node', 'django', 'flask', 'spring', 'java', 'go', 'backend']):
-                return 'backend'
-            if any(k in t for k in ['sql', 'mysql', 'postgres', 'mongodb', 'database', 'firebase', 'db']):
-                return 'database'
-            if any(k in t for k in ['microserv', 'arquitectura', 'monolit', 'cloud']):
-                return 'architecture'
-            if any(k in t for k in ['scrum', 'kanban', 'metodolog']):
-                return 'methodology'
-            if any(k in t for k in ['oauth', 'jwt', 'ssl', 'security', 'cifrado']):
-                return 'security'
-            return 'backend'
-
         # Recorre el árbol y recolecta recomendaciones
         def traverse(node):
             if getattr(node, 'node_type', '') == 'recommendation':
@@ -96,8 +113,69 @@ class Node:
 
 
     def add_child(self, node: "Node"):
+        node.parent = self
         self.children.append(node)
 
+    def build_index(self) -> Dict[str, "Node"]:
+        """
+        Recorre el árbol una sola vez, fija los enlaces al padre y construye
+        el índice id -> nodo. Si hay ids repetidos se conserva el primero en
+        orden de recorrido (igual que una búsqueda en profundidad).
+        """
+        index: Dict[str, Node] = {}
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            index.setdefault(node.id, node)
+            for child in reversed(node.children):
+                child.parent = node
+                stack.append(child)
+        self._index = index
+        self._phases = None
+        return index
+
+    @property
+    def phase_index(self) -> Dict[int, tuple]:
+        """
+        Número de fase -> preguntas de esa fase en orden del árbol (las que
+        quedan fuera de toda partición son la fase 0). Se construye en un
+        recorrido la primera vez; el árbol no cambia después de cargarse.
+        """
+        if self._phases is None:
+            phases: Dict[int, list] = {}
+            stack = [self]
+            while stack:
+                node = stack.pop()
+                if node.node_type == "question":
+                    phases.setdefault(node.phase or 0, []).append(node)
+                stack.extend(reversed(node.children))
+            self._phases = {phase: tuple(questions) for phase, questions in phases.items()}
+        return self._phases
+
+    def get_phase_questions(self, phase: int) -> tuple:
+        """Preguntas de una fase (tupla vacía si no existe); una búsqueda en el índice."""
+        return self.phase_index.get(phase, ())
+
+    def get_side(self, side: str) -> Optional["Node"]:
+        """Rama izquierda (primer hijo) o derecha (segundo hijo), o None si no existe."""
+        position = {"left": 0, "right": 1}.get(side)
+        if position is None or position >= len(self.children):
+            return None
+        return self.children[position]
+
+    def find(self, node_id: str) -> Optional["Node"]:
+        """Busca un nodo por id en O(1) usando el índice de la raíz."""
+        if self._index is None:
+            return None
+        return self._index.get(node_id)
+
+    def recommendation_texts(self, node_id: str) -> List[str]:
+        """Textos de los hijos de tipo recomendación del nodo con ese id ([] si no existe)."""
+        node = self.find(node_id)
+        if node is None:
+            return []
+        return [c.text for c in node.children if c.node_type == 'recommendation']
+
     def to_dict(self) -> Dict:
         res = {
             "id": self.id,
@@ -107,12 +185,220 @@ class Node:
         }
         if self.phase is not None:
             res["phase"] = self.phase
-        if self.metadata:
-            res["metadata"] = self.metadata
+        if self._metadata:
+            res["metadata"] = self._metadata
         return res
 
 
-def parse_flujo(text: str) -> Node:
+# --- Tokenizador -----------------------------------------------------------
+#
+# Una sola expresión regular recorre el texto completo y, en cada línea,
+# decide por el primer carácter o la palabra clave qué construcción es:
+#   :¿Texto?;  /  :Pregunta N: Texto?;   -> QUESTION (valor: texto)
+#   :Texto;                             -> ACTION   (valor: texto)
+#   if (X) then (LABEL) / elseif (...)  -> OPTION   (valor: LABEL)
+#   partition "Título"                  -> PARTITION (valor: título)
+# Las líneas que no empiezan así (start, stop, endif, '}', comentarios "'",
+# continuaciones de acciones de varias líneas, ...) no producen tokens.
+# ``[^\S\n]`` es "espacio en blanco salvo salto de línea": ninguna
+# construcción cruza de una línea a otra.
+
+QUESTION = "question"
+ACTION = "action"
+OPTION = "option"
+PARTITION = "partition"
+
+_TOKEN_RE = re.compile(r"""
+    ^[^\S\n]*
+    (?:
+        :[^\S\n]*(?:
+            ([^;\n?]+);                                                        # 1: acción (camino rápido)
+          | (?:Pregunta[^\S\n]*\d*[^\S\n]*:)?[^\S\n]*(¿?[^\S\n]*.+?\?)[^\S\n]*;   # 2: pregunta
+          | ([^;\n]+);                                                        # 3: acción con '?'
+        )
+      | (?:else)?if[^\S\n]*\(([^)\n]+)\)[^\S\n]*then[^\S\n]*\(([^)\n]+)\)       # 4, 5: opción
+      | partition[^\S\n]*"([^"\n]+)"                                            # 6: partición
+      | ((?:else)?if|partition)\b                                               # 7: mal formada
+    )
+""", re.MULTILINE | re.IGNORECASE | re.VERBOSE)
+
+# número de grupo (m.lastindex) -> tipo de token
+_KINDS = {1: ACTION, 2: QUESTION, 3: ACTION, 5: OPTION, 6: PARTITION}
+_BAD = 7
+_EXPECTED = {
+    "partition": 'se esperaba partition "Título"',
+    "if": "se esperaba 'if (X) then (ETIQUETA)'",
+    "elseif": "se esperaba 'elseif (X) then (ETIQUETA)'",
+}
+
+_PHASE_NUM_RE = re.compile(r"FASE\s*(\d+)")
+# acciones que son controles o metadatos, no recomendaciones
+_IGNORED_ACTIONS = ("inicio", "stop", "end", "title", "endif")
+
+
+class Token(NamedTuple):
+    kind: str
+    value: str
+    line: int
+    col: int
+
+
+class FlujoSyntaxError(ValueError):
+    def __init__(self, message: str, line: int, col: int):
+        super().__init__(f"línea {line}, columna {col}: {message}")
+        self.line = line
+        self.col = col
+
+
+def _normalize_newlines(text: str) -> str:
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text
+
+
+def _position(text: str, pos: int, first_line: int = 1):
+    """Línea y columna (desde 1) de una posición del texto."""
+    line_start = text.rfind("\n", 0, pos) + 1
+    return first_line + text.count("\n", 0, pos), pos - line_start + 1
+
+
+def _syntax_error(text: str, m, first_line: int = 1) -> FlujoSyntaxError:
+    line, col = _position(text, m.start(_BAD), first_line)
+    return FlujoSyntaxError(_EXPECTED[m.group(_BAD).lower()], line, col)
+
+
+def _scan(text: str, strict: bool = False, first_line: int = 1) -> Iterator[Match]:
+    """
+    Coincidencias de ``_TOKEN_RE`` que son tokens: el tipo es
+    ``_KINDS[m.lastindex]`` y el valor ``m.group(m.lastindex)``. Es el paso
+    común de ``tokenize`` y del constructor del árbol; las construcciones mal
+    formadas lanzan ``FlujoSyntaxError`` con ``strict`` y si no se saltan.
+    """
+    for m in _TOKEN_RE.finditer(text):
+        if m.lastindex == _BAD:
+            if strict:
+                raise _syntax_error(text, m, first_line)
+            continue
+        yield m
+
+
+def tokenize(text: str, strict: bool = False) -> Iterator[Token]:
+    """
+    Convierte el flujo en tokens con su línea y columna (desde 1).
+    Con ``strict`` las construcciones mal formadas (partition sin título entre
+    comillas, if/elseif sin ``then (...)``) lanzan ``FlujoSyntaxError``; si no,
+    se ignoran como hacía el parser original.
+    """
+    text = _normalize_newlines(text)
+    line = 1
+    pos = 0
+    for m in _scan(text, strict):
+        g = m.lastindex
+        # m.start() es el comienzo de la línea: la columna es la del primer
+        # carácter que no es espacio
+        start = m.start()
+        line += text.count("\n", pos, start)
+        pos = start
+        head = m.group(0)
+        col = len(head) - len(head.lstrip()) + 1
+        yield Token(_KINDS[g], m.group(g), line, col)
+
+
+class _TreeBuilder:
+    """Estado del parser: fase, última pregunta/opción y contadores de ids."""
+
+    def __init__(self):
+        self.root = Node("root", "root", node_type="root")
+        self.index: Dict[str, Node] = {"root": self.root}
+        self.current_phase: Optional[Node] = None
+        self.phase_num = 0
+        self.last_question: Optional[Node] = None
+        self.last_option: Optional[Node] = None
+        self.qcount = 0
+        self.optcount = 0
+        self.recount = 0
+        # líneas ya consumidas (para numerar errores en textos por partes)
+        self.lines_seen = 0
+
+    def feed(self, text: str, strict: bool = False) -> None:
+        text = _normalize_newlines(text)
+        # el estado va a variables locales mientras dura el bucle
+        root = self.root
+        index = self.index
+        current_phase = self.current_phase
+        phase_num = self.phase_num
+        last_question = self.last_question
+        last_option = self.last_option
+        qcount, optcount, recount = self.qcount, self.optcount, self.recount
+
+        for m in _scan(text, strict, self.lines_seen + 1):
+            g = m.lastindex
+            kind = _KINDS[g]
+            value = m[g]
+            if kind == ACTION:
+                # acción / resultado general
+                text_act = value.strip()
+                # ignorar controles y metadatos comunes
+                if text_act.lower().startswith(_IGNORED_ACTIONS):
+                    continue
+                recount += 1
+                node = Node(f"r{phase_num}_{recount}", text_act, "recommendation")
+                # opción, si no pregunta, si no fase y por último el root
+                parent = last_option or last_question or current_phase or root
+
+            elif kind == OPTION:
+                # if (...) then (LABEL) / elseif (...) then (LABEL)
+                if last_question is None:
+                    continue
+                optcount += 1
+                node = Node(f"o{phase_num}_{optcount}", value.strip(), "option")
+                parent = last_question
+                last_option = node
+
+            elif kind == QUESTION:
+                # pregunta explícita
+                qtext = value.strip().lstrip("¿").strip()
+                qcount += 1
+                node = Node(f"q{phase_num}_{qcount}", qtext, "question")
+                node.phase = phase_num
+                parent = current_phase or root
+                last_question = node
+                last_option = None
+
+            else:
+                # nueva partición -> fase
+                title = value.strip()
+                m_ph = _PHASE_NUM_RE.search(title.upper())
+                if m_ph:
+                    phase_num = int(m_ph.group(1))
+                else:
+                    phase_num += 1
+                node = Node(f"phase{phase_num}", title, "phase")
+                node.phase = phase_num
+                parent = root
+                current_phase = node
+                last_question = None
+                last_option = None
+
+            node.parent = parent
+            parent.children.append(node)
+            # los nodos se crean en preorden: el primero con cada id gana
+            if node.id not in index:
+                index[node.id] = node
+
+        self.current_phase = current_phase
+        self.phase_num = phase_num
+        self.last_question = last_question
+        self.last_option = last_option
+        self.qcount, self.optcount, self.recount = qcount, optcount, recount
+        self.lines_seen += text.count("\n")
+
+    def finish(self) -> Node:
+        self.root._index = self.index
+        return self.root
+
+
+def parse_flujo(text: str, strict: bool = False) -> Node:
     """
     Parsea un flujo PlantUML simplificado y construye un árbol:
       - partition -> nodo 'phase'
@@ -120,107 +406,123 @@ def parse_flujo(text: str) -> Node:
       - if(...) then (...) / elseif(...) -> opciones (option) como hijos de la última pregunta
       - otras acciones ':texto;' -> recommendations (hijo de la última opción o de la fase)
     Soporta tanto ':¿Qué...?;' como ':Pregunta 1: Texto?;'
+    Con ``strict`` las líneas mal formadas lanzan ``FlujoSyntaxError`` con
+    su línea y columna.
     """
-    lines = text.splitlines()
-    root = Node("root", "root", node_type="root")
-
-    partition_re = re.compile(r'partition\s*"([^"]+)"', re.IGNORECASE)
-    # acepta preguntas como ':¿Texto?;' o ':Pregunta 1: Texto?;'
-    question_re = re.compile(r":\s*(?:Pregunta\s*\d*\s*:)?\s*(¿?\s*.+?\?)\s*;", re.IGNORECASE)
-    # if (X) then (LABEL)
-    if_then_re = re.compile(r"if\s*\(([^)]+)\)\s*then\s*\(([^)]+)\)", re.IGNORECASE)
-    # elseif (X) then (LABEL)
-    elseif_re = re.compile(r"elseif\s*\(([^)]+)\)\s*then\s*\(([^)]+)\)", re.IGNORECASE)
-    # acción/resultado general ':Texto;'
-    action_re = re.compile(r":\s*([^;]+);")
-
-    current_phase: Optional[Node] = None
-    phase_num = 0
-    last_question: Optional[Node] = None
-    last_option: Optional[Node] = None
-
-    qcount = 0
-    optcount = 0
-    recount = 0
-
-    for raw in lines:
-        ln = raw.strip()
-        if not ln or ln.startswith("'"):
-            continue
+    builder = _TreeBuilder()
+    builder.feed(text, strict=strict)
+    return builder.finish()
 
-        # nueva partición -> fase
-        m_part = partition_re.search(ln)
-        if m_part:
-            title = m_part.group(1).strip()
-            m_ph = re.search(r"FASE\s*(\d+)", title.upper())
-            if m_ph:
-                phase_num = int(m_ph.group(1))
-            else:
-                phase_num += 1
-            current_phase = Node(f"phase{phase_num}", title, node_type="phase")
-            current_phase.phase = phase_num
-            root.add_child(current_phase)
-            last_question = None
-            last_option = None
-            continue
 
-        # pregunta explícita
-        m_q = question_re.search(ln)
-        if m_q:
-            qtext = m_q.group(1).strip()
-            qtext = qtext.lstrip("¿").strip()
-            qcount += 1
-            qnode = Node(f"q{phase_num}_{qcount}", qtext, node_type="question")
-            qnode.phase = phase_num
-            if current_phase:
-                current_phase.add_child(qnode)
-            else:
-                root.add_child(qnode)
-            last_question = qnode
-            last_option = None
-            continue
+# --- Parseo incremental -----------------------------------------------------
 
-        # if (...) then (LABEL)
-        m_if = if_then_re.search(ln)
-        if m_if and last_question:
-            label = m_if.group(2).strip()
-            optcount += 1
-            opt = Node(f"o{phase_num}_{optcount}", label, node_type="option")
-            last_question.add_child(opt)
-            last_option = opt
-            continue
+# tamaño de los trozos que se leen de ficheros y mmap
+CHUNK_SIZE = 1 << 20
 
-        # elseif (...) then (LABEL)
-        m_elseif = elseif_re.search(ln)
-        if m_elseif and last_question:
-            label = m_elseif.group(2).strip()
-            optcount += 1
-            opt = Node(f"o{phase_num}_{optcount}", label, node_type="option")
-            last_question.add_child(opt)
-            last_option = opt
-            continue
 
-        # acción / resultado general
-        m_act = action_re.search(ln)
-        if m_act:
-            text_act = m_act.group(1).strip()
-            low = text_act.lower()
-            # ignorar controles y metadatos comunes
-            if low.startswith("inicio") or low.startswith("stop") or low.startswith("end") or low.startswith("title") or low.startswith("endif"):
-                continue
-            recount += 1
-            rec = Node(f"r{phase_num}_{recount}", text_act, node_type="recommendation")
-            if last_option:
-                last_option.add_child(rec)
-            elif last_question:
-                # si no hay opción, pero hay pregunta, agregar a la pregunta
-                last_question.add_child(rec)
-            elif current_phase:
-                # si no hay opción ni pregunta, pero hay fase, agregar a la fase
-                current_phase.add_child(rec)
-            else:
-                # por último, agregar al root
-                root.add_child(rec)
-            continue
+class FlujoParser:
+    """
+    Parser incremental: recibe el flujo por trozos (``str`` o ``bytes``) y va
+    construyendo el árbol sin tener nunca el texto completo en memoria.
+
+    Los trozos pueden cortar en cualquier punto, también en medio de un
+    carácter UTF-8: sólo se procesan líneas completas y el resto espera al
+    siguiente ``feed``. El estado (fase, última pregunta/opción, contadores
+    de ids) se conserva entre llamadas, así que un flujo repartido en varios
+    ficheros se parsea segmento a segmento con ``feed_source`` sobre cada
+    uno. ``close()`` termina y devuelve la raíz.
+
+    ``version`` es el hash (sha256, 16 caracteres) de los bytes recibidos,
+    el mismo que usa ``TreeState`` para invalidar cachés.
+    """
+
+    def __init__(self, strict: bool = False):
+        self.strict = strict
+        self._builder = _TreeBuilder()
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._hash = hashlib.sha256()
+        # última línea incompleta
+        self._tail = ""
+        self._root: Optional[Node] = None
+
+    def feed(self, data: Union[str, bytes]) -> None:
+        if self._root is not None:
+            raise RuntimeError("el parser ya está cerrado")
+        if isinstance(data, str):
+            self._hash.update(data.encode("utf-8"))
+        else:
+            self._hash.update(data)
+            data = self._decoder.decode(data)
+        cut = data.rfind("\n")
+        if cut < 0:
+            self._tail += data
+            return
+        chunk = self._tail + data[:cut + 1] if self._tail else data[:cut + 1]
+        self._tail = data[cut + 1:]
+        self._builder.feed(chunk, self.strict)
 
-    return root
+    def end_segment(self) -> None:
+        """Da por terminada la última línea pendiente (fin de un fichero)."""
+        if self._tail:
+            tail, self._tail = self._tail, ""
+            self._builder.feed(tail, self.strict)
+            # sin "\n" final, feed() no la cuenta como línea
+            self._builder.lines_seen += 1
+
+    def feed_source(self, source, chunk_size: int = CHUNK_SIZE) -> None:
+        """
+        Consume un segmento completo: texto, bytes, un fichero (texto o
+        binario), un ``mmap`` o cualquier iterable de líneas. Las líneas de
+        un iterable sin salto de línea final (p. ej. de ``splitlines()``) se
+        tratan como líneas completas.
+        """
+        if isinstance(source, (str, bytes, bytearray, memoryview)):
+            self.feed(source)
+        elif hasattr(source, "read"):
+            # ficheros y mmap: trozos de tamaño fijo
+            while True:
+                data = source.read(chunk_size)
+                if not data:
+                    break
+                self.feed(data)
+        else:
+            # iterable de líneas: se agrupan para que la regex trabaje con
+            # trozos grandes
+            batch: list = []
+            size = 0
+            for line in source:
+                newline = b"\n" if isinstance(line, (bytes, bytearray)) else "\n"
+                if not line.endswith(newline):
+                    line += newline
+                batch.append(line)
+                size += len(line)
+                if size >= chunk_size:
+                    self.feed(newline[:0].join(batch))
+                    batch, size = [], 0
+            if batch:
+                self.feed(batch[0][:0].join(batch))
+        self.end_segment()
+
+    def close(self) -> Node:
+        if self._root is None:
+            rest = self._decoder.decode(b"", final=True)
+            if rest:
+                self._tail += rest
+            self.end_segment()
+            self._root = self._builder.finish()
+        return self._root
+
+    @property
+    def version(self) -> str:
+        return self._hash.hexdigest()[:16]
+
+
+def parse_stream(*sources, strict: bool = False, chunk_size: int = CHUNK_SIZE) -> Node:
+    """
+    Parsea uno o varios segmentos (ficheros, mmap, iterables de líneas...)
+    como un único flujo. Ver ``FlujoParser``.
+    """
+    parser = FlujoParser(strict=strict)
+    for source in sources:
+        parser.feed_source(source, chunk_size)
+    return parser.close()
@@ -0,0 +1,178 @@
+"""
+Escritura diferida (write-behind) de sesiones, respuestas y recomendaciones.
+
+Los handlers encolan las filas y responden sin esperar al commit; una tarea
+en segundo plano vacía la cola y escribe lotes en una sola transacción cuando
+se juntan ``max_batch`` filas o pasan ``max_delay`` segundos desde la
+primera fila pendiente. Al apagar la aplicación se escribe todo lo encolado.
+Si la cola se llena (``maxsize`` lotes) los handlers esperan: así la memoria
+queda acotada aunque el disco no dé abasto.
+
+Si el escritor falla, el lote se reintenta ``retries`` veces con espera
+exponencial (``retry_delay``, el doble en cada intento); la transacción de
+``db.write_rows`` es atómica, así que un intento fallido no deja filas a
+medias. Si se agotan los reintentos el lote se descarta y sus filas se
+cuentan en ``rows_lost`` (``arbol_write_behind_rows_lost_total`` en
+``/metrics``).
+
+``write()`` encola igual que ``put()`` pero espera al commit del lote que
+contiene las filas (commit agrupado): es lo que usa el escritor único del
+modo multi-worker (``app.writer``) para confirmar cada petición.
+"""
+import asyncio
+import logging
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+from app import db
+
+logger = logging.getLogger(__name__)
+
+# sesiones, respuestas, recomendaciones y, si alguien espera el commit, su futuro
+Batch = Tuple[Sequence, Sequence, Sequence, Optional[asyncio.Future]]
+
+
+class WriteBehindQueue:
+    def __init__(self, writer: Callable = db.write_rows, max_batch: int = 500,
+                 max_delay: float = 0.05, maxsize: int = 10000, retries: int = 3,
+                 retry_delay: float = 0.1):
+        self.writer = writer
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.maxsize = maxsize
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._pending_rows = 0
+        # métricas
+        self.flushes = 0
+        self.rows_written = 0
+        self.errors = 0
+        self.retried = 0
+        self.rows_lost = 0
+        self.last_flush_latency = 0.0
+        self.max_flush_latency = 0.0
+        self.total_flush_latency = 0.0
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        self._queue = asyncio.Queue(self.maxsize)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Escribe lo pendiente y termina la tarea de fondo."""
+        if self._task is None:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+    async def put(self, sessions: Sequence = (), answers: Sequence = (), recommendations: Sequence = ()) -> None:
+        if self._task is None:
+            raise RuntimeError("WriteBehindQueue no está en marcha")
+        await self._queue.put((sessions, answers, recommendations, None))
+        self._pending_rows += len(sessions) + len(answers) + len(recommendations)
+
+    async def write(self, sessions: Sequence = (), answers: Sequence = (), recommendations: Sequence = ()) -> None:
+        """Como ``put`` pero vuelve tras el commit; si falla, lanza la excepción del escritor."""
+        if self._task is None:
+            raise RuntimeError("WriteBehindQueue no está en marcha")
+        done = asyncio.get_running_loop().create_future()
+        await self._queue.put((sessions, answers, recommendations, done))
+        self._pending_rows += len(sessions) + len(answers) + len(recommendations)
+        await done
+
+    @property
+    def depth(self) -> int:
+        """Lotes encolados que aún no se han escrito."""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:
+                break
+            batch: List[Batch] = [item]
+            rows = sum(len(part) for part in item[:3])
+            deadline = loop.time() + self.max_delay
+            while rows < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+                rows += sum(len(part) for part in item[:3])
+            await self._flush(batch, rows)
+
+    async def _flush(self, batch: List[Batch], rows: int) -> None:
+        sessions, answers, recommendations = [], [], []
+        for s, a, r, _ in batch:
+            sessions.extend(s)
+            answers.extend(a)
+            recommendations.extend(r)
+        t0 = time.perf_counter()
+        try:
+            await self._write(sessions, answers, recommendations, rows)
+        except Exception as exc:
+            self.errors += 1
+            self.rows_lost += rows
+            logger.exception("write-behind: se descarta un lote de %d filas tras %d reintentos",
+                             rows, self.retries)
+            for *_, done in batch:
+                if done is not None and not done.done():
+                    done.set_exception(exc)
+        else:
+            self.rows_written += rows
+            for *_, done in batch:
+                if done is not None and not done.done():
+                    done.set_result(None)
+        finally:
+            latency = time.perf_counter() - t0
+            self._pending_rows -= rows
+            self.flushes += 1
+            self.last_flush_latency = latency
+            self.total_flush_latency += latency
+            self.max_flush_latency = max(self.max_flush_latency, latency)
+
+    async def _write(self, sessions: List, answers: List, recommendations: List, rows: int) -> None:
+        """Llama al escritor; si falla, reintenta con espera exponencial y al final relanza."""
+        delay = self.retry_delay
+        for attempt in range(self.retries + 1):
+            try:
+                await run_in_threadpool(self.writer, sessions, answers, recommendations)
+                return
+            except Exception as exc:
+                if attempt == self.retries:
+                    raise
+                self.retried += 1
+                logger.warning("write-behind: falló la escritura de %d filas (%s); reintento en %.2f s",
+                               rows, exc, delay)
+                await asyncio.sleep(delay)
+                delay *= 2
+
+    def stats(self) -> Dict:
+        return {
+            "queue_depth": self.depth,
+            "pending_rows": self._pending_rows,
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+            "errors": self.errors,
+            "retries": self.retried,
+            "rows_lost": self.rows_lost,
+            "last_flush_latency_seconds": self.last_flush_latency,
+            "max_flush_latency_seconds": self.max_flush_latency,
+            "avg_flush_latency_seconds": (self.total_flush_latency / self.flushes) if self.flushes else 0.0,
+            "total_flush_latency_seconds": self.total_flush_latency,
+        }
@@ -0,0 +1,166 @@
+"""
+Escritor único de SQLite para el modo multi-worker.
+
+Con varios workers cada proceso abriría su propia conexión y competirían
+por el lock de escritura de SQLite. En su lugar, un proceso aparte (lo
+arranca ``app.serve``) es el único que escribe: escucha en un socket Unix
+y los workers le mandan las filas. Las peticiones de todos los workers se
+juntan en lotes con ``WriteBehindQueue`` y cada lote es una transacción
+(commit agrupado); cada worker recibe la confirmación cuando su lote está
+escrito.
+
+Protocolo: una línea JSON ``[sesiones, respuestas, recomendaciones]`` por
+petición; la respuesta es ``{"ok": true}`` o ``{"ok": false, "error": ...}``.
+Los workers usan el escritor cuando está definida ``ARBOL_WRITER_SOCKET``.
+"""
+import asyncio
+import json
+import logging
+import os
+import signal
+import socket
+import threading
+from typing import Optional, Sequence
+
+from app import db, maintenance
+from app.writebehind import WriteBehindQueue
+
+logger = logging.getLogger(__name__)
+
+WRITER_SOCKET = os.environ.get('ARBOL_WRITER_SOCKET')
+
+
+class WriterError(RuntimeError):
+    pass
+
+
+class WriterClient:
+    """Cliente síncrono (se llama desde el threadpool); una conexión por hilo."""
+
+    def __init__(self, path: str, timeout: float = 30.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _file(self):
+        f = getattr(self._local, 'file', None)
+        if f is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.path)
+            f = sock.makefile('rwb')
+            self._local.sock = sock
+            self._local.file = f
+        return f
+
+    def _reset(self) -> None:
+        sock = getattr(self._local, 'sock', None)
+        self._local.file = None
+        self._local.sock = None
+        if sock is not None:
+            sock.close()
+
+    def write_rows(self, sessions: Sequence = (), answers: Sequence = (), recommendations: Sequence = ()) -> None:
+        """Misma firma que ``db.write_rows``."""
+        line = json.dumps([sessions, answers, recommendations], ensure_ascii=False).encode('utf-8') + b'\n'
+        try:
+            f = self._file()
+            f.write(line)
+            f.flush()
+            reply = f.readline()
+        except OSError:
+            self._reset()
+            raise
+        if not reply:
+            self._reset()
+            raise WriterError("el escritor cerró la conexión")
+        result = json.loads(reply)
+        if not result.get('ok'):
+            raise WriterError(result.get('error', 'error desconocido'))
+
+
+_client: Optional[WriterClient] = None
+
+
+def get_client() -> Optional[WriterClient]:
+    """Cliente del escritor si ``ARBOL_WRITER_SOCKET`` está definida."""
+    global _client
+    if WRITER_SOCKET and (_client is None or _client.path != WRITER_SOCKET):
+        _client = WriterClient(WRITER_SOCKET)
+    return _client if WRITER_SOCKET else None
+
+
+async def _handle(queue: WriteBehindQueue, conns: dict,
+                  reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    conns[writer] = asyncio.current_task()
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            try:
+                sessions, answers, recommendations = json.loads(line)
+                await queue.write(
+                    [tuple(r) for r in sessions],
+                    [tuple(r) for r in answers],
+                    [tuple(r) for r in recommendations],
+                )
+                reply = {"ok": True}
+            except Exception as exc:
+                reply = {"ok": False, "error": str(exc)}
+            writer.write(json.dumps(reply).encode('utf-8') + b'\n')
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        conns.pop(writer, None)
+        writer.close()
+
+
+async def serve(path: str, max_batch: int = 500, max_delay: float = 0.005,
+                ready: Optional[asyncio.Event] = None, stop: Optional[asyncio.Event] = None) -> None:
+    """Atiende a los workers hasta que se active ``stop`` (o llegue SIGTERM/SIGINT)."""
+    db.init_db()
+    queue = WriteBehindQueue(max_batch=max_batch, max_delay=max_delay)
+    await queue.start()
+    # el mantenimiento también escribe: va en el único proceso escritor
+    scheduler = maintenance.scheduler()
+    if scheduler is not None:
+        await scheduler.start()
+    if os.path.exists(path):
+        os.remove(path)
+    # conexión -> tarea que la atiende
+    conns: dict = {}
+    server = await asyncio.start_unix_server(lambda r, w: _handle(queue, conns, r, w), path)
+    if stop is None:
+        # proceso propio: se para con las señales habituales
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, stop.set)
+    if ready is not None:
+        ready.set()
+    logger.info("escritor SQLite escuchando en %s", path)
+    try:
+        await stop.wait()
+    finally:
+        server.close()
+        if scheduler is not None:
+            await scheduler.stop()
+        # lo que ya está encolado se escribe antes de salir
+        await queue.stop()
+        # al cerrar el transporte cada handler ve EOF y termina solo
+        tasks = list(conns.values())
+        for conn in list(conns):
+            conn.close()
+        if tasks:
+            await asyncio.wait(tasks, timeout=5)
+        await server.wait_closed()
+        db.close_all()
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def run_server(path: str) -> None:
+    """Punto de entrada del proceso escritor."""
+    asyncio.run(serve(path))
@@ -0,0 +1,56 @@
+"""
+Compara el clasificador compilado con la implementación anterior.
+
+    python -m benchmarks.bench_categorizer
+"""
+import random
+import time
+
+from app import categorizer
+from app.rules import RULES
+from benchmarks import legacy
+
+
+def sample_texts(n: int = 2000, seed: int = 7):
+    base = [item for rule in RULES for _, contrib in rule["options"] for items in contrib.values() for item in items]
+    base += [
+        "React + Vite (Frontend rápido y moderno)",
+        "Node.js con Express (Backend ágil y escalable)",
+        "Implementa JWT, HTTPS y backups regulares",
+        "Analizando respuestas...",
+    ]
+    rnd = random.Random(seed)
+    words = "plataforma equipo datos usuarios servicio rápido escalable moderno".split()
+    out = list(base)
+    while len(out) < n:
+        out.append(" ".join(rnd.choice(words + base) for _ in range(rnd.randint(1, 6))))
+    return out
+
+
+def timeit(fn, texts, rounds: int = 5) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        for t in texts:
+            fn(t)
+        best = min(best, time.perf_counter() - t0)
+    return len(texts) / best
+
+
+def main():
+    texts = sample_texts()
+    mismatches = [t for t in texts if legacy.categorize(t) != categorizer.categorize(t)]
+    assert not mismatches, mismatches[:5]
+
+    uncached = categorizer.categorize.__wrapped__
+    results = {
+        "legacy": timeit(legacy.categorize, texts),
+        "compiled (sin caché)": timeit(uncached, texts),
+        "compiled (caché)": timeit(categorizer.categorize, texts),
+    }
+    for name, rate in results.items():
+        print(f"{name:>22}: {rate:12,.0f} textos/s  ({rate / results['legacy']:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Evaluaciones por segundo: API de Python, /evaluate uno a uno y
+/evaluate/batch.
+
+    python -m benchmarks.bench_evaluate_batch [--sets 5000] [--persist]
+
+Los conjuntos de respuestas se generan eligiendo una opción al azar en cada
+pregunta del flujo incluido. La base de datos es temporal.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from fastapi.testclient import TestClient
+
+from app import db
+from app import state as tree_state
+
+
+def answer_sets(root, n: int, seed: int = 11):
+    questions = [node for node in root.index.values() if node.node_type == "question"]
+    rnd = random.Random(seed)
+    out = []
+    for _ in range(n):
+        answers = []
+        for q in questions:
+            options = [c for c in q.children if c.node_type == "option"]
+            if options and rnd.random() < 0.8:
+                answers.append({"questionId": q.id, "answerId": rnd.choice(options).id, "phase": q.phase or 0})
+        out.append(answers)
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench_evaluate_batch")
+    parser.add_argument("--sets", type=int, default=5000)
+    parser.add_argument("--single", type=int, default=500, help="llamadas a /evaluate para comparar")
+    parser.add_argument("--persist", action="store_true")
+    args = parser.parse_args(argv)
+
+    state = tree_state.build_state(use_snapshot=False)
+    sets = answer_sets(state.root, args.sets)
+    distinct = len({tuple(sorted(a["answerId"] for a in s)) for s in sets})
+
+    t0 = time.perf_counter()
+    for _ in state.evaluate_batch([a["answerId"] for a in s] for s in sets):
+        pass
+    api = len(sets) / (time.perf_counter() - t0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_PATH = os.path.join(tmp, "bench.db")
+        from app.main import app
+        with TestClient(app) as client:
+            single = sets[:args.single]
+            t0 = time.perf_counter()
+            for s in single:
+                client.post("/evaluate", json=s)
+            one_by_one = len(single) / (time.perf_counter() - t0)
+
+            t0 = time.perf_counter()
+            r = client.post("/evaluate/batch", params={"persist": args.persist}, json=sets)
+            n = r.text.count("\n")
+            batch = n / (time.perf_counter() - t0)
+        db.close_all()
+
+    print(f"{len(sets)} conjuntos ({distinct} distintos)")
+    print(f"{'API (evaluate_batch)':>24}: {api:12,.0f} evaluaciones/s")
+    print(f"{'/evaluate uno a uno':>24}: {one_by_one:12,.0f} evaluaciones/s  (con persistencia)")
+    print(f"{'/evaluate/batch':>24}: {batch:12,.0f} evaluaciones/s  "
+          f"({'con' if args.persist else 'sin'} persistencia, {batch / one_by_one:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
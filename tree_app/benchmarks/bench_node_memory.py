@@ -0,0 +1,55 @@
+"""
+Memoria por nodo: ``Node`` anterior (con __dict__), ``Node`` con __slots__
+y ``FrozenTree``. Los textos se comparten en los tres casos, así que se
+mide sólo la estructura.
+
+    python -m benchmarks.bench_node_memory [--lines 100000]
+"""
+import argparse
+import tracemalloc
+
+from app.frozen import FrozenTree
+from app.tree_parser import Node, parse_flujo
+from benchmarks import legacy
+from benchmarks.flowgen import flow_for_lines
+
+
+def clone(node, cls):
+    copy = cls(node.id, node.text, node.node_type)
+    copy.phase = node.phase
+    for child in node.children:
+        copy.add_child(clone(child, cls))
+    return copy
+
+
+def measure(build):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    obj = build()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    return obj, size
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench_node_memory")
+    parser.add_argument("--lines", type=int, default=100000)
+    args = parser.parse_args(argv)
+
+    root = parse_flujo(flow_for_lines(args.lines))
+    count = len(root.index)
+
+    results = {}
+    _, results["Node (antes, __dict__)"] = measure(lambda: clone(root, legacy.Node))
+    _, results["Node (__slots__)"] = measure(lambda: clone(root, Node))
+    _, results["FrozenTree"] = measure(lambda: FrozenTree.from_node(root))
+
+    print(f"{count} nodos")
+    base = results["Node (antes, __dict__)"]
+    for name, size in results.items():
+        print(f"{name:>24}: {size / count:8.1f} bytes/nodo  ({size / base:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
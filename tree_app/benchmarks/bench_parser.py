@@ -0,0 +1,85 @@
+"""
+Compara ``parse_flujo`` con el parser anterior sobre flujos sintéticos.
+
+    python -m benchmarks.bench_parser [--lines 100000] [--memory]
+
+Con ``--memory`` mide además el pico de memoria de cargar el flujo desde
+un fichero (sin contar el árbol resultante): leerlo entero +
+``parse_flujo`` frente a ``parse_stream``.
+"""
+import argparse
+import gc
+import os
+import tempfile
+import time
+import tracemalloc
+
+from app.tree_parser import parse_flujo, parse_stream
+from benchmarks import legacy
+from benchmarks.flowgen import flow_for_lines
+
+
+def best_of(fn, text, rounds):
+    best = float("inf")
+    for _ in range(rounds):
+        # que no se cobre a un parser la basura que dejó el otro
+        gc.collect()
+        t0 = time.perf_counter()
+        fn(text)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def peak_memory(fn):
+    """Memoria transitoria: pico durante la carga menos lo que ocupa el árbol."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = fn()
+        current, peak = tracemalloc.get_traced_memory()
+        del result
+        return peak - current
+    finally:
+        tracemalloc.stop()
+
+
+def load_whole(path):
+    with open(path, encoding="utf-8") as f:
+        return parse_flujo(f.read())
+
+
+def load_stream(path):
+    with open(path, "rb") as f:
+        return parse_stream(f)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench_parser")
+    parser.add_argument("--lines", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--memory", action="store_true")
+    args = parser.parse_args(argv)
+
+    for lines in args.lines:
+        text = flow_for_lines(lines)
+        assert legacy.parse_flujo(text).to_dict() == parse_flujo(text).to_dict()
+        old = best_of(legacy.parse_flujo, text, args.rounds)
+        new = best_of(parse_flujo, text, args.rounds)
+        n = len(text.splitlines())
+        print(f"{n:>9} líneas  anterior {old * 1000:9.1f} ms  nuevo {new * 1000:9.1f} ms  "
+              f"({old / new:.1f}x, {n / new:,.0f} líneas/s)")
+        if args.memory:
+            fd, path = tempfile.mkstemp(suffix=".txt")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    f.write(text)
+                whole = peak_memory(lambda: load_whole(path))
+                stream = peak_memory(lambda: load_stream(path))
+            finally:
+                os.remove(path)
+            print(f"{'':>9}         memoria aparte del árbol: entero {whole / 2**20:7.1f} MiB  "
+                  f"streaming {stream / 2**20:7.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Generador de flujos sintéticos con la misma gramática que ``flujo.txt``.
+
+    python -m benchmarks.flowgen --phases 50 --questions 20 --options 4 > grande.txt
+    python -m benchmarks.flowgen --lines 1000000 > enorme.txt
+"""
+import argparse
+import random
+import sys
+from typing import Iterator
+
+_WORDS = ("React Vue Angular Node.js Django Flask Spring Go PostgreSQL MySQL MongoDB Firebase "
+          "Microservicios Monolito Kubernetes Docker Scrum Kanban OAuth2 JWT SSL cifrado "
+          "rendimiento escalabilidad seguridad volumen interfaz web móvil escritorio").split()
+
+
+def iter_flow(phases: int = 5, questions: int = 4, options: int = 3, recs: int = 1,
+              seed: int = 0) -> Iterator[str]:
+    """Genera el flujo línea a línea (sin construirlo entero en memoria)."""
+    rnd = random.Random(seed)
+    yield "@startuml"
+    yield "title Flujo sintético"
+    yield "start"
+    yield ":Inicio del Cuestionario;"
+    for p in range(1, phases + 1):
+        yield f'partition "FASE {p} Sección {p}" {{'
+        for q in range(1, questions + 1):
+            yield f"  :¿Pregunta {p}.{q} sobre {rnd.choice(_WORDS)}?;"
+            for o in range(1, options + 1):
+                kw = "if" if o == 1 else "elseif"
+                yield f"  {kw} (Opción {o}) then ({rnd.choice(_WORDS)} {o})"
+                for r in range(recs):
+                    yield f"  :{rnd.choice(_WORDS)} + {rnd.choice(_WORDS)} ({p}.{q}.{o}.{r});"
+            yield "  endif"
+            yield "  ' comentario"
+        yield "}"
+    yield "stop"
+    yield "@enduml"
+
+
+def generate_flow(**kwargs) -> str:
+    return "\n".join(iter_flow(**kwargs)) + "\n"
+
+
+def phases_for_lines(lines: int, questions: int, options: int, recs: int) -> int:
+    """Fases necesarias para que el flujo tenga aproximadamente ``lines`` líneas."""
+    per_phase = 1 + questions * (3 + options * (1 + recs))
+    return max(1, lines // per_phase)
+
+
+def flow_for_lines(lines: int, questions: int = 10, options: int = 4, recs: int = 1, seed: int = 0) -> str:
+    """Flujo de aproximadamente ``lines`` líneas."""
+    phases = phases_for_lines(lines, questions, options, recs)
+    return generate_flow(phases=phases, questions=questions, options=options, recs=recs, seed=seed)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.flowgen")
+    parser.add_argument("--phases", type=int, default=5)
+    parser.add_argument("--questions", type=int, default=4)
+    parser.add_argument("--options", type=int, default=3)
+    parser.add_argument("--recs", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--lines", type=int, default=None,
+                        help="número aproximado de líneas (calcula --phases a partir de --questions, --options y --recs)")
+    args = parser.parse_args(argv)
+    phases = phases_for_lines(args.lines, args.questions, args.options, args.recs) if args.lines else args.phases
+    for line in iter_flow(phases, args.questions, args.options, args.recs, args.seed):
+        sys.stdout.write(line + "\n")
+
+
+if __name__ == "__main__":
+    main()
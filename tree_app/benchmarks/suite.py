@@ -0,0 +1,246 @@
+"""
+Suite de benchmarks con resultados en JSON y detección de regresiones.
+
+    python -m benchmarks.suite [--quick] [--output resultados.json]
+    python -m benchmarks.suite --baseline base.json [--threshold 0.25]
+    python -m benchmarks.suite --only parse_flujo --max-lines 100000
+
+Casos:
+
+- ``parse_flujo`` sobre flujos sintéticos de 1k a 1M líneas (``flowgen``)
+- ``Node.to_dict`` y ``Node.get_recommendations`` sobre el flujo incluido y
+  sobre flujos sintéticos
+- la lógica de ``/evaluate`` llamada directamente: ``compute_recommendations``
+  (sin caché) y ``TreeState.evaluate`` (con caché)
+- ``POST /evaluate``, ``GET /tree`` y ``GET /api/questions`` de extremo a
+  extremo, con un cliente ASGI en el mismo proceso (httpx) y una base de
+  datos temporal
+
+Cada caso se repite ``--rounds`` veces (con ``gc.collect()`` antes de cada
+ronda) y cada ronda ejecuta la operación tantas veces como haga falta para
+durar al menos ``MIN_ROUND`` segundos. Se guarda la mediana y el mínimo por
+operación. Las entradas son deterministas (semillas fijas).
+
+Con ``--baseline`` se compara la mediana de cada caso con la del fichero
+base y el proceso termina con código 1 si alguno es más lento que
+``base * (1 + threshold)``. Las bases sólo son comparables en la misma
+máquina.
+"""
+import argparse
+import asyncio
+import datetime
+import gc
+import itertools
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+from app import db
+from app import state as tree_state
+from app.evaluation import compute_recommendations
+from app.tree_parser import parse_flujo
+from benchmarks.bench_evaluate_batch import answer_sets
+from benchmarks.flowgen import flow_for_lines
+
+SIZES = (1_000, 10_000, 100_000, 1_000_000)
+QUICK_SIZES = (1_000, 10_000, 100_000)
+# tamaños para to_dict / get_recommendations (además del flujo incluido)
+TREE_SIZES = (10_000, 100_000)
+MIN_ROUND = 0.2
+THRESHOLD = 0.25
+
+
+def measure(fn: Callable[[], object], rounds: int = 5, min_time: float = MIN_ROUND) -> Dict:
+    """Mediana y mínimo (segundos por operación) de ``rounds`` rondas."""
+    gc.collect()
+    t0 = time.perf_counter()
+    fn()
+    first = time.perf_counter() - t0
+    number = 1 if first >= min_time else max(1, int(min_time / max(first, 1e-9)))
+    per_op = []
+    for _ in range(rounds):
+        gc.collect()
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        per_op.append((time.perf_counter() - t0) / number)
+    median = statistics.median(per_op)
+    return {
+        "median_s": median,
+        "min_s": min(per_op),
+        "ops_per_s": 1 / median if median else None,
+        "rounds": rounds,
+        "number": number,
+    }
+
+
+class Suite:
+    def __init__(self, rounds: int, sizes, only: Optional[List[str]] = None, verbose: bool = True):
+        self.rounds = rounds
+        self.sizes = sizes
+        self.only = only
+        self.verbose = verbose
+        self.results: Dict[str, Dict] = {}
+        self._flows: Dict[int, str] = {}
+
+    def wanted(self, name: str) -> bool:
+        return not self.only or any(o in name for o in self.only)
+
+    def record(self, name: str, fn: Callable[[], object], rounds: Optional[int] = None, **params) -> None:
+        if not self.wanted(name):
+            return
+        result = measure(fn, rounds or self.rounds)
+        result["params"] = params
+        self.results[name] = result
+        if self.verbose:
+            print(f"{name:<40} {result['median_s'] * 1e3:12.3f} ms  "
+                  f"({result['ops_per_s']:,.1f} ops/s)", file=sys.stderr)
+
+    def flow(self, lines: int) -> str:
+        if lines not in self._flows:
+            self._flows[lines] = flow_for_lines(lines)
+        return self._flows[lines]
+
+    def bench_parser(self) -> None:
+        for lines in self.sizes:
+            name = f"parse_flujo/lines={lines}"
+            if self.wanted(name):
+                text = self.flow(lines)
+                # el flujo de 1M líneas tarda segundos por ronda: basta con tres
+                rounds = min(self.rounds, 3) if lines >= 1_000_000 else None
+                self.record(name, lambda: parse_flujo(text), rounds=rounds, lines=text.count("\n"))
+
+    def bench_tree(self, bundled) -> None:
+        trees = [("bundled", bundled.root)]
+        for lines in TREE_SIZES:
+            if lines <= max(self.sizes) and (self.wanted("to_dict") or self.wanted("get_recommendations")):
+                trees.append((f"lines={lines}", parse_flujo(self.flow(lines))))
+        for label, root in trees:
+            nodes = len(root.index)
+            self.record(f"to_dict/{label}", root.to_dict, nodes=nodes)
+            self.record(f"get_recommendations/{label}", root.get_recommendations, nodes=nodes)
+
+    def bench_evaluate(self, bundled) -> None:
+        sets = [[a["answerId"] for a in s] for s in answer_sets(bundled.root, 200)]
+        uncached = itertools.cycle(sets)
+        self.record("evaluate/compute", lambda: compute_recommendations(
+            bundled.root, bundled.rule_table, next(uncached)), sets=len(sets))
+        for s in sets:
+            bundled.evaluate(s)
+        cached = itertools.cycle(sets)
+        self.record("evaluate/cached", lambda: bundled.evaluate(next(cached)), sets=len(sets))
+
+    def bench_http(self) -> None:
+        if not any(self.wanted(n) for n in ("http/evaluate", "http/tree", "http/api_questions")):
+            return
+        import httpx
+        from app import main
+
+        with tempfile.TemporaryDirectory() as tmp:
+            db.DB_PATH = os.path.join(tmp, "bench.db")
+            loop = asyncio.new_event_loop()
+            try:
+                loop.run_until_complete(main.startup())
+                client = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://bench")
+                sets = itertools.cycle(answer_sets(tree_state.get_state().root, 200))
+
+                def request(method, url, body=None):
+                    def call():
+                        json_body = next(body) if body is not None else None
+                        r = loop.run_until_complete(client.request(method, url, json=json_body))
+                        r.raise_for_status()
+                    return call
+
+                # cada /evaluate escribe su sesión en la base de datos temporal
+                self.record("http/evaluate", request("POST", "/evaluate", sets), persist=True)
+                self.record("http/tree", request("GET", "/tree"))
+                self.record("http/api_questions", request("GET", "/api/questions"))
+                loop.run_until_complete(client.aclose())
+                loop.run_until_complete(main.shutdown())
+            finally:
+                loop.close()
+                db.close_all()
+
+    def run(self) -> Dict[str, Dict]:
+        self.bench_parser()
+        bundled = tree_state.build_state(use_snapshot=False)
+        self.bench_tree(bundled)
+        self.bench_evaluate(bundled)
+        self.bench_http()
+        return self.results
+
+
+def metadata(args) -> Dict:
+    return {
+        "date": datetime.datetime.utcnow().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "rounds": args.rounds,
+        "quick": args.quick,
+    }
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], threshold: float = THRESHOLD) -> List[Dict]:
+    """Casos presentes en ambos, con la proporción actual/base de la mediana."""
+    rows = []
+    for name, current in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        ratio = current["median_s"] / base["median_s"]
+        rows.append({"name": name, "baseline_s": base["median_s"], "current_s": current["median_s"],
+                     "ratio": ratio, "regressed": ratio > 1 + threshold})
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.suite")
+    parser.add_argument("--quick", action="store_true", help="hasta 100k líneas y 3 rondas")
+    parser.add_argument("--rounds", type=int, default=None)
+    parser.add_argument("--max-lines", type=int, default=None)
+    parser.add_argument("--only", nargs="+", default=None, help="sólo los casos cuyo nombre contenga alguno")
+    parser.add_argument("--output", default=None, help="fichero JSON de resultados")
+    parser.add_argument("--baseline", default=None, help="resultados anteriores con los que comparar")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD,
+                        help="regresión máxima tolerada (0.25 = 25%% más lento)")
+    args = parser.parse_args(argv)
+    args.rounds = args.rounds or (3 if args.quick else 5)
+    sizes = QUICK_SIZES if args.quick else SIZES
+    if args.max_lines:
+        sizes = tuple(s for s in sizes if s <= args.max_lines) or (args.max_lines,)
+
+    results = Suite(args.rounds, sizes, args.only).run()
+    report = {"meta": metadata(args), "results": results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+        print(f"resultados en {args.output}", file=sys.stderr)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        rows = compare(results, baseline, args.threshold)
+        for row in rows:
+            mark = "❌" if row["regressed"] else "  "
+            print(f"{mark} {row['name']:<40} {row['baseline_s'] * 1e3:10.3f} ms -> "
+                  f"{row['current_s'] * 1e3:10.3f} ms  ({row['ratio']:.2f}x)", file=sys.stderr)
+        regressed = [r["name"] for r in rows if r["regressed"]]
+        if regressed:
+            print(f"{len(regressed)} regresiones por encima del {args.threshold:.0%}: {', '.join(regressed)}",
+                  file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+from app import analytics, db
+
+
+def test_keyset_pagination_and_drill_down(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "a.db"))
+    db.init_db()
+    sessions, answers, recs = [], [], []
+    for i in range(25):
+        sid = f"s{i:02d}"
+        sessions.append((sid, f"2024-01-0{1 + i % 3}T1{i % 2}:00:00.000000"))
+        answers.append((sid, "q1_1", f"o1_{i % 4}", 1))
+        recs += [(sid, "frontend", "React"), (sid, "frontend", f"Vue {i % 5}")]
+    db.write_rows(sessions, answers, recs)
+    conn = db.get_db_conn()
+
+    def all_pages(fn, *args, **kwargs):
+        items, cursor = [], None
+        while True:
+            page = fn(conn, *args, limit=2, cursor=cursor, **kwargs)
+            items += page["items"]
+            cursor = page["next"]
+            if cursor is None:
+                return items
+
+    top = all_pages(analytics.top_recommendations, "frontend")
+    assert top[0] == {"recommendation": "React", "count": 25}
+    assert [r["recommendation"] for r in top[1:]] == [f"Vue {i}" for i in range(5)]
+
+    dist = all_pages(analytics.answer_distribution, "q1_1")
+    assert dist == [{"answer_id": f"o1_{i}", "count": c} for i, c in enumerate((7, 6, 6, 6))]
+
+    timeline = all_pages(analytics.sessions_per_bucket, bucket="hour")
+    assert [b["bucket"] for b in timeline] == sorted(b["bucket"] for b in timeline)
+    assert sum(b["sessions"] for b in timeline) == 25 and len(timeline) == 6
+    day = analytics.sessions_per_bucket(conn, "day", start="2024-01-02", end="2024-01-03")
+    assert day["items"] == [{"bucket": "2024-01-02", "sessions": 8}]
+
+    listed = all_pages(analytics.list_sessions)
+    assert len({s["id"] for s in listed}) == 25
+    assert [s["timestamp"] for s in listed] == sorted((s["timestamp"] for s in listed), reverse=True)
+
+    detail = analytics.session_detail(conn, "s03")
+    assert detail["answers"] == [{"questionId": "q1_1", "answerId": "o1_3", "phase": 1}]
+    assert detail["recommendations"] == {"frontend": ["React", "Vue 3"]}
+    assert analytics.session_detail(conn, "nope") is None
+
+    plan = " ".join(r[3] for r in conn.execute(
+        "EXPLAIN QUERY PLAN SELECT answer_id, COUNT(*) FROM answers WHERE question_id = 'q1_1' GROUP BY answer_id"))
+    assert "COVERING INDEX idx_answers_question" in plan
+    db.close_all()
+
+
+def test_malformed_cursors_are_rejected(tmp_path, monkeypatch):
+    import pytest
+
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "c.db"))
+    db.init_db()
+    conn = db.get_db_conn()
+    bad = [[], [1], [None], ["a", "b", "c"], [1, 2], ["React", 3], [True, "React"], {"count": 1}, "x"]
+    queries = [
+        (analytics.top_recommendations, ("frontend",)),
+        (analytics.answer_distribution, ("q1_1",)),
+        (analytics.sessions_per_bucket, ("hour",)),
+        (analytics.list_sessions, ()),
+    ]
+    for fn, args in queries:
+        for values in bad:
+            with pytest.raises(ValueError, match="cursor inválido"):
+                fn(conn, *args, cursor=analytics.encode_cursor(values))
+    assert analytics.top_recommendations(conn, "frontend", cursor=analytics.encode_cursor([3, "React"]))
+    db.close_all()
+
+
+def test_rollups_match_rebuild(tmp_path, monkeypatch):
+    from app import rollups
+
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "r.db"))
+    db.init_db()
+    conn = db.get_db_conn()
+    tables = ("rollup_recommendations", "rollup_answers", "rollup_sessions_hourly")
+
+    def snapshot():
+        return {t: sorted(tuple(r) for r in conn.execute(f"SELECT * FROM {t}")) for t in tables}
+
+    db.write_rows([("a", "2024-01-01T10:05:00"), ("b", "2024-01-01T10:40:00")],
+                  [("a", "q1", "o1", 1), ("b", "q1", "o2", 1)],
+                  [("a", "frontend", "React"), ("b", "frontend", "React")])
+    # sesión repetida: INSERT OR IGNORE no la inserta y no debe contarse
+    db.write_rows([("a", "2024-01-01T11:00:00"), ("c", "2024-01-01T11:30:00")],
+                  [("c", "q1", "o1", 1)], [("c", "backend", "Django")])
+    incremental = snapshot()
+    assert incremental["rollup_sessions_hourly"] == [("2024-01-01T10", 2), ("2024-01-01T11", 1)]
+    with conn:
+        rollups.rebuild(conn)
+    assert snapshot() == incremental
+
+    minute = analytics.sessions_per_bucket(conn, "minute")["items"]
+    assert [m["bucket"] for m in minute] == ["2024-01-01T10:05", "2024-01-01T10:40", "2024-01-01T11:30"]
+    db.close_all()
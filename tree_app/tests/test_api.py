@@ -0,0 +1,221 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app import analytics, db, registry
+from app import state as tree_state
+import app.main as main
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "test.db"))
+    with TestClient(main.app) as c:
+        yield c
+    db.close_all()
+
+
+def test_tree_etag_and_304(client):
+    r = client.get("/tree")
+    assert r.status_code == 200
+    etag = r.headers["etag"]
+    assert r.json()["type"] == "root"
+    r2 = client.get("/tree", headers={"If-None-Match": etag})
+    assert r2.status_code == 304 and r2.content == b""
+    assert client.get("/api/questions").headers["etag"] != etag
+
+
+def test_evaluate_persists_and_caches(client):
+    answers = [{"questionId": "q1_1", "answerId": "o1_1", "phase": 1}]
+    first = client.post("/evaluate", json=answers).json()
+    assert client.post("/evaluate", json=answers).json() == first
+    assert tree_state.get_state().eval_cache.hits >= 1
+    conn = db.get_db_conn()
+    assert conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0] == 2
+
+
+def test_admin_reload_swaps_state(client, tmp_path):
+    old = tree_state.get_state()
+    flow = tmp_path / "flujo.txt"
+    flow.write_text('partition "FASE 1" {\n:¿Nueva?;\nif (a) then (Si)\nendif\n}\n', encoding="utf-8")
+    new = tree_state.reload(str(flow))
+    try:
+        assert new is tree_state.get_state() and new.number == old.number + 1
+        # el estado anterior sigue intacto para las peticiones en curso
+        assert old.root.find("o1_1").text == "Web"
+        assert client.get("/phases").json()[0]["text"] == "FASE 1"
+        info = client.post("/admin/reload").json()
+        assert info["version"] == new.version and info["number"] == new.number
+    finally:
+        tree_state.set_state(old)
+
+
+def test_watcher_reloads_changed_file(tmp_path):
+    import asyncio
+    import os
+
+    flow = tmp_path / "flujo.txt"
+    flow.write_text(':¿Uno?;\n', encoding="utf-8")
+    previous = tree_state.get_state()
+    tree_state.set_state(tree_state.build_state(str(flow)))
+
+    async def scenario():
+        watcher = tree_state.FlujoWatcher(interval=0.01)
+        await watcher.start()
+        flow.write_text(':¿Dos?;\n', encoding="utf-8")
+        os.utime(flow, ns=(1, 1))
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            if tree_state.get_state().root.find("q0_1").text == "Dos?":
+                break
+        await watcher.stop()
+
+    asyncio.run(scenario())
+    assert tree_state.get_state().root.find("q0_1").text == "Dos?"
+    if previous is not None:
+        tree_state.set_state(previous)
+
+
+def test_evaluate_batch_streams_ndjson(client):
+    import json
+
+    one = [{"questionId": "q1_1", "answerId": "o1_1", "phase": 1}]
+    sets = [one, [], one]
+    r = client.post("/evaluate/batch", json=sets)
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in r.text.splitlines()]
+    assert [line.pop("index") for line in lines] == [0, 1, 2]
+    assert lines[0] == client.post("/evaluate", json=one).json() == lines[2]
+    conn = db.get_db_conn()
+    # sin persist sólo cuenta la llamada a /evaluate
+    assert conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0] == 1
+
+    client.post("/evaluate/batch?persist=true", json=sets)
+    assert conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0] == 4
+
+
+def test_evaluate_batch_reports_persist_failure(client, monkeypatch):
+    import json
+
+    calls = []
+
+    def write_rows(sessions, answers, recommendations=()):
+        calls.append(len(sessions))
+        if len(calls) > 1:
+            raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(main, "write_rows", write_rows)
+    monkeypatch.setattr(main, "BATCH_CHUNK", 2)
+    one = [{"questionId": "q1_1", "answerId": "o1_1", "phase": 1}]
+    r = client.post("/evaluate/batch?persist=true", json=[one] * 5)
+    lines = [json.loads(line) for line in r.text.splitlines()]
+    # el primer trozo se escribió y se envió; el segundo falla y cierra el flujo
+    assert [line["index"] for line in lines[:-1]] == [0, 1]
+    assert lines[-1] == {"error": "database is locked", "persisted": 2}
+
+
+def test_analytics_endpoints(client):
+    client.post("/evaluate", json=[{"questionId": "q3_1", "answerId": "o3_16", "phase": 3}])
+    session = client.get("/analytics/sessions").json()["items"][0]
+    detail = client.get(f"/analytics/sessions/{session['id']}").json()
+    assert detail["answers"][0]["answerId"] == "o3_16"
+    category = next(iter(detail["recommendations"]))
+    top = client.get("/analytics/recommendations/top", params={"category": category}).json()
+    assert top["items"] and top["next"] is None
+    assert client.get("/analytics/sessions", params={"cursor": "!!"}).status_code == 400
+    for values in ([], [1], ["a"]):
+        cursor = analytics.encode_cursor(values)
+        assert client.get("/analytics/sessions", params={"cursor": cursor}).status_code == 400
+    assert client.get("/analytics/sessions/nope").status_code == 404
+
+
+def test_export_endpoint_streams_csv(client):
+    client.post("/evaluate", json=[{"questionId": "q1_1", "answerId": "o1_1", "phase": 1}])
+    r = client.get("/export/answers", params={"format": "csv"})
+    assert r.headers["content-type"].startswith("text/csv")
+    assert r.text.splitlines()[0] == "id,session_id,question_id,answer_id,phase"
+    assert len(r.text.splitlines()) == 2
+    assert client.get("/export/answers", params={"format": "xml"}).status_code == 400
+    assert client.get("/export/nope").status_code == 404
+
+
+def test_metrics_endpoint_reports_tree_and_caches(client):
+    answers = [{"questionId": "q1_1", "answerId": "o1_1", "phase": 1}]
+    client.post("/evaluate", json=answers)
+    client.post("/evaluate", json=answers)
+    r = client.get("/metrics")
+    assert r.status_code == 200 and r.headers["content-type"].startswith("text/plain")
+    state = tree_state.get_state()
+    assert f"arbol_tree_nodes {state.node_count}" in r.text
+    assert f'version="{state.version}"' in r.text
+    assert 'arbol_cache_hits_total{cache="evaluate"}' in r.text
+
+
+def test_profiling_header_arming_and_ring_buffer(client, tmp_path, monkeypatch):
+    import collections
+    import json
+    import pstats
+
+    from app import profiling
+
+    monkeypatch.setattr(profiling, "PROFILES", collections.deque(maxlen=2))
+    answers = [{"questionId": "q1_1", "answerId": "o1_1", "phase": 1}]
+    assert "x-profile-id" not in client.post("/evaluate", json=answers).headers
+
+    r = client.post("/evaluate", json=answers, headers={"X-Profile": "cprofile"})
+    assert r.status_code == 200 and r.json()["frontend"] is not None
+    download = client.get(f"/admin/profiles/{r.headers['x-profile-id']}")
+    path = tmp_path / "p.pstats"
+    path.write_bytes(download.content)
+    assert any("evaluate" in func[2] for func in pstats.Stats(str(path)).stats)
+
+    client.post("/admin/profiling", params={"count": 2, "mode": "sample"})
+    ids = [client.get("/api/questions").headers["x-profile-id"] for _ in range(2)]
+    assert "x-profile-id" not in client.get("/api/questions").headers
+    speedscope = client.get(f"/admin/profiles/{ids[-1]}").json()
+    assert speedscope["profiles"][0]["type"] == "sampled"
+
+    listed = client.get("/admin/profiles").json()
+    assert [p["id"] for p in listed["profiles"]] == ids[::-1]
+    assert client.get(f"/admin/profiles/{r.headers['x-profile-id']}").status_code == 404
+    assert client.post("/admin/profiling", params={"mode": "perf"}).status_code == 400
+
+
+def test_phase_questions_and_decision(client):
+    r = client.get("/questions/1")
+    assert r.status_code == 200
+    questions = r.json()
+    assert questions and all(q["phase"] == 1 and q["options"] for q in questions)
+    assert client.get("/questions/1", headers={"If-None-Match": r.headers["etag"]}).status_code == 304
+    assert client.get("/questions/999").json() == []
+    assert ("questions", 999) not in tree_state.get_state().rendered._data
+
+    left = client.get("/decision", params={"side": "left"})
+    assert left.status_code == 200 and left.json()["id"] == tree_state.get_state().root.children[0].id
+    assert ("decision", "left") in tree_state.get_state().rendered._data
+    assert client.get("/decision", headers={"If-None-Match": left.headers["etag"]}).status_code == 304
+    assert client.get("/decision", params={"side": "up"}).status_code == 400
+
+
+def test_questionnaire_registry_routes_and_tags_sessions(client, tmp_path):
+    folder = tmp_path / "cuestionarios" / "en"
+    folder.mkdir(parents=True)
+    (folder / "v1.txt").write_text('partition "PHASE 1" {\n:Web?;\nif (a) then (Yes)\nendif\n}\n', encoding="utf-8")
+    assert client.get("/tree", params={"questionnaire": "en"}).status_code == 404
+    registry.set_registry(registry.Registry(str(tmp_path / "cuestionarios"), size=1))
+    try:
+        listing = client.get("/questionnaires").json()
+        assert listing["questionnaires"] == {"en": {"versions": ["v1"], "latest": "v1"}}
+        phases = client.get("/phases", params={"questionnaire": "en", "version": "v1"}).json()
+        assert phases[0]["text"] == "PHASE 1"
+        assert client.get("/phases", params={"questionnaire": "fr"}).status_code == 404
+
+        answer_id = registry.get_registry().get("en").root.phase_index[1][0].children[0].id
+        client.post("/evaluate", params={"questionnaire": "en"},
+                    json=[{"questionId": "q", "answerId": answer_id, "phase": 1}])
+        client.post("/evaluate", json=[{"questionId": "q1_1", "answerId": "o1_1", "phase": 1}])
+        rows = db.get_db_conn().execute("SELECT questionnaire, tree_version FROM sessions ORDER BY id").fetchall()
+        en = registry.get_registry().get("en")
+        assert [tuple(r) for r in rows] == [("en", en.version), (None, tree_state.get_state().version)]
+        assert client.get("/admin/registry").json()["loaded"][0]["version"] == "v1"
+    finally:
+        registry.set_registry(None)
@@ -0,0 +1,17 @@
+from benchmarks import suite
+
+
+def test_compare_flags_regressions_past_threshold():
+    baseline = {"a": {"median_s": 1.0}, "b": {"median_s": 1.0}, "gone": {"median_s": 1.0}}
+    results = {"a": {"median_s": 1.2}, "b": {"median_s": 1.3}, "new": {"median_s": 5.0}}
+    rows = {r["name"]: r for r in suite.compare(results, baseline, threshold=0.25)}
+    assert set(rows) == {"a", "b"}
+    assert not rows["a"]["regressed"] and rows["b"]["regressed"]
+
+
+def test_measure_reports_per_operation_time():
+    calls = []
+    result = suite.measure(lambda: calls.append(1), rounds=3, min_time=0.001)
+    assert result["rounds"] == 3 and result["number"] >= 1
+    assert len(calls) == 1 + 3 * result["number"]
+    assert 0 < result["min_s"] <= result["median_s"]
@@ -0,0 +1,31 @@
+from app.categorizer import categorize, FALLBACK_CATEGORY
+
+
+def test_categorize_priority_and_overlaps():
+    assert categorize("React + Vite") == "frontend"
+    # 'go' dentro de 'mongodb' tiene prioridad sobre 'db', como en la cascada original
+    assert categorize("MongoDB cluster") == "backend"
+    assert categorize("PostgreSQL") == "database"
+    assert categorize("Scrum o Kanban") == "methodology"
+    assert categorize("Analizando respuestas...") == FALLBACK_CATEGORY
+
+
+def test_categorize_matches_keyword_cascade():
+    import random
+    from app.categorizer import KEYWORDS, SHORT_TEXT
+
+    def cascade(text):
+        t = text.lower()
+        for category, keys in KEYWORDS.items():
+            if any(k in t for k in keys):
+                return category
+        return FALLBACK_CATEGORY
+
+    words = [k for keys in KEYWORDS.values() for k in keys]
+    rnd = random.Random(5)
+    # palabras pegadas que se solapan (p. ej. 'cloudb'), por los dos caminos
+    texts = ["".join(rnd.choice(words) + rnd.choice(["", "", " ", "x"]) for _ in range(rnd.randint(1, 8)))
+             for _ in range(3000)]
+    texts += ["y" * SHORT_TEXT + t for t in texts[:500]]
+    assert [categorize.__wrapped__(t) for t in texts] == [cascade(t) for t in texts]
+    assert categorize("Cloudb") == "database"
@@ -0,0 +1,80 @@
+import threading
+
+from app import db
+
+
+def test_write_rows_batches_and_reuses_connection(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "t.db"))
+    db.init_db()
+    conn = db.get_db_conn()
+    assert db.get_db_conn() is conn
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    db.write_rows(
+        [("s1", "2024-01-01T00:00:00")],
+        [("s1", "q1", "o1", 1), ("s1", "q2", "o2", 1)],
+        db.recommendation_rows("s1", {"frontend": ["React"], "backend": []}),
+    )
+    assert conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0] == 2
+    rows = conn.execute("SELECT category, recommendation FROM recommendations").fetchall()
+    assert [tuple(r) for r in rows] == [("frontend", "React")]
+
+    other = []
+    t = threading.Thread(target=lambda: other.append(db.get_db_conn()))
+    t.start()
+    t.join()
+    assert other[0] is not conn
+    db.close_all()
+
+
+def test_concurrent_writers_count_a_session_once(tmp_path, monkeypatch):
+    from app import rollups
+
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "race.db"))
+    db.init_db()
+    # los dos escritores se esperan después de buscar las sesiones existentes;
+    # con la transacción tomada antes, el segundo ni siquiera llega a buscar
+    barrier = threading.Barrier(2, timeout=0.5)
+    original = rollups.new_sessions
+
+    def new_sessions(conn, sessions):
+        fresh = original(conn, sessions)
+        try:
+            barrier.wait()
+        except threading.BrokenBarrierError:
+            pass
+        return fresh
+
+    monkeypatch.setattr(rollups, "new_sessions", new_sessions)
+    threads = [threading.Thread(target=db.write_rows, args=([("s1", "2024-01-01T10:00:00")],)) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    conn = db.get_db_conn()
+    assert conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0] == 1
+    assert conn.execute("SELECT SUM(count) FROM rollup_sessions_hourly").fetchone()[0] == 1
+    db.close_all()
+
+
+def test_connections_close_with_their_threads(tmp_path, monkeypatch):
+    import gc
+    import os
+
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "threads.db"))
+    db.init_db()
+
+    def short_lived_threads(n):
+        for _ in range(n):
+            t = threading.Thread(target=lambda: db.get_db_conn().execute("SELECT 1"))
+            t.start()
+            t.join()
+        gc.collect()
+        return len(os.listdir("/proc/self/fd")) if os.path.isdir("/proc/self/fd") else 0
+
+    first = short_lived_threads(100)
+    # sólo queda la del hilo principal (init_db): las demás se cerraron con su hilo
+    assert len(db._all_conns) == 1
+    # SQLite guarda algunos descriptores cerrados para reutilizarlos, pero no crecen
+    assert short_lived_threads(100) <= first + 5
+    db.close_all()
@@ -0,0 +1,98 @@
+from app.tree_parser import parse_flujo
+from app.rules import compile_rules
+from app.cache import LRUCache
+from app.evaluation import answer_order, canonical_answer_ids, compute_recommendations, GLOBAL_RECOMMENDATIONS
+
+FLOW = (
+    ':¿Tipo de Aplicación?;\n'
+    'if (a) then (Web)\n'
+    ':Kanban board;\n'
+    'elseif (b) then (Escritorio)\n'
+    'endif\n'
+)
+
+
+def test_canonical_answer_ids():
+    root = parse_flujo(FLOW)
+    order = answer_order(root)
+    assert canonical_answer_ids(order, ["o0_2", "nope", "o0_1", "o0_2"]) == ("o0_1", "o0_2")
+
+
+def test_compute_recommendations():
+    root = parse_flujo(FLOW)
+    recs = compute_recommendations(root, compile_rules(root), ["o0_1"])
+    assert recs["methodology"] == ["Kanban board"]
+    assert recs["frontend"] == ["React", "Vue.js", "HTML5/CSS3"]
+    # sin recomendaciones propias se usan las globales
+    recs = compute_recommendations(root, compile_rules(root), ["o0_2"])
+    assert recs["frontend"][0] == GLOBAL_RECOMMENDATIONS[0]
+    assert "Go / .NET / Java" in recs["backend"]
+
+
+def test_lru_cache_bounded_with_counters():
+    cache = LRUCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)  # expulsa 'b', el menos usado
+    assert cache.get("b") is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+    assert len(cache) == 2
+    cache.clear()
+    assert len(cache) == 0 and cache.hits == 0
+
+
+def test_precomputed_table_matches_computation():
+    import random
+
+    import pytest
+    from app import state as tree_state
+    from app.precompute import PrecomputeLimitError, build_table, question_choices
+
+    state = tree_state.build_state(use_snapshot=False)
+    table = state.precompute()
+    assert table.stats()["approx_bytes"] == table.approx_bytes > 0
+    with pytest.raises(PrecomputeLimitError):
+        build_table(state.root, state.rule_table, limit=1)
+
+    options = [o for c in question_choices(state.root) for o in c if o is not None]
+    rnd = random.Random(3)
+    for _ in range(300):
+        ids = rnd.sample(options, rnd.randint(0, 8))
+        key = canonical_answer_ids(state.answer_order, ids)
+        expected = compute_recommendations(state.root, state.rule_table, key)
+        got = table.get(key)
+        # dos opciones relevantes de una misma pregunta no están en la tabla
+        assert got is None or got == expected
+        assert state.evaluate(ids) == expected
+
+
+def test_precomputed_table_falls_back_for_ids_outside_options(tmp_path):
+    from app import state as tree_state
+
+    flow = tmp_path / "flujo.txt"
+    flow.write_text('partition "FASE 1" {\n:¿Metodología?;\n:Kanban;\nif (a) then (Scrum)\n:Sprints cortos;\n'
+                    'elseif (b) then (Ninguna)\nendif\n}\n', encoding="utf-8")
+    state = tree_state.build_state(str(flow), use_snapshot=False)
+    table = state.precompute()
+    question = next(n for n in state.root.index.values() if n.node_type == 'question')
+    ids = [c.id for c in question.children] + [question.id, 'phase_final']
+    assert any(state.root.find(i).node_type == 'recommendation' for i in ids)
+    for answer_id in ids:
+        key = canonical_answer_ids(state.answer_order, [answer_id])
+        expected = compute_recommendations(state.root, state.rule_table, key)
+        got = table.get(key)
+        assert got is None or got == expected
+        assert state.evaluate(key) == expected
+
+
+def test_evaluate_batch_memo_is_bounded(monkeypatch):
+    from app import state as tree_state
+
+    monkeypatch.setattr(tree_state, "BATCH_MEMO_SIZE", 2)
+    state = tree_state.build_state(use_snapshot=False)
+    options = [n.id for n in state.root.index.values() if n.node_type == 'option'][:6]
+    memo = {}
+    results = list(state.evaluate_batch(([o] for o in options), memo))
+    assert len(memo) <= 2
+    assert results == [state.evaluate([o]) for o in options]
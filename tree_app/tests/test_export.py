@@ -0,0 +1,24 @@
+import csv
+import io
+import json
+
+from app import db, export
+
+
+def test_export_pages_and_filters(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "e.db"))
+    db.init_db()
+    sessions = [(f"s{i}", f"2024-01-0{1 + i % 3}T10:00:00") for i in range(10)]
+    db.write_rows(sessions, [(s, "q1", "o1", 1) for s, _ in sessions],
+                  [(s, "frontend", 'React, "rápido"') for s, _ in sessions])
+
+    rows = list(csv.reader(io.StringIO("".join(export.iter_csv("recommendations", page_size=3)))))
+    assert rows[0] == export.columns("recommendations") and len(rows) == 11
+    assert rows[1][3] == 'React, "rápido"'
+
+    lines = "".join(export.iter_ndjson("answers", start="2024-01-02", end="2024-01-03", page_size=2))
+    picked = [json.loads(line)["session_id"] for line in lines.splitlines()]
+    assert picked == ["s1", "s4", "s7"]
+
+    assert sum(len(p) for p in export.iter_pages("sessions", page_size=4)) == 10
+    db.close_all()
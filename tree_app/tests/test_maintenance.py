@@ -0,0 +1,75 @@
+import sqlite3
+
+from app import analytics, db, maintenance, rollups
+
+
+def _rollups(conn):
+    return {t: sorted(tuple(r) for r in conn.execute(f"SELECT * FROM {t}"))
+            for t in ("rollup_recommendations", "rollup_answers", "rollup_sessions_hourly")}
+
+
+def test_migrates_old_schema_to_text_dictionary(tmp_path, monkeypatch):
+    path = str(tmp_path / "old.db")
+    old = sqlite3.connect(path)
+    old.executescript("""
+        CREATE TABLE sessions (id TEXT PRIMARY KEY, timestamp TEXT);
+        CREATE TABLE answers (id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT, question_id TEXT,
+                              answer_id TEXT, phase INTEGER);
+        CREATE TABLE recommendations (id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT, category TEXT,
+                                      recommendation TEXT);
+        INSERT INTO sessions VALUES ('s1', '2024-01-01T10:00:00'), ('s2', '2024-01-02T10:00:00');
+        INSERT INTO recommendations(session_id, category, recommendation) VALUES
+            ('s1', 'frontend', 'React'), ('s1', 'backend', 'Go'), ('s2', 'frontend', 'React');
+    """)
+    old.close()
+    monkeypatch.setattr(db, "DB_PATH", path)
+    db.init_db()
+    conn = db.get_db_conn()
+    assert conn.execute("SELECT COUNT(*) FROM recommendation_texts").fetchone()[0] == 2
+    rows = conn.execute("SELECT id, session_id, category, recommendation FROM recommendations ORDER BY id")
+    assert [tuple(r) for r in rows] == [(1, "s1", "frontend", "React"), (2, "s1", "backend", "Go"),
+                                        (3, "s2", "frontend", "React")]
+    assert analytics.session_detail(conn, "s1")["recommendations"] == {"frontend": ["React"], "backend": ["Go"]}
+
+    db.write_rows([("s3", "2024-01-03T10:00:00")], [], [("s3", "frontend", "React"), ("s3", "frontend", "Vue")])
+    db.write_rows([("s4", "2024-01-03T11:00:00")], [], [("s4", "frontend", "Vue")])
+    assert conn.execute("SELECT COUNT(*) FROM recommendation_texts").fetchone()[0] == 3
+    assert analytics.top_recommendations(conn, "frontend")["items"][0] == {"recommendation": "React", "count": 3}
+    db.close_all()
+
+
+def test_archive_moves_old_sessions_and_keeps_rollups_consistent(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "data.db"))
+    db.init_db()
+    conn = db.get_db_conn()
+    assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    sessions, answers, recs = [], [], []
+    for i in range(30):
+        sid = f"s{i:02d}"
+        sessions.append((sid, f"2024-0{1 + i % 3}-1{i % 10}T10:00:00"))
+        answers.append((sid, "q1", f"o{i % 4}", 1))
+        recs.append((sid, "frontend", f"React {i % 2}"))
+    db.write_rows(sessions, answers, recs)
+
+    moved = maintenance.archive_sessions("2024-03", str(tmp_path / "archive"), batch=4)
+    assert (moved["sessions"], moved["answers"], moved["recommendations"]) == (20, 20, 20)
+    assert [p.rsplit("/", 1)[1] for p in moved["files"]] == ["data-2024-01.db", "data-2024-02.db"]
+    assert conn.execute("SELECT COUNT(*) FROM sessions WHERE timestamp < '2024-03'").fetchone()[0] == 0
+
+    january = sqlite3.connect(moved["files"][0])
+    assert january.execute("SELECT COUNT(*) FROM sessions").fetchone()[0] == 10
+    assert january.execute("SELECT DISTINCT recommendation FROM recommendations ORDER BY 1").fetchall() == [
+        ("React 0",), ("React 1",)]
+    january.close()
+
+    # los contadores descontados coinciden con recontar lo que queda
+    kept = _rollups(conn)
+    with conn:
+        rollups.rebuild(conn)
+    assert kept == _rollups(conn)
+
+    assert maintenance.prune_archives(str(tmp_path / "archive"), keep=1) == moved["files"][:1]
+    report = maintenance.run(retention_days=0)
+    assert report["vacuumed_pages"] >= 0
+    assert maintenance.stats()["sessions"] == 10
+    db.close_all()
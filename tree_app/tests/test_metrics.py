@@ -0,0 +1,40 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import metrics
+
+
+def test_timed_is_free_when_disabled_and_counts_when_enabled(monkeypatch):
+    def stage():
+        return 42
+
+    monkeypatch.setattr(metrics, "ENABLED", False)
+    assert metrics.timed("test_stage")(stage) is stage
+
+    monkeypatch.setattr(metrics, "ENABLED", True)
+    monkeypatch.setattr(metrics, "STAGES", {})
+    wrapped = metrics.timed("test_stage")(stage)
+    assert wrapped() == 42 and wrapped() == 42
+    assert metrics.STAGES["test_stage"].count == 2
+    assert 'arbol_stage_seconds_count{stage="test_stage"} 2' in metrics.render()
+
+
+def test_latency_histogram_uses_route_template(monkeypatch):
+    monkeypatch.setattr(metrics, "REQUESTS", {})
+    app = FastAPI()
+    app.add_middleware(metrics.LatencyMiddleware)
+
+    @app.get("/items/{item_id}")
+    def item(item_id: int):
+        return {"id": item_id}
+
+    with TestClient(app) as client:
+        for i in range(3):
+            assert client.get(f"/items/{i}").status_code == 200
+        assert client.get("/nope").status_code == 404
+
+    text = metrics.render()
+    assert 'arbol_http_request_duration_seconds_count{route="/items/{item_id}",method="GET",status="200"} 3' in text
+    assert 'route="unmatched",method="GET",status="404"' in text
+    assert 'arbol_http_request_duration_seconds_bucket{route="/items/{item_id}",method="GET",status="200",le="+Inf"} 3' \
+        in text
@@ -6,3 +6,101 @@ def test_parse_basic():
     root = parse_flujo(text)
     assert root is not None
     assert len(root.children) >= 1
+
+
+def test_index_and_parent_links():
+    text = ":Pregunta 1: Tipo de Aplicación?;\nif (WEB) then (WEB)\n:Selecciona WEB;"
+    root = parse_flujo(text)
+    opt = root.find("o0_1")
+    assert opt is not None and opt.text == "WEB"
+    assert opt.parent is root.find("q0_1")
+    assert root.find("r0_1").parent is opt
+    assert root.find("missing") is None
+
+
+def test_node_slots_and_lazy_metadata():
+    root = parse_flujo(":¿Tipo?;\nif (a) then (Web)\n")
+    opt = root.find("o0_1")
+    assert not hasattr(opt, "__dict__")
+    assert not opt.has_metadata() and "metadata" not in opt.to_dict()
+    opt.metadata["icon"] = "web"
+    assert opt.to_dict()["metadata"] == {"icon": "web"}
+
+
+def test_frozen_tree_round_trip():
+    from app.frozen import FrozenTree
+
+    text = 'partition "FASE 2" {\n:¿Tipo?;\nif (a) then (Web)\n:React;\nelseif (b) then (Móvil)\nendif\n}\n'
+    root = parse_flujo(text)
+    frozen = FrozenTree.from_node(root)
+    assert len(frozen) == len(root.index)
+    assert frozen.to_dict() == root.to_dict()
+    i = frozen.find("o2_1")
+    assert frozen.texts[i] == "Web" and frozen.ids[frozen.parents[i]] == "q2_1"
+    assert frozen.to_node().to_dict() == root.to_dict()
+
+
+def test_tokenize_and_strict_errors():
+    import pytest
+    from app.tree_parser import tokenize, FlujoSyntaxError, QUESTION, OPTION
+
+    text = ':¿Tipo?;\n  if (a) then (Web)\n  if (b) sin etiqueta\n'
+    tokens = list(tokenize(text))
+    assert [(t.kind, t.value, t.line, t.col) for t in tokens] == [
+        (QUESTION, "¿Tipo?", 1, 1), (OPTION, "Web", 2, 3),
+    ]
+    # sin strict la línea mal formada se ignora, como antes
+    assert parse_flujo(text).find("o0_1").text == "Web"
+    with pytest.raises(FlujoSyntaxError) as exc:
+        parse_flujo(text, strict=True)
+    assert (exc.value.line, exc.value.col) == (3, 3)
+
+
+def test_streaming_parser_matches_parse_flujo():
+    import hashlib
+    import io
+    import os
+    from app.tree_parser import FlujoParser, parse_stream
+
+    with open(os.path.join(os.path.dirname(__file__), "..", "..", "flujo.txt"), encoding="utf-8") as f:
+        text = f.read()
+    data = text.encode("utf-8")
+    expected = parse_flujo(text).to_dict()
+
+    # trozos pequeños que cortan líneas y caracteres UTF-8 por la mitad
+    parser = FlujoParser()
+    for i in range(0, len(data), 7):
+        parser.feed(data[i:i + 7])
+    assert parser.close().to_dict() == expected
+    assert parser.version == hashlib.sha256(data).hexdigest()[:16]
+
+    assert parse_stream(io.BytesIO(data), chunk_size=64).to_dict() == expected
+    assert parse_stream(text.splitlines()).to_dict() == expected
+
+    # segmentos consecutivos: el estado sigue de uno a otro
+    lines = text.splitlines(keepends=True)
+    half = len(lines) // 2
+    assert parse_stream(io.StringIO("".join(lines[:half])), lines[half:]).to_dict() == expected
+
+    # la última línea de un segmento sin "\n" final también cuenta
+    import pytest
+    from app.tree_parser import FlujoSyntaxError
+    with pytest.raises(FlujoSyntaxError) as exc:
+        parse_stream('partition "A" {\n:¿Q?;', 'partition {\n', strict=True)
+    assert exc.value.line == 3
+
+
+def test_phase_index_and_sides():
+    text = (
+        ':¿Fuera de fase?;\nif (x) then (X)\nendif\n'
+        'partition "FASE 1 Negocio" {\n:¿Uno?;\nif (a) then (A)\n:React;\nendif\n:¿Dos?;\n}\n'
+        'partition "FASE 3 Datos" {\n:¿Tres?;\n}\n'
+    )
+    root = parse_flujo(text)
+    assert [q.text for q in root.get_phase_questions(1)] == ["Uno?", "Dos?"]
+    assert [q.text for q in root.get_phase_questions(0)] == ["Fuera de fase?"]
+    assert sorted(root.phase_index) == [0, 1, 3]
+    assert root.get_phase_questions(2) == ()
+    assert root.get_side("left") is root.children[0]
+    assert root.get_side("right") is root.children[1]
+    assert root.get_side("middle") is None
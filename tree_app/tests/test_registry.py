@@ -0,0 +1,50 @@
+import pytest
+
+from app.registry import Registry, UnknownQuestionnaire, version_key
+
+FLOW = 'partition "FASE 1" {{\n:¿{question}?;\nif (a) then ({answer})\nendif\n}}\n'
+
+
+def _write(tmp_path, questionnaire, version, answer):
+    folder = tmp_path / questionnaire
+    folder.mkdir(exist_ok=True)
+    (folder / f"{version}.txt").write_text(FLOW.format(question=questionnaire, answer=answer), encoding="utf-8")
+
+
+def test_natural_version_order():
+    assert sorted(["v10", "v2", "v1"], key=version_key) == ["v1", "v2", "v10"]
+    assert sorted(["2024-06", "2024-01", "2023-12"], key=version_key) == ["2023-12", "2024-01", "2024-06"]
+
+
+def test_lazy_load_latest_and_lru_eviction(tmp_path):
+    _write(tmp_path, "es", "v2", "Si")
+    _write(tmp_path, "es", "v10", "Claro")
+    _write(tmp_path, "en", "v1", "Yes")
+    reg = Registry(str(tmp_path), size=2)
+    assert reg.questionnaires() == {"en": ["v1"], "es": ["v2", "v10"]}
+    assert reg.loaded() == []
+
+    latest = reg.get("es")
+    assert (latest.questionnaire, latest.label) == ("es", "v10")
+    assert reg.get("es", "latest") is latest and reg.loads == 1
+    old = reg.get("es", "v2")
+    assert old.version != latest.version
+
+    reg.get("es", "v10")
+    reg.get("en")
+    # v2 era la menos usada recientemente
+    assert reg.loaded() == [("es", "v10"), ("en", "v1")] and reg.evictions == 1
+    assert reg.get("es", "v2") is not old and reg.loads == 4
+
+
+def test_unknown_and_new_versions(tmp_path):
+    _write(tmp_path, "es", "v1", "Si")
+    reg = Registry(str(tmp_path))
+    with pytest.raises(UnknownQuestionnaire):
+        reg.get("fr")
+    with pytest.raises(UnknownQuestionnaire):
+        reg.get("es", "v9")
+    reg.questionnaires()
+    # una versión nueva se encuentra aunque el listado esté en caché
+    _write(tmp_path, "es", "v9", "Claro")
+    assert reg.get("es", "v9").label == "v9"
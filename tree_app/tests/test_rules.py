@@ -0,0 +1,23 @@
+from app.tree_parser import parse_flujo
+from app.rules import compile_rules
+
+
+def test_compile_rules_resolves_options():
+    text = (
+        ':¿Tipo de Aplicación?;\n'
+        'if (a) then (Web)\n'
+        'elseif (b) then (Escritorio)\n'
+        'elseif (c) then (Otra)\n'
+        'endif\n'
+    )
+    root = parse_flujo(text)
+    table = compile_rules(root)
+    assert table["o0_1"]["frontend"] == ["React", "Vue.js", "HTML5/CSS3"]
+    assert table["o0_2"]["backend"] == ["Go / .NET / Java"]
+    assert "o0_3" not in table
+
+
+def test_custom_rules_without_touching_handlers():
+    root = parse_flujo(':¿Nube preferida?;\nif (a) then (AWS)\nendif\n')
+    rules = [{"question": ["nube"], "options": [(["aws"], {"architecture": ["ECS / Lambda"]})]}]
+    assert compile_rules(root, rules) == {"o0_1": {"architecture": ["ECS / Lambda"]}}
@@ -0,0 +1,41 @@
+import json
+
+from app import session_log
+
+
+def test_append_rotate_and_stream(tmp_path):
+    log = str(tmp_path / "sessions.jsonl")
+    for i in range(5):
+        session_log.append({"id": str(i), "answers": []}, path=log, max_bytes=60)
+    assert len(session_log.segments(log)) > 1
+    assert [e["id"] for e in session_log.iter_sessions(log)] == ["0", "1", "2", "3", "4"]
+
+
+def test_migrate_legacy_json(tmp_path):
+    src = tmp_path / "sessions.json"
+    src.write_text(json.dumps([{"id": "a", "answers": []}, {"id": "b", "answers": []}]))
+    log = str(tmp_path / "sessions.jsonl")
+    assert session_log.migrate_json(str(src), log) == 2
+    assert not src.exists()
+    assert session_log.migrate_json(str(src), log) == 0
+    assert [e["id"] for e in session_log.iter_sessions(log)] == ["a", "b"]
+
+
+def _append_many(log, worker, n):
+    for i in range(n):
+        session_log.append({"id": f"{worker}-{i}", "answers": []}, path=log, max_bytes=200)
+
+
+def test_rotation_across_processes(tmp_path):
+    import multiprocessing
+
+    log = str(tmp_path / "sessions.jsonl")
+    procs = [multiprocessing.Process(target=_append_many, args=(log, w, 150)) for w in range(4)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    assert all(p.exitcode == 0 for p in procs)
+    ids = [e["id"] for e in session_log.iter_sessions(log)]
+    # ningún segmento rotado se pisó con otro
+    assert sorted(ids) == sorted(f"{w}-{i}" for w in range(4) for i in range(150))
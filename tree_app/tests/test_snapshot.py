@@ -0,0 +1,77 @@
+import os
+import random
+import shutil
+
+from app import snapshot, state as tree_state
+
+FLUJO = os.path.join(os.path.dirname(__file__), "..", "..", "flujo.txt")
+
+
+def test_snapshot_round_trip_and_staleness(tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot, "SNAPSHOT_PATH", None)
+    flujo = str(tmp_path / "flujo.txt")
+    shutil.copy(FLUJO, flujo)
+    parsed = tree_state.build_state(flujo, use_snapshot=False)
+    snap_path = snapshot.default_path(flujo)
+    tree_state.compile_snapshot(parsed, snap_path)
+
+    snap = snapshot.load_fresh(snap_path, snapshot.file_version(flujo))
+    assert snap is not None and snap.version == parsed.version
+    loaded = tree_state.build_state(flujo)
+
+    # se sirve desde el fichero mapeado sin construir los Node
+    assert loaded.node_count == parsed.node_count
+    assert loaded.rendered.bodies() == parsed.rendered.bodies()
+    assert isinstance(loaded.rendered.get("tree", None)[0], memoryview)
+    assert list(loaded.answer_order.items()) == list(parsed.answer_order.items())
+    options = [n.id for n in parsed.root.index.values() if n.node_type in ("option", "phase")]
+    rnd = random.Random(7)
+    for _ in range(200):
+        ids = rnd.sample(options, rnd.randint(0, 6)) + ["nope"]
+        assert loaded.evaluate(ids) == parsed.evaluate(ids)
+    assert loaded._root is None
+
+    assert loaded.root.to_dict() == parsed.root.to_dict()
+    assert loaded.rule_table == parsed.rule_table
+    assert loaded.rendered.get("tree", None) == parsed.rendered.get("tree", None)
+    assert loaded.root.find("o1_1").parent is loaded.root.find("q1_1")
+
+    # flujo modificado: la instantánea ya no vale y se parsea el fichero
+    with open(flujo, "a", encoding="utf-8") as f:
+        f.write(':¿Pregunta nueva?;\n')
+    assert snapshot.load_fresh(snap_path, snapshot.file_version(flujo)) is None
+    assert tree_state.build_state(flujo).version != parsed.version
+
+    # fichero corrupto: se ignora
+    with open(snap_path, "wb") as f:
+        f.write(b"basura")
+    assert snapshot.load_fresh(snap_path, parsed.version) is None
+
+
+def test_snapshot_stale_after_code_change(tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot, "SNAPSHOT_PATH", None)
+    flujo = str(tmp_path / "flujo.txt")
+    shutil.copy(FLUJO, flujo)
+    snap_path = snapshot.default_path(flujo)
+    tree_state.compile_snapshot(tree_state.build_state(flujo, use_snapshot=False), snap_path)
+    version = snapshot.file_version(flujo)
+    assert snapshot.load_fresh(snap_path, version) is not None
+
+    # otro código de renderizado: mismo flujo, pero la instantánea ya no vale
+    monkeypatch.setattr(snapshot, "code_fingerprint", lambda: "otro")
+    assert snapshot.load_fresh(snap_path, version) is None
+
+
+def test_info_reads_a_header_larger_than_64k(tmp_path, capsys):
+    import json
+
+    flujo = tmp_path / "flujo.txt"
+    flujo.write_text("".join(f'partition "FASE {i}" {{\n:¿Pregunta {i}?;\nif (a) then (Sí)\nendif\n}}\n'
+                             for i in range(1, 3001)), encoding="utf-8")
+    snap_path = str(tmp_path / "flujo.snap")
+    tree_state.compile_snapshot(tree_state.build_state(str(flujo), use_snapshot=False), snap_path)
+    capsys.readouterr()
+    snapshot.main(["info", snap_path])
+    header = json.loads(capsys.readouterr().out)
+    assert header["start"] > 1 << 16
+    assert header["code"] == snapshot.code_fingerprint()
@@ -0,0 +1,54 @@
+import asyncio
+
+from app import metrics
+from app.writebehind import WriteBehindQueue
+
+
+def test_batches_by_size_and_flushes_on_stop():
+    written = []
+
+    def writer(sessions, answers, recommendations):
+        written.append((list(sessions), list(answers), list(recommendations)))
+
+    async def scenario():
+        q = WriteBehindQueue(writer=writer, max_batch=4, max_delay=10)
+        await q.start()
+        for i in range(3):
+            await q.put([(f"s{i}", "t")], [(f"s{i}", "q", "o", 1)])
+        await asyncio.sleep(0.01)
+        # el segundo lote llega a 4 filas y se escribe sin esperar al plazo
+        assert len(written) == 1
+        await q.stop()
+        return q.stats()
+
+    stats = asyncio.run(scenario())
+    assert len(written) == 2
+    assert sum(len(s) for s, _, _ in written) == 3
+    assert stats["rows_written"] == 6 and stats["pending_rows"] == 0 and stats["queue_depth"] == 0
+
+
+def test_failed_flush_is_retried_then_counted_as_lost():
+    attempts = []
+
+    def flaky(sessions, answers, recommendations):
+        attempts.append(len(sessions))
+        if len(attempts) < 3:
+            raise RuntimeError("database is locked")
+
+    def broken(sessions, answers, recommendations):
+        raise RuntimeError("disk I/O error")
+
+    async def scenario(writer):
+        q = WriteBehindQueue(writer=writer, max_batch=10, max_delay=0, retries=2, retry_delay=0.001)
+        await q.start()
+        await q.put([("s1", "t")], [("s1", "q", "o", 1)])
+        await q.stop()
+        return q.stats()
+
+    stats = asyncio.run(scenario(flaky))
+    assert attempts == [1, 1, 1]
+    assert stats["rows_written"] == 2 and stats["retries"] == 2 and stats["rows_lost"] == 0
+
+    stats = asyncio.run(scenario(broken))
+    assert stats["rows_written"] == 0 and stats["errors"] == 1 and stats["rows_lost"] == 2
+    assert 'arbol_write_behind_rows_lost_total 2' in metrics.render(write_behind=stats)
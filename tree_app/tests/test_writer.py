@@ -0,0 +1,47 @@
+import asyncio
+import threading
+
+from app import db, writer
+
+
+def test_writer_process_serializes_rows_from_many_clients(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "w.db"))
+    path = str(tmp_path / "writer.sock")
+    loop = asyncio.new_event_loop()
+    ready, stop = threading.Event(), None
+
+    def run():
+        nonlocal stop
+        asyncio.set_event_loop(loop)
+        stop = asyncio.Event()
+        started = asyncio.Event()
+        task = loop.create_task(writer.serve(path, ready=started, stop=stop))
+        loop.run_until_complete(started.wait())
+        ready.set()
+        loop.run_until_complete(task)
+
+    t = threading.Thread(target=run)
+    t.start()
+    assert ready.wait(5)
+
+    client = writer.WriterClient(path)
+
+    def work(n):
+        for i in range(10):
+            sid = f"s{n}_{i}"
+            client.write_rows([(sid, "2024-01-01T00:00:00")], [(sid, "q1", "o1", 1)],
+                              [(sid, "frontend", "React")])
+
+    workers = [threading.Thread(target=work, args=(n,)) for n in range(4)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+
+    loop.call_soon_threadsafe(stop.set)
+    t.join(5)
+    conn = db.get_db_conn()
+    assert conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0] == 40
+    assert conn.execute("SELECT COUNT(*) FROM recommendations").fetchone()[0] == 40
+    db.close_all()
+    loop.close()